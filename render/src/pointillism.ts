@@ -1,12 +1,21 @@
-import { createCanvas, loadImage, Image } from "canvas";
+import {
+  Canvas,
+  CanvasRenderingContext2D,
+  createCanvas,
+  loadImage,
+  Image,
+} from "canvas";
+import { ChildProcess, fork } from "child_process";
 import * as fs from "fs";
+import * as os from "os";
 import * as path from "path";
+import { PngWriter, Tile, TileGrid } from "./tiles";
 
 interface Dot {
   x: number;
   y: number;
   r: number;
-  rgb: [number, number, number];
+  c: number; // index into DotsData.palette
 }
 
 interface DotsData {
@@ -16,9 +25,89 @@ interface DotsData {
   bg: [number, number, number];
   alpha: number;
   texture_dir: string | null;
+  palette: [number, number, number][];
   dots: Dot[];
 }
 
+// Brush stamps are rendered at ROTATIONS evenly spaced angles and at most
+// MAX_RADII radii, already tinted per palette color, so a textured dot is one
+// drawImage of a cached stamp instead of a fresh canvas, fill and composite.
+const ROTATIONS = 8;
+const MAX_RADII = 4;
+
+// Output is rasterized in DEFAULT_TILE × DEFAULT_TILE tiles (see tiles.ts)
+const DEFAULT_TILE = 1024;
+
+/** Map every dot radius onto one of at most MAX_RADII evenly spaced stamp radii. */
+function stampRadii(dots: Dot[]): Map<number, number> {
+  const radii = [...new Set(dots.map((d) => d.r))].sort((a, b) => a - b);
+  const quantized = new Map<number, number>();
+  if (radii.length === 0) return quantized;
+  const lo = radii[0];
+  const hi = radii[radii.length - 1];
+  const levels = Math.min(radii.length, MAX_RADII);
+  for (const r of radii) {
+    if (levels === 1) {
+      quantized.set(r, lo);
+      continue;
+    }
+    const level = Math.round(((r - lo) / (hi - lo)) * (levels - 1));
+    quantized.set(r, Math.round(lo + (level * (hi - lo)) / (levels - 1)));
+  }
+  return quantized;
+}
+
+/**
+ * Tinted, rotated brush stamps keyed by (radius, texture, rotation, color).
+ *
+ * A stamp is rendered the first time a dot needs it rather than for every
+ * combination up front: the full set is textures × ROTATIONS × colors per
+ * radius, which every tile worker would otherwise build (and hold) for
+ * itself, while a worker's tiles typically use a fraction of it.
+ */
+class StampCache {
+  private stamps = new Map<number, Canvas>();
+
+  constructor(
+    private textures: Image[],
+    private fills: string[],
+  ) {}
+
+  private stamp(r: number, texture: number, rotation: number, color: number): Canvas {
+    const key =
+      ((r * this.textures.length + texture) * ROTATIONS + rotation) * this.fills.length + color;
+    const cached = this.stamps.get(key);
+    if (cached) return cached;
+
+    const d = r * 2;
+    const stamp = createCanvas(d, d);
+    const sCtx = stamp.getContext("2d");
+    sCtx.fillStyle = this.fills[color];
+    sCtx.fillRect(0, 0, d, d);
+
+    // destination-in keeps the fill only where the texture is opaque
+    sCtx.globalCompositeOperation = "destination-in";
+    sCtx.translate(r, r);
+    sCtx.rotate((rotation / ROTATIONS) * Math.PI * 2);
+    sCtx.drawImage(this.textures[texture], -r, -r, d, d);
+
+    this.stamps.set(key, stamp);
+    return stamp;
+  }
+
+  draw(
+    ctx: CanvasRenderingContext2D,
+    x: number,
+    y: number,
+    r: number,
+    texture: number,
+    rotation: number,
+    color: number,
+  ): void {
+    ctx.drawImage(this.stamp(r, texture, rotation, color), x - r, y - r);
+  }
+}
+
 async function loadTextures(dir: string): Promise<Image[]> {
   if (!fs.existsSync(dir)) return [];
   const files = fs.readdirSync(dir).filter((f) => /\.(png|jpg|jpeg)$/i.test(f));
@@ -31,66 +120,254 @@ async function loadTextures(dir: string): Promise<Image[]> {
   return results;
 }
 
-async function main() {
-  const [, , inputPath, outputPath] = process.argv;
-  if (!inputPath || !outputPath) {
-    console.error("Usage: ts-node pointillism.ts <dots.json> <output.png>");
-    process.exit(1);
-  }
+interface Scene {
+  data: DotsData;
+  width: number;
+  height: number;
+  fills: string[];
+  textures: Image[];
+  stamps: StampCache | null;
+  radii: Map<number, number>;
+}
 
+async function loadScene(inputPath: string): Promise<Scene> {
   const data: DotsData = JSON.parse(fs.readFileSync(inputPath, "utf8"));
-  const { bg, step, alpha, texture_dir, dots } = data;
+  const { step, alpha, texture_dir, palette, dots } = data;
   const maxGradR = step / 2;
-
+  const fills = palette.map(([cr, cg, cb]) => `rgba(${cr},${cg},${cb},${alpha})`);
   const textures = texture_dir ? await loadTextures(texture_dir) : [];
-  console.log(`loaded ${textures.length} brush textures`);
 
   // canvas size derived from actual dot extents, not original image dimensions
-  const canvasW = Math.ceil(dots.reduce((m, d) => Math.max(m, d.x + maxGradR), 0));
-  const canvasH = Math.ceil(dots.reduce((m, d) => Math.max(m, d.y + maxGradR), 0));
-
-  const canvas = createCanvas(canvasW, canvasH);
-  const ctx = canvas.getContext("2d");
-
-  ctx.fillStyle = `rgb(${bg[0]},${bg[1]},${bg[2]})`;
-  ctx.fillRect(0, 0, canvasW, canvasH);
+  const width = Math.ceil(dots.reduce((m, d) => Math.max(m, d.x + maxGradR), 1));
+  const height = Math.ceil(dots.reduce((m, d) => Math.max(m, d.y + maxGradR), 1));
 
-  ctx.globalCompositeOperation = "source-over";
+  const stamps = textures.length > 0 ? new StampCache(textures, fills) : null;
+  return { data, width, height, fills, textures, stamps, radii: stampRadii(dots) };
+}
 
-  for (const { x, y, r, rgb } of dots) {
-    const [cr, cg, cb] = rgb;
+/** Radius a dot is actually drawn with. */
+function drawnRadius(scene: Scene, r: number): number {
+  return scene.stamps ? scene.radii.get(r)! : Math.min(r, scene.data.step / 2);
+}
 
-    if (textures.length > 0) {
-      const texture = textures[Math.floor(Math.random() * textures.length)];
-      const size = r;
-      const diameter = size * 2;
+/**
+ * Texture and rotation of dot i, derived from its index rather than drawn at
+ * random, so a dot straddling several tiles looks the same in each of them.
+ */
+function dotStyle(i: number, textures: number): [number, number] {
+  let h = Math.imul(i ^ 0x9e3779b9, 0x85ebca6b);
+  h ^= h >>> 13;
+  h = Math.imul(h, 0xc2b2ae35);
+  h = (h ^ (h >>> 16)) >>> 0;
+  return [h % textures, (h >>> 16) % ROTATIONS];
+}
 
-      // off-screen stamp: fill color, then clip to texture alpha
-      const stamp = createCanvas(diameter, diameter);
-      const sCtx = stamp.getContext("2d");
+function buildGrid(scene: Scene, tileSize: number): TileGrid {
+  const grid = new TileGrid(scene.width, scene.height, tileSize);
+  scene.data.dots.forEach(({ x, y, r }, i) => {
+    // +1 for the antialiased edge pixel
+    grid.add(i, x, y, drawnRadius(scene, r) + 1);
+  });
+  return grid;
+}
 
-      sCtx.fillStyle = `rgba(${cr},${cg},${cb},${alpha})`;
-      sCtx.fillRect(0, 0, diameter, diameter);
+/** Rasterize one tile's dots (in draw order) and return its RGB pixels. */
+function renderTile(scene: Scene, tile: Tile, dotIndices: number[]): Buffer {
+  const { bg, dots } = scene.data;
+  const canvas = createCanvas(tile.w, tile.h);
+  const ctx = canvas.getContext("2d");
 
-      sCtx.globalCompositeOperation = "destination-in";
-      sCtx.save();
-      sCtx.translate(size, size);
-      sCtx.rotate(Math.random() * Math.PI * 2);
-      sCtx.drawImage(texture, -size, -size, diameter, diameter);
-      sCtx.restore();
+  ctx.fillStyle = `rgb(${bg[0]},${bg[1]},${bg[2]})`;
+  ctx.fillRect(0, 0, tile.w, tile.h);
+  ctx.globalCompositeOperation = "source-over";
+  ctx.translate(-tile.x, -tile.y);
 
-      ctx.drawImage(stamp, x - size, y - size);
+  for (const i of dotIndices) {
+    const { x, y, r, c } = dots[i];
+    const radius = drawnRadius(scene, r);
+    if (scene.stamps) {
+      const [texture, rotation] = dotStyle(i, scene.textures.length);
+      scene.stamps.draw(ctx, x, y, radius, texture, rotation, c);
     } else {
       // fallback: radial gradient
-      ctx.fillStyle = `rgba(${cr},${cg},${cb},${alpha})`;
+      ctx.fillStyle = scene.fills[c];
       ctx.beginPath();
-      ctx.arc(x, y, Math.min(r, maxGradR), 0, Math.PI * 2);
+      ctx.arc(x, y, radius, 0, Math.PI * 2);
       ctx.fill();
     }
   }
 
-  fs.writeFileSync(outputPath, canvas.toBuffer("image/png"));
-  console.log(`rendered ${dots.length} dots → ${outputPath}`);
+  // "raw" is cairo's native-endian ARGB32, i.e. BGRA on little-endian hosts;
+  // the background is opaque, so premultiplication doesn't change anything
+  const raw = canvas.toBuffer("raw");
+  const rgb = Buffer.alloc(tile.w * tile.h * 3);
+  for (let p = 0, q = 0; q < rgb.length; p += 4, q += 3) {
+    rgb[q] = raw[p + 2];
+    rgb[q + 1] = raw[p + 1];
+    rgb[q + 2] = raw[p];
+  }
+  return rgb;
+}
+
+/** A rendered tile as sent back by a worker (Buffers arrive as Uint8Array). */
+interface TileResult {
+  index: number;
+  rgb: Uint8Array;
+}
+
+function isTileResult(msg: unknown): msg is TileResult {
+  if (typeof msg !== "object" || msg === null) return false;
+  const { index, rgb } = msg as Partial<Record<keyof TileResult, unknown>>;
+  return typeof index === "number" && rgb instanceof Uint8Array;
+}
+
+/** Fixed set of child processes, each rendering whole tiles of the same scene. */
+class TilePool {
+  private idle: ChildProcess[] = [];
+  private queue: { index: number; resolve: (rgb: Buffer) => void }[] = [];
+  private pending = new Map<number, (rgb: Buffer) => void>();
+  private workers: ChildProcess[] = [];
+  private failed: (err: Error) => void = () => {};
+  readonly failure = new Promise<never>((_, reject) => (this.failed = reject));
+  private closing = false;
+
+  constructor(inputPath: string, tileSize: number, count: number) {
+    // Under ts-node the children need the TypeScript loader too
+    const execArgv = __filename.endsWith(".ts") ? ["-r", require.resolve("ts-node/register")] : [];
+    for (let n = 0; n < count; n++) {
+      const worker = fork(__filename, ["--worker", inputPath, String(tileSize)], {
+        execArgv,
+        serialization: "advanced",
+      });
+      worker.on("message", (msg: unknown) => {
+        if (isTileResult(msg)) {
+          const resolve = this.pending.get(msg.index)!;
+          this.pending.delete(msg.index);
+          this.idle.push(worker);
+          resolve(Buffer.from(msg.rgb.buffer, msg.rgb.byteOffset, msg.rgb.byteLength));
+        } else {
+          // first message: scene loaded, ready for tiles
+          this.idle.push(worker);
+        }
+        this.pump();
+      });
+      worker.on("exit", (code) => {
+        if (!this.closing) this.failed(new Error(`tile worker exited with code ${code}`));
+      });
+      this.workers.push(worker);
+    }
+    this.failure.catch(() => {});
+  }
+
+  render(index: number): Promise<Buffer> {
+    return new Promise((resolve) => {
+      this.queue.push({ index, resolve });
+      this.pump();
+    });
+  }
+
+  private pump(): void {
+    while (this.idle.length > 0 && this.queue.length > 0) {
+      const worker = this.idle.pop()!;
+      const { index, resolve } = this.queue.shift()!;
+      this.pending.set(index, resolve);
+      worker.send({ index });
+    }
+  }
+
+  close(): void {
+    this.closing = true;
+    for (const worker of this.workers) worker.disconnect();
+  }
+}
+
+async function worker(inputPath: string, tileSize: number): Promise<void> {
+  const scene = await loadScene(inputPath);
+  const grid = buildGrid(scene, tileSize);
+  process.on("message", (msg: unknown) => {
+    const index = (msg as { index?: unknown } | null)?.index;
+    if (typeof index !== "number" || grid.buckets[index] === undefined) {
+      throw new Error(`unexpected message from parent: ${JSON.stringify(msg)}`);
+    }
+    const rgb = renderTile(scene, grid.tile(index), grid.buckets[index]);
+    process.send!({ index, rgb });
+  });
+  process.on("disconnect", () => process.exit(0));
+  process.send!({});
+}
+
+function option(args: string[], name: string, fallback: number): number {
+  const i = args.indexOf(name);
+  return i >= 0 ? parseInt(args[i + 1], 10) : fallback;
+}
+
+async function main() {
+  const args = process.argv.slice(2);
+  if (args[0] === "--worker") {
+    await worker(args[1], parseInt(args[2], 10));
+    return;
+  }
+
+  const [inputPath, outputPath] = args;
+  if (!inputPath || !outputPath) {
+    console.error(
+      "Usage: ts-node pointillism.ts <dots.json> <output.png> [--tile <px>] [--workers <n>]",
+    );
+    process.exit(1);
+  }
+  const tileSize = option(args, "--tile", DEFAULT_TILE);
+
+  const scene = await loadScene(inputPath);
+  console.log(`loaded ${scene.textures.length} brush textures`);
+  const grid = buildGrid(scene, tileSize);
+  const tiles = grid.cols * grid.rows;
+  const workers = Math.min(tiles, option(args, "--workers", os.cpus().length));
+
+  // Rows of tiles are written top to bottom as soon as they are complete;
+  // workers may run one row ahead, which bounds memory to ~2 rows of tiles
+  const pool = workers > 1 ? new TilePool(inputPath, tileSize, workers) : null;
+  const requested: Promise<Buffer>[] = [];
+  const request = (row: number) => {
+    for (let index = row * grid.cols; index < Math.min(tiles, (row + 1) * grid.cols); index++) {
+      requested[index] = pool
+        ? pool.render(index)
+        : Promise.resolve(renderTile(scene, grid.tile(index), grid.buckets[index]));
+    }
+  };
+
+  const png = new PngWriter(outputPath, grid.width, grid.height);
+  try {
+    if (pool) request(0);
+    for (let row = 0; row < grid.rows; row++) {
+      if (pool && row + 1 < grid.rows) request(row + 1);
+      if (!pool) request(row);
+      const first = row * grid.cols;
+      const band = grid.tile(first).h;
+      const rowTiles = requested.slice(first, first + grid.cols);
+      const rendered = pool
+        ? await Promise.race([Promise.all(rowTiles), pool.failure])
+        : await Promise.all(rowTiles);
+      const rgb = Buffer.alloc(grid.width * band * 3);
+      rendered.forEach((tileRgb, col) => {
+        const tile = grid.tile(first + col);
+        for (let y = 0; y < tile.h; y++) {
+          tileRgb.copy(rgb, (y * grid.width + tile.x) * 3, y * tile.w * 3, (y + 1) * tile.w * 3);
+        }
+      });
+      for (let col = 0; col < grid.cols; col++) delete requested[first + col];
+      await png.writeRows(rgb);
+    }
+    await png.close();
+  } finally {
+    pool?.close();
+  }
+  console.log(
+    `rendered ${scene.data.dots.length} dots → ${outputPath} ` +
+      `(${grid.cols}x${grid.rows} tiles of ${tileSize}px, ${Math.max(workers, 1)} workers)`,
+  );
 }
 
-main();
+main().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -0,0 +1,130 @@
+/**
+ * tiles.ts — Spatial grid index and streaming PNG output for tiled rendering.
+ *
+ * The output image is cut into fixed-size tiles. TileGrid buckets every dot
+ * into the tiles its bounding box overlaps, in draw order, so each tile can be
+ * rasterized on its own; PngWriter then streams finished bands of tiles into
+ * one PNG, so neither side ever holds the full image.
+ */
+
+import { once } from "events";
+import * as fs from "fs";
+import * as zlib from "zlib";
+
+export interface Tile {
+  x: number;
+  y: number;
+  w: number;
+  h: number;
+}
+
+export class TileGrid {
+  readonly cols: number;
+  readonly rows: number;
+  /** buckets[row * cols + col]: indices of the dots touching that tile, in draw order */
+  readonly buckets: number[][];
+
+  constructor(
+    readonly width: number,
+    readonly height: number,
+    readonly size: number,
+  ) {
+    this.cols = Math.max(1, Math.ceil(width / size));
+    this.rows = Math.max(1, Math.ceil(height / size));
+    this.buckets = Array.from({ length: this.cols * this.rows }, () => []);
+  }
+
+  /** Index dot i covering [x - r, x + r] × [y - r, y + r]; call in draw order. */
+  add(i: number, x: number, y: number, r: number): void {
+    const c0 = Math.max(0, Math.floor((x - r) / this.size));
+    const c1 = Math.min(this.cols - 1, Math.floor((x + r) / this.size));
+    const r0 = Math.max(0, Math.floor((y - r) / this.size));
+    const r1 = Math.min(this.rows - 1, Math.floor((y + r) / this.size));
+    for (let row = r0; row <= r1; row++) {
+      for (let col = c0; col <= c1; col++) {
+        this.buckets[row * this.cols + col].push(i);
+      }
+    }
+  }
+
+  tile(index: number): Tile {
+    const x = (index % this.cols) * this.size;
+    const y = Math.floor(index / this.cols) * this.size;
+    return {
+      x,
+      y,
+      w: Math.min(this.size, this.width - x),
+      h: Math.min(this.size, this.height - y),
+    };
+  }
+}
+
+const CRC_TABLE = new Int32Array(256).map((_, n) => {
+  let c = n;
+  for (let k = 0; k < 8; k++) c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+  return c;
+});
+
+function crc32(data: Buffer, crc = 0): number {
+  let c = ~crc;
+  for (let i = 0; i < data.length; i++) c = CRC_TABLE[(c ^ data[i]) & 0xff] ^ (c >>> 8);
+  return ~c >>> 0;
+}
+
+/** 8-bit RGB PNG written band by band through one zlib stream. */
+export class PngWriter {
+  private fd: number;
+  private deflate = zlib.createDeflate({ level: 6 });
+
+  constructor(
+    path: string,
+    readonly width: number,
+    readonly height: number,
+  ) {
+    this.fd = fs.openSync(path, "w");
+    fs.writeSync(this.fd, Buffer.from([0x89, 0x50, 0x4e, 0x47, 0x0d, 0x0a, 0x1a, 0x0a]));
+    const ihdr = Buffer.alloc(13);
+    ihdr.writeUInt32BE(width, 0);
+    ihdr.writeUInt32BE(height, 4);
+    ihdr[8] = 8; // bit depth
+    ihdr[9] = 2; // color type: RGB
+    this.chunk("IHDR", ihdr);
+    this.deflate.on("data", (data: Buffer) => this.chunk("IDAT", data));
+  }
+
+  private chunk(type: string, data: Buffer): void {
+    const head = Buffer.alloc(8);
+    head.writeUInt32BE(data.length, 0);
+    head.write(type, 4, "ascii");
+    const tail = Buffer.alloc(4);
+    tail.writeUInt32BE(crc32(data, crc32(head.subarray(4))), 0);
+    fs.writeSync(this.fd, head);
+    fs.writeSync(this.fd, data);
+    fs.writeSync(this.fd, tail);
+  }
+
+  /** Append full-width RGB rows (width × 3 bytes each, top to bottom). */
+  async writeRows(rgb: Buffer): Promise<void> {
+    const stride = this.width * 3;
+    const rows = rgb.length / stride;
+    // Each scanline gets PNG filter 1 (Sub): bytes minus the pixel to the left
+    const out = Buffer.alloc(rows * (stride + 1));
+    for (let y = 0; y < rows; y++) {
+      const src = y * stride;
+      const dst = y * (stride + 1);
+      out[dst] = 1;
+      for (let i = 0; i < stride; i++) {
+        out[dst + 1 + i] = i < 3 ? rgb[src + i] : rgb[src + i] - rgb[src + i - 3];
+      }
+    }
+    if (!this.deflate.write(out)) await once(this.deflate, "drain");
+  }
+
+  async close(): Promise<void> {
+    const ended = once(this.deflate, "end");
+    this.deflate.end();
+    await ended;
+    this.chunk("IEND", Buffer.alloc(0));
+    fs.closeSync(this.fd);
+  }
+}
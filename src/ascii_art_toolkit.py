@@ -1,9 +1,11 @@
+from collections.abc import Iterator
 from pathlib import Path
-from typing import Optional
 
 import cv2
 import numpy as np
 
+from . import metrics
+
 # Fixed cell dimensions (half-width monospace character proportions).
 CELL_H = 16
 CELL_W = 8  # half-width: exactly CELL_H / 2
@@ -36,21 +38,10 @@ def _line_art_edges(gray: np.ndarray, target_h: int, target_w: int) -> np.ndarra
     return skel.astype(np.uint8) * 255
 
 
-def _sam_edges(
-    img_rgb: np.ndarray,
-    target_h: int,
-    target_w: int,
-    checkpoint: str,
-    model_type: str = "vit_h",
-) -> np.ndarray:
-    """Derive a skeletonized edge map from the main SAM object boundary.
-
-    Uses SamPredictor with a center-point prompt to find the primary subject,
-    then skeletonizes its boundary to 1-pixel-wide strokes.
-    """
+def _load_sam(checkpoint: str, model_type: str = "vit_h"):
+    """Load SAM weights once per (checkpoint, model_type) and keep them on device."""
     import torch
-    from segment_anything import SamPredictor, sam_model_registry
-    from skimage.morphology import skeletonize
+    from segment_anything import sam_model_registry
 
     cache_key = (checkpoint, model_type)
     if cache_key not in _sam_cache:
@@ -58,11 +49,44 @@ def _sam_edges(
         sam = sam_model_registry[model_type](checkpoint=checkpoint)
         sam.to(device=device)
         _sam_cache[cache_key] = sam
-    sam = _sam_cache[cache_key]
+    return _sam_cache[cache_key]
 
-    h, w = img_rgb.shape[:2]
-    predictor = SamPredictor(sam)
-    predictor.set_image(img_rgb)
+
+def _sam_embed_batch(sam, images_rgb: list[np.ndarray]) -> list[tuple]:
+    """Run the SAM image encoder on several images in one forward pass.
+
+    Mirrors SamPredictor.set_image (longest-side resize, normalize, pad) for
+    each image, then stacks them so the ViT encoder sees a single batch.
+    Returns (features, original_size, input_size) per image, in input order.
+    """
+    import torch
+    from segment_anything.utils.transforms import ResizeLongestSide
+
+    transform = ResizeLongestSide(sam.image_encoder.img_size)
+    inputs, sizes = [], []
+    for img in images_rgb:
+        resized = torch.as_tensor(transform.apply_image(img), device=sam.device)
+        resized = resized.permute(2, 0, 1).contiguous()[None, :, :, :]
+        inputs.append(sam.preprocess(resized))
+        sizes.append((img.shape[:2], tuple(resized.shape[-2:])))
+
+    with torch.no_grad():
+        features = sam.image_encoder(torch.cat(inputs))
+    return [
+        (features[i : i + 1], original_size, input_size)
+        for i, (original_size, input_size) in enumerate(sizes)
+    ]
+
+
+def _sam_mask_edges(predictor, target_h: int, target_w: int) -> np.ndarray:
+    """Skeletonize the boundary of the main object in an embedded image.
+
+    Uses a center-point prompt to find the primary subject, then skeletonizes
+    its boundary to 1-pixel-wide strokes.
+    """
+    from skimage.morphology import skeletonize
+
+    h, w = predictor.original_size
 
     # Center-point prompt: ask SAM "what is the main object here?"
     masks_out, scores, _ = predictor.predict(
@@ -72,30 +96,126 @@ def _sam_edges(
     )
     mask = masks_out[int(scores.argmax())]
 
-    kernel = np.ones((3, 3), np.uint8)
     seg = mask.astype(np.uint8) * 255
-    edge_map = cv2.dilate(seg, kernel) - cv2.erode(seg, kernel)
+    # Downscale the filled mask, not its boundary: a 1-px outline traced at
+    # full resolution loses most of its pixels to the resize
+    if seg.shape != (target_h, target_w):
+        seg = cv2.resize(seg, (target_w, target_h), interpolation=cv2.INTER_AREA)
+        seg = np.where(seg >= 128, np.uint8(255), np.uint8(0))
 
-    if edge_map.shape != (target_h, target_w):
-        edge_map = cv2.resize(
-            edge_map, (target_w, target_h), interpolation=cv2.INTER_NEAREST
-        )
+    kernel = np.ones((3, 3), np.uint8)
+    edge_map = cv2.dilate(seg, kernel) - cv2.erode(seg, kernel)
 
     skel = skeletonize(edge_map > 0)
     return skel.astype(np.uint8) * 255
 
 
+def _sam_edges_batch(
+    images_rgb: list[np.ndarray],
+    targets: list[tuple[int, int]],
+    checkpoint: str,
+    model_type: str = "vit_h",
+    use_cache: bool = True,
+) -> list[np.ndarray]:
+    """Derive skeletonized SAM boundary edge maps for several images.
+
+    The model is loaded once; images whose embedding is not in the on-disk
+    SamEmbeddingCache (or all of them without use_cache) go through the
+    encoder together as one batch. targets holds (target_h, target_w) per
+    image. Returns the edge maps in input order.
+    """
+    from segment_anything import SamPredictor
+
+    from .sam_cache import SamEmbeddingCache, restore_embedding
+
+    sam = _load_sam(checkpoint, model_type)
+    predictor = SamPredictor(sam)
+    embeddings = SamEmbeddingCache() if use_cache else None
+
+    keys: list[str | None] = [None] * len(images_rgb)
+    cached: dict[int, tuple] = {}
+    misses: list[int] = []
+    for i, img in enumerate(images_rgb):
+        if embeddings is not None:
+            keys[i] = embeddings.key(img, checkpoint, model_type)
+            if embeddings.load(keys[i], predictor):
+                cached[i] = (
+                    predictor.features,
+                    predictor.original_size,
+                    predictor.input_size,
+                )
+                continue
+        misses.append(i)
+
+    if misses:
+        with metrics.stage("sam_embed"):
+            batch = _sam_embed_batch(sam, [images_rgb[i] for i in misses])
+        for i, embedding in zip(misses, batch):
+            cached[i] = embedding
+            if embeddings is not None:
+                restore_embedding(predictor, *embedding)
+                embeddings.store(keys[i], predictor)
+
+    edges = []
+    for i, (target_h, target_w) in enumerate(targets):
+        restore_embedding(predictor, *cached[i])
+        edges.append(_sam_mask_edges(predictor, target_h, target_w))
+    return edges
+
+
+def _sam_edges(
+    img_rgb: np.ndarray,
+    target_h: int,
+    target_w: int,
+    checkpoint: str,
+    model_type: str = "vit_h",
+    use_cache: bool = True,
+) -> np.ndarray:
+    """Derive a skeletonized edge map from the main SAM object boundary.
+
+    Single-image form of _sam_edges_batch. With use_cache the image embedding
+    is read from / written to the on-disk SamEmbeddingCache, so re-rendering
+    the same image skips the ViT encoder.
+    """
+    return _sam_edges_batch(
+        [img_rgb], [(target_h, target_w)], checkpoint, model_type, use_cache
+    )[0]
+
+
+# Bilateral filter diameter for _canny_edges; a pixel's output depends only on
+# input pixels within BILATERAL_D // 2
+_BILATERAL_D = 9
+
+
+def _bilateral(gray: np.ndarray) -> np.ndarray:
+    return cv2.bilateralFilter(gray, d=_BILATERAL_D, sigmaColor=75, sigmaSpace=75)
+
+
+def _otsu_level(smooth: np.ndarray) -> float:
+    """Otsu's threshold of a _bilateral()-smoothed image: Canny's high threshold."""
+    otsu, _ = cv2.threshold(smooth, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return float(otsu)
+
+
 def _canny_edges(gray: np.ndarray, target_h: int, target_w: int) -> np.ndarray:
     """Return a skeletonized edge map via bilateral-filtered Canny.
 
     Bilateral filter smooths texture while preserving structural edges, giving
-    Canny cleaner input than raw grayscale. Thresholds are auto-tuned via Otsu.
+    Canny cleaner input than raw grayscale. Thresholds are auto-tuned via Otsu
+    on the smoothed image.
     """
+    smooth = _bilateral(gray)
+    return _canny_skeleton(smooth, _otsu_level(smooth), target_h, target_w)
+
+
+def _canny_skeleton(
+    smooth: np.ndarray, otsu: float, target_h: int, target_w: int
+) -> np.ndarray:
+    """Canny + skeleton of a smoothed image (or a tile of one) with Otsu-based
+    thresholds; ascii_video passes a tile with the whole frame's level."""
     from skimage.morphology import skeletonize
 
-    smooth = cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
-    otsu, _ = cv2.threshold(smooth, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    edges = cv2.Canny(smooth, max(float(otsu) * 0.33, 10.0), float(otsu))
+    edges = cv2.Canny(smooth, max(otsu * 0.33, 10.0), otsu)
 
     if edges.shape != (target_h, target_w):
         edges = cv2.resize(edges, (target_w, target_h), interpolation=cv2.INTER_NEAREST)
@@ -114,6 +234,10 @@ _EDGE_CHARS_TABLE = [
 ]
 # edge-pixel density (0-255 cell mean) thresholds → intensity 0-4
 _INTENSITY_BREAKS = [5.0, 25.0, 65.0, 130.0]
+# Fancy-indexable form of _EDGE_CHARS_TABLE: _EDGE_CHARS[direction, intensity]
+_EDGE_CHARS = np.array(_EDGE_CHARS_TABLE)
+# Mean-angle bin edges between the four directions (degrees)
+_DIRECTION_BREAKS = (22.5, 67.5, 112.5, 157.5)
 
 _H_CHARS = frozenset("╌─━▀")
 _V_CHARS = frozenset("╎│┃▌")
@@ -174,102 +298,215 @@ def _classify_edge_cell(
     return _EDGE_CHARS_TABLE[direction][intensity]
 
 
+def _classify_cells(
+    edges: np.ndarray, gx: np.ndarray, gy: np.ndarray, grid_rows: int, grid_cols: int
+) -> np.ndarray:
+    """Vectorized _classify_edge_cell over every cell; returns a (rows, cols) char array.
+
+    The maps are viewed as (rows, CELL_H, cols, CELL_W) blocks so density, peak
+    magnitude and the masked double-angle mean are a handful of array ops.
+    """
+    shape = (grid_rows, CELL_H, grid_cols, CELL_W)
+    density = edges.reshape(shape).mean(axis=(1, 3))
+    intensity = np.searchsorted(_INTENSITY_BREAKS, density, side="right")
+
+    mag = np.hypot(gx, gy).reshape(shape)
+    peak = mag.max(axis=(1, 3))
+    mask = mag > (peak * 0.3)[:, np.newaxis, :, np.newaxis]
+    count = mask.sum(axis=(1, 3))
+
+    # Edge angle is the gradient angle φ rotated by 90°, so its double angle is
+    # 2φ + 180°: cos = -(gx² - gy²) / mag², sin = -2·gx·gy / mag² (no trig needed)
+    gx_b, gy_b = gx.reshape(shape), gy.reshape(shape)
+    inv_sq = np.where(mask, 1.0 / np.where(mask, mag * mag, 1.0), 0.0)
+    safe_count = np.maximum(count, 1)
+    mc = -((gx_b * gx_b - gy_b * gy_b) * inv_sq).sum(axis=(1, 3)) / safe_count
+    ms = -((2.0 * gx_b * gy_b) * inv_sq).sum(axis=(1, 3)) / safe_count
+    mean_angle = np.degrees(np.arctan2(ms, mc)) / 2.0 % 180.0
+
+    # bins: [0, 22.5) H, [22.5, 67.5) \, [67.5, 112.5) V, [112.5, 157.5] /, > 157.5 H
+    direction = np.select(
+        [
+            (mean_angle < 22.5) | (mean_angle > 157.5),
+            mean_angle < 67.5,
+            mean_angle < 112.5,
+        ],
+        [0, 3, 1],
+        default=2,
+    )
+    blank = (intensity == 0) | (peak == 0) | (count == 0)
+    chars = np.where(blank, " ", _EDGE_CHARS[direction, np.minimum(intensity, 4)])
+
+    # The closed-form double angle and block sums round differently from the
+    # scalar path; re-run it where that could flip a bin (mean angle on a bin
+    # edge, or an almost uniform spread where the mean angle is ill-defined).
+    near = np.hypot(mc, ms) < 1e-9
+    for b in _DIRECTION_BREAKS:
+        near |= np.abs(mean_angle - b) < 1e-9
+    for r, c in zip(*np.nonzero(near & ~blank)):
+        y0, x0 = r * CELL_H, c * CELL_W
+        chars[r, c] = _classify_edge_cell(
+            gx[y0 : y0 + CELL_H, x0 : x0 + CELL_W],
+            gy[y0 : y0 + CELL_H, x0 : x0 + CELL_W],
+            CELL_H,
+            float(density[r, c]),
+        )
+    return chars
+
+
+# Direction-family codes for _merge_edge_segments
+_SPACE, _FAM_H, _FAM_V, _FAM_D1, _FAM_D2, _OTHER = range(6)
+_FAMILY_CODEPOINTS = {
+    _FAM_H: [ord(ch) for ch in _H_CHARS],
+    _FAM_V: [ord(ch) for ch in _V_CHARS],
+    _FAM_D1: [ord(ch) for ch in _D1_CHARS],
+    _FAM_D2: [ord(ch) for ch in _D2_CHARS],
+}
+# Merge passes in order: (family, row step, col step) along each scan line
+_MERGE_PASSES = [
+    (_FAM_H, 0, 1),  # horizontal
+    (_FAM_V, 1, 0),  # vertical
+    (_FAM_D1, 1, 1),  # diagonal \ (c - r = k)
+    (_FAM_D2, 1, -1),  # diagonal / (r + c = k), scanned top-right to bottom-left
+]
+_NEIGHBOR_KERNEL = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]], dtype=np.float32)
+
+
+def _fill_gaps(
+    codes: np.ndarray,
+    chars: np.ndarray,
+    family: int,
+    dr: int,
+    dc: int,
+    max_gap: int,
+) -> None:
+    """Fill, in place, runs of 1..max_gap spaces bounded by `family` on both ends
+    of a scan line with step (dr, dc); the fill copies the preceding char."""
+    nrows, ncols = codes.shape
+    pad = max_gap + 1
+    padded = np.pad(codes, pad, constant_values=_OTHER)
+
+    def at(k: int) -> np.ndarray:
+        # codes[r + k*dr, c + k*dc] for every (r, c); off-grid reads _OTHER
+        r0, c0 = pad + k * dr, pad + k * dc
+        return padded[r0 : r0 + nrows, c0 : c0 + ncols]
+
+    starts = at(-1) == family
+    gap = starts.copy()
+    for length in range(1, max_gap + 1):
+        gap &= at(length - 1) == _SPACE
+        rs, cs = np.nonzero(gap & (at(length) == family))
+        fill = chars[rs - dr, cs - dc]
+        for i in range(length):
+            chars[rs + i * dr, cs + i * dc] = fill
+            codes[rs + i * dr, cs + i * dc] = family
+
+
 def _merge_edge_segments(rows: list[str], max_gap: int = 2) -> list[str]:
     """Fill small gaps between co-directional edge chars and remove isolated noise.
 
-    For each direction (H / V / diagonal), scans sequences and fills spaces
-    of length <= max_gap that lie between two runs of the same char family.
-    Then removes any edge char with no non-space 8-connected neighbor.
+    For each direction (H / V / diagonal), fills spaces of length <= max_gap
+    that lie between two runs of the same char family. Then removes any edge
+    char with no non-space 8-connected neighbor.
+
+    The grid is held as a codepoint array plus a direction-family code array;
+    gaps are found with shifted views per axis and noise with a 3×3
+    neighbor-count convolution.
     """
     if not rows:
         return rows
 
     nrows = len(rows)
     ncols = max(len(r) for r in rows)
-    grid = [list(r.ljust(ncols)) for r in rows]
-
-    def _fill_seq(seq: list[str], char_set: frozenset[str]) -> None:
-        n = len(seq)
-        runs: list[tuple[int, int]] = []
-        i = 0
-        while i < n:
-            if seq[i] in char_set:
-                s = i
-                while i < n and seq[i] in char_set:
-                    i += 1
-                runs.append((s, i))
-            else:
-                i += 1
-        for k in range(len(runs) - 1):
-            gap_s, gap_e = runs[k][1], runs[k + 1][0]
-            if 0 < gap_e - gap_s <= max_gap and all(
-                seq[j] == " " for j in range(gap_s, gap_e)
-            ):
-                fill = seq[gap_s - 1]
-                for j in range(gap_s, gap_e):
-                    seq[j] = fill
-
-    # Horizontal
-    for r in range(nrows):
-        _fill_seq(grid[r], _H_CHARS)
-
-    # Vertical
-    for c in range(ncols):
-        col = [grid[r][c] for r in range(nrows)]
-        _fill_seq(col, _V_CHARS)
-        for r in range(nrows):
-            grid[r][c] = col[r]
-
-    # Diagonal \ (c - r = k)
-    for k in range(-(nrows - 1), ncols):
-        r0 = max(0, -k)
-        c0 = r0 + k
-        length = min(nrows - r0, ncols - c0)
-        coords = [(r0 + i, c0 + i) for i in range(length)]
-        if len(coords) >= 2:
-            seq = [grid[r][c] for r, c in coords]
-            _fill_seq(seq, _D1_CHARS)
-            for i, (r, c) in enumerate(coords):
-                grid[r][c] = seq[i]
-
-    # Diagonal / (r + c = k)
-    for k in range(nrows + ncols - 1):
-        r0 = max(0, k - ncols + 1)
-        c0 = k - r0
-        length = min(nrows - r0, c0 + 1)
-        coords = [(r0 + i, c0 - i) for i in range(length)]
-        if len(coords) >= 2:
-            seq = [grid[r][c] for r, c in coords]
-            _fill_seq(seq, _D2_CHARS)
-            for i, (r, c) in enumerate(coords):
-                grid[r][c] = seq[i]
+    if ncols == 0:
+        return ["" for _ in rows]
+    text = "".join(r.ljust(ncols) for r in rows)
+    chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).copy()
+    chars = chars.reshape(nrows, ncols)
+
+    codes = np.full(chars.shape, _OTHER, dtype=np.uint8)
+    codes[chars == ord(" ")] = _SPACE
+    for family, codepoints in _FAMILY_CODEPOINTS.items():
+        codes[np.isin(chars, codepoints)] = family
+
+    for family, dr, dc in _MERGE_PASSES:
+        _fill_gaps(codes, chars, family, dr, dc, max_gap)
 
     # Remove isolated noise: edge chars with no non-space 8-neighbor
-    to_clear = [
-        (r, c)
-        for r in range(nrows)
-        for c in range(ncols)
-        if grid[r][c] in _ALL_EDGE
-        and not any(
-            0 <= r + dr < nrows and 0 <= c + dc < ncols and grid[r + dr][c + dc] != " "
-            for dr in (-1, 0, 1)
-            for dc in (-1, 0, 1)
-            if (dr, dc) != (0, 0)
-        )
-    ]
-    for r, c in to_clear:
-        grid[r][c] = " "
+    occupied = (codes != _SPACE).astype(np.float32)
+    neighbors = cv2.filter2D(
+        occupied, -1, _NEIGHBOR_KERNEL, borderType=cv2.BORDER_CONSTANT
+    )
+    isolated = (codes != _SPACE) & (codes != _OTHER) & (neighbors < 0.5)
+    chars[isolated] = ord(" ")
+
+    return [row.tobytes().decode("utf-32-le").rstrip() for row in chars]
+
+
+def _rows_size(h: int, w: int, num_rows: int | None) -> tuple[int, int]:
+    """(height, width) of an h×w image after _resize_to_rows."""
+    if num_rows is None:
+        return h, w
+    target_h = num_rows * CELL_H
+    return target_h, int(w * (target_h / h))
+
+
+def _resize_to_rows(img_bgr: np.ndarray, num_rows: int | None) -> np.ndarray:
+    """Resize so the image is exactly num_rows * CELL_H tall (aspect preserved)."""
+    if num_rows is None:
+        return img_bgr
+    h, w = img_bgr.shape[:2]
+    target_h, target_w = _rows_size(h, w, num_rows)
+    interp = cv2.INTER_AREA if target_h < h else cv2.INTER_LINEAR
+    return cv2.resize(img_bgr, (target_w, target_h), interpolation=interp)
+
+
+def _grid_shape(img: np.ndarray, num_rows: int | None = None) -> tuple[int, int]:
+    """Cell grid of img once resized to num_rows (as is, when None)."""
+    h, w = _rows_size(*img.shape[:2], num_rows)
+    return max(1, h // CELL_H), max(1, w // CELL_W)
+
+
+def _rows_from_edges(
+    edges: np.ndarray,
+    grid_rows: int,
+    grid_cols: int,
+    out_dir: Path | None = None,
+    stem: str | None = None,
+) -> list[str]:
+    """Classify an edge map into ASCII rows, writing edges/txt to out_dir if given."""
+    if out_dir is not None:
+        with metrics.stage("write"):
+            cv2.imwrite(str(out_dir / f"{stem}_edges.png"), edges)
+
+    # Blur the edge map before Sobel so gradient direction comes from edge geometry,
+    # not image texture — avoids mis-classified angles in textured regions.
+    edge_blur = cv2.GaussianBlur(edges.astype(np.float32), (0, 0), sigmaX=2.0)
+    gx = cv2.Sobel(edge_blur, cv2.CV_64F, 1, 0, ksize=3)
+    gy = cv2.Sobel(edge_blur, cv2.CV_64F, 0, 1, ksize=3)
 
-    return ["".join(row).rstrip() for row in grid]
+    with metrics.stage("classify"):
+        chars = _classify_cells(edges, gx, gy, grid_rows, grid_cols)
+        rows = ["".join(row_chars) for row_chars in chars]
+
+        rows = _merge_edge_segments(rows)
+
+    if out_dir is not None and stem is not None:
+        txt_path = out_dir / f"{stem}_ascii.txt"
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(rows))
+
+    return rows
 
 
 def generate_ascii_art(
     img_bgr: np.ndarray,
-    num_rows: Optional[int] = None,
-    out_dir: Optional[Path] = None,
-    stem: Optional[str] = None,
-    sam_checkpoint: Optional[str] = None,
+    num_rows: int | None = None,
+    out_dir: Path | None = None,
+    stem: str | None = None,
+    sam_checkpoint: str | None = None,
     sam_model_type: str = "vit_h",
+    sam_cache: bool = True,
 ) -> list[str]:
     """Convert image to ASCII art and return rows as a list of strings.
 
@@ -279,74 +516,142 @@ def generate_ascii_art(
 
     Pass sam_checkpoint (path to .pth weights) to use SAM boundary edges
     instead of Canny. sam_model_type selects the ViT variant ("vit_h",
-    "vit_l", "vit_b"). The SAM model is cached after first load.
+    "vit_l", "vit_b"). The SAM model is cached after first load, and image
+    embeddings are cached on disk unless sam_cache is False.
 
     Pipeline:
     1. Resize to num_rows * CELL_H tall (preserve aspect ratio) if provided
-    2. Edge detection: SAM boundaries (if sam_checkpoint given), line-art
-       Otsu skeleton (if line art detected), or bilateral-Canny otherwise
-    3. Per 8×16 cell, classify angle char via Sobel on edge map
+    2. Edge detection: SAM boundaries (if sam_checkpoint given; SAM runs on
+       the full-size image and its edge map is resized to the grid),
+       line-art Otsu skeleton (if line art detected), or bilateral-Canny
+       otherwise
+    3. Per 8×16 cell, classify angle char via Sobel on edge map (all cells
+       at once on a block view of the maps)
     4. Write <stem>_ascii.txt to out_dir if both are given
     """
-    if num_rows is not None:
-        h, w = img_bgr.shape[:2]
-        target_h = num_rows * CELL_H
-        scale = target_h / h
-        target_w = int(w * scale)
-        interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
-        img_bgr = cv2.resize(img_bgr, (target_w, target_h), interpolation=interp)
-
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-
-    h, w = img_bgr.shape[:2]
-    grid_rows = max(1, h // CELL_H)
-    grid_cols = max(1, w // CELL_W)
+    grid_rows, grid_cols = _grid_shape(img_bgr, num_rows)
 
     if sam_checkpoint is not None:
+        # SAM sees the decoded image, so its cached embedding serves any
+        # num_rows; the mask edges are scaled down to the cell grid instead
         edges = _sam_edges(
-            img_rgb,
+            cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB),
             grid_rows * CELL_H,
             grid_cols * CELL_W,
             sam_checkpoint,
             sam_model_type,
+            use_cache=sam_cache,
         )
     else:
+        with metrics.stage("resize"):
+            img_bgr = _resize_to_rows(img_bgr, num_rows)
+        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
         gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
         if out_dir is not None:
             cv2.imwrite(str(out_dir / f"{stem}_gray.png"), gray)
-        if _is_line_art(img_rgb):
-            edges = _line_art_edges(gray, grid_rows * CELL_H, grid_cols * CELL_W)
-        else:
-            edges = _canny_edges(gray, grid_rows * CELL_H, grid_cols * CELL_W)
+        with metrics.stage("edges"):
+            if _is_line_art(img_rgb):
+                edges = _line_art_edges(gray, grid_rows * CELL_H, grid_cols * CELL_W)
+            else:
+                edges = _canny_edges(gray, grid_rows * CELL_H, grid_cols * CELL_W)
 
-    if out_dir is not None:
-        cv2.imwrite(str(out_dir / f"{stem}_edges.png"), edges)
+    return _rows_from_edges(edges, grid_rows, grid_cols, out_dir, stem)
 
-    # Blur the edge map before Sobel so gradient direction comes from edge geometry,
-    # not image texture — avoids mis-classified angles in textured regions.
-    edge_blur = cv2.GaussianBlur(edges.astype(np.float32), (0, 0), sigmaX=2.0)
-    gx = cv2.Sobel(edge_blur, cv2.CV_64F, 1, 0, ksize=3)
-    gy = cv2.Sobel(edge_blur, cv2.CV_64F, 0, 1, ksize=3)
 
-    rows = []
-    for row in range(grid_rows):
-        y0, y1 = row * CELL_H, (row + 1) * CELL_H
-        row_chars: list[str] = []
-        for col in range(grid_cols):
-            x0, x1 = col * CELL_W, (col + 1) * CELL_W
-            density = float(edges[y0:y1, x0:x1].mean())
-            char = _classify_edge_cell(gx[y0:y1, x0:x1], gy[y0:y1, x0:x1], CELL_H, density)
-            row_chars.append(char)
-        rows.append("".join(row_chars))
+def ascii_art_out_dir(img_path: Path) -> Path:
+    """Per-image output directory used by the ascii-art command: photo.jpg → photo/."""
+    return img_path.parent / img_path.stem
 
-    rows = _merge_edge_segments(rows)
 
-    if out_dir is not None and stem is not None:
-        txt_path = out_dir / f"{stem}_ascii.txt"
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(rows))
+def _ascii_art_file(img_path: Path, num_rows: int | None) -> Path | None:
+    """Pool worker for the Canny / line-art path: read, convert, write outputs."""
+    with metrics.image(img_path):
+        with metrics.stage("decode"):
+            img = cv2.imread(str(img_path))
+        if img is None:
+            return None
+        out_dir = ascii_art_out_dir(img_path)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        generate_ascii_art(img, num_rows=num_rows, out_dir=out_dir, stem=img_path.stem)
+    return out_dir / f"{img_path.stem}_ascii.txt"
 
-    return rows
+
+def _read(img_path: Path) -> np.ndarray | None:
+    with metrics.image(img_path), metrics.stage("decode"):
+        return cv2.imread(str(img_path))
+
+
+def _ascii_art_edges_file(
+    img_path: Path, edges: np.ndarray, grid_rows: int, grid_cols: int
+) -> Path:
+    """Pool worker for the SAM path: classify precomputed edges and write outputs."""
+    out_dir = ascii_art_out_dir(img_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with metrics.image(img_path):
+        _rows_from_edges(edges, grid_rows, grid_cols, out_dir, img_path.stem)
+    return out_dir / f"{img_path.stem}_ascii.txt"
+
+
+def ascii_art_batch(
+    img_paths: list[Path],
+    num_rows: int | None = None,
+    sam_checkpoint: str | None = None,
+    sam_model_type: str = "vit_h",
+    sam_cache: bool = True,
+    workers: int | None = None,
+    batch_size: int = 4,
+) -> Iterator[tuple[Path, Path | None]]:
+    """Convert many images to ASCII art, yielding (image, txt path) in input order.
+
+    Outputs go to the same per-image directories as single-file runs. The
+    CPU-bound edge detection and cell classification run in a process pool
+    of `workers` processes. With sam_checkpoint the model is loaded once in
+    this process and images are embedded batch_size at a time, while the
+    pool classifies the previous batch. The txt path is None for images
+    that could not be read.
+    """
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if sam_checkpoint is None:
+            futures: list[Future] = [
+                pool.submit(_ascii_art_file, p, num_rows) for p in img_paths
+            ]
+            for img_path, future in zip(img_paths, futures):
+                yield img_path, future.result()
+            return
+
+        pending: list[tuple[Path, Future | None]] = []
+        for start in range(0, len(img_paths), batch_size):
+            chunk = img_paths[start : start + batch_size]
+            loaded = [_read(p) for p in chunk]
+            ok = [img for img in loaded if img is not None]
+            grids = [_grid_shape(img, num_rows) for img in ok]
+            targets = [(r * CELL_H, c * CELL_W) for r, c in grids]
+            rgb = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in ok]
+            edge_maps = iter(
+                _sam_edges_batch(
+                    rgb, targets, sam_checkpoint, sam_model_type, sam_cache
+                )
+            )
+            for img_path, img in zip(chunk, loaded):
+                future = None
+                if img is not None:
+                    future = pool.submit(
+                        _ascii_art_edges_file,
+                        img_path,
+                        next(edge_maps),
+                        *_grid_shape(img, num_rows),
+                    )
+                pending.append((img_path, future))
+
+            # Keep input order: hand back results up to the first unfinished one
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                img_path, future = pending.pop(0)
+                yield img_path, future.result() if future else None
+
+        for img_path, future in pending:
+            yield img_path, future.result() if future else None
 
 
 def ascii_art_font_available() -> bool:
@@ -0,0 +1,462 @@
+"""
+ASCII .txt → styled PNG / e-paper frame, rendered in-process.
+
+Python port of render/src/render.ts. Instead of laying out HTML in headless
+Chrome, every glyph is rasterized once per (font, size) into a GlyphAtlas with
+Pillow and the art grid is composed by indexing that atlas, so a render is a
+handful of array operations. The frame layout (3:4 portrait, art ≈ 80% of
+the height, optional BBS header + info panel) and the --scanlines CRT look
+follow the TypeScript renderer.
+"""
+
+import math
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .ascii_art_toolkit import _EDGE_CHARS_TABLE
+
+FONT_PATH = Path(__file__).parent.parent / "SarasaMonoSC-Regular.ttf"
+DEFAULT_FONT_SIZE = 14
+DEFAULT_COLOR = "#ffffff"
+DEFAULT_MIN_HEIGHT = 1440
+PADDING = 40  # px around the art
+
+_BACKGROUND = "#0a0a0a"
+_BACKGROUND_SCANLINES = "#1b1b1b"
+_BORDER_COLOR = "#333333"
+_CORNER_RADIUS = 12
+
+# Colour helpers of the BBS header / info panel
+_WHITE = "#c8c8c8"
+_ORANGE = "#ff8c00"
+_YELLOW = "#ffff32"
+_GREEN = "#32c864"
+_CYAN = "#64ffc8"
+_RED = "#ff3232"
+
+_BBS_HEADER = [
+    [
+        (_WHITE, "歡迎光臨 "),
+        (_ORANGE, "5525"),
+        (_WHITE, " 回到第一天 [目前共有 "),
+        (_YELLOW, "5525"),
+        (_WHITE, " 人上線]"),
+    ],
+    [
+        (_WHITE, "請輸入代號 (試用請輸入 `"),
+        (_GREEN, "guest"),
+        (_WHITE, "`，注冊請輸入 `"),
+        (_GREEN, "new"),
+        (_WHITE, "`) ："),
+        (_YELLOW, "mayday"),
+    ],
+    [(_WHITE, "請輸入密碼："), (_WHITE, "*******")],
+]
+
+_CROWN = [
+    "       /\\",
+    "      /  \\",
+    "|\\   /    \\   /|",
+    "| \\ /      \\ / |",
+    "|  X        X  |",
+    "| / \\      / \\ |",
+    "|/   \\    /   \\|",
+    "|      ||      |",
+    "|______/\\______|",
+]
+
+# Info panel column: (colour, text, font size in em); None marks the crown
+_PANEL_ITEMS = [
+    (_WHITE, "25", 1.0),
+    None,
+    (_RED, "歡 迎 光 臨", 1.4),
+    (_CYAN, "5525 回到那一天 XMN 站", 1.0),
+    (_YELLOW, "Welcome to #5525 LIVE TOUR", 1.0),
+    (_GREEN, "*" * 40, 0.7),
+    (_YELLOW, "In 2025.5.25", 1.0),
+    (_YELLOW, "5521~5525", 1.0),
+]
+_PANEL_WIDTH_EM = 22
+_PANEL_GAP = 10
+_PANEL_FIRST_MARGIN = 8
+_LINE_HEIGHT = 1.4  # body text
+_HEADER_LINE_HEIGHT = 1.6
+_CROWN_LINE_HEIGHT = 1.2
+
+
+def _hex_to_bgr(color: str) -> tuple[int, int, int]:
+    value = color.lstrip("#")
+    r, g, b = (int(value[i : i + 2], 16) for i in (0, 2, 4))
+    return b, g, r
+
+
+@lru_cache(maxsize=32)
+def _font(font_path: str, size: int):
+    from PIL import ImageFont
+
+    return ImageFont.truetype(font_path, size)
+
+
+class GlyphAtlas:
+    """
+    One rasterized coverage mask per character, all in a single
+    (glyphs, cell_h, cell_w) float32 array.
+
+    Cells are one half-width advance wide and one em tall (line-height 1,
+    as in the <pre> of render.ts); glyphs are drawn with the same vertical
+    centring a browser uses and clipped to their cell. Unknown characters are
+    rasterized on first use and appended.
+    """
+
+    def __init__(self, font_path: str | Path, font_size: int) -> None:
+        self.font = _font(str(font_path), font_size)
+        self.cell_w = max(1, round(self.font.getlength("M")))
+        self.cell_h = font_size
+        ascent, descent = self.font.getmetrics()
+        self._top = (self.cell_h - (ascent + descent)) / 2
+        self._index: dict[int, int] = {}
+        self.glyphs = np.zeros((0, self.cell_h, self.cell_w), np.float32)
+        self.add(" " + "".join(c for row in _EDGE_CHARS_TABLE for c in row))
+
+    def add(self, chars: str) -> None:
+        from PIL import Image, ImageDraw
+
+        new = [c for c in dict.fromkeys(chars) if ord(c) not in self._index]
+        if not new:
+            return
+        masks = []
+        for c in new:
+            img = Image.new("L", (self.cell_w, self.cell_h), 0)
+            ImageDraw.Draw(img).text((0, self._top), c, fill=255, font=self.font)
+            masks.append(np.asarray(img, np.float32) / 255.0)
+            self._index[ord(c)] = len(self._index)
+        self.glyphs = np.concatenate([self.glyphs, np.stack(masks)])
+
+    def compose(self, rows: list[str]) -> np.ndarray:
+        """Blit rows of text into one coverage mask of shape (rows·cell_h, cols·cell_w)."""
+        n_cols = max((len(r) for r in rows), default=0)
+        codes = np.full((len(rows), n_cols), ord(" "), np.uint32)
+        for i, row in enumerate(rows):
+            codes[i, : len(row)] = [ord(c) for c in row]
+
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        self.add("".join(map(chr, uniq)))
+        lut = np.array([self._index[int(cp)] for cp in uniq], np.intp)
+        tiles = self.glyphs[lut[inverse.reshape(codes.shape)]]
+        n_rows = len(rows)
+        return tiles.transpose(0, 2, 1, 3).reshape(
+            n_rows * self.cell_h, n_cols * self.cell_w
+        )
+
+
+@lru_cache(maxsize=8)
+def glyph_atlas(font_path: str | Path = FONT_PATH, font_size: int = 14) -> GlyphAtlas:
+    """Shared atlas per (font, pixel size); built once per process."""
+    return GlyphAtlas(font_path, font_size)
+
+
+class _Canvas:
+    """Coloured coverage masks, composited over the background region by region."""
+
+    def __init__(self, width: int, height: int, bold_pre: int = 0) -> None:
+        self.size = (width, height)
+        self.blits: list[tuple[str, int, int, np.ndarray]] = []
+        self.pre = np.zeros((height, width), np.float32)  # text that gets CRT shadows
+        self.bold_pre = bold_pre  # faux-bold offset in px for <pre> text
+
+    def blit(self, color: str, x: int, y: int, mask: np.ndarray, pre: bool) -> None:
+        w, h = self.size
+        mask = mask[: h - y, : w - x]
+        if mask.size == 0:
+            return
+        if pre and self.bold_pre:
+            bold = mask.copy()
+            np.maximum(
+                bold[:, self.bold_pre :],
+                mask[:, : -self.bold_pre],
+                out=bold[:, self.bold_pre :],
+            )
+            mask = bold
+        self.blits.append((color, x, y, mask))
+        if pre:
+            region = self.pre[y : y + mask.shape[0], x : x + mask.shape[1]]
+            np.maximum(region, mask, out=region)
+
+    def composite(self, out: np.ndarray) -> None:
+        for color, x, y, mask in self.blits:
+            region = out[y : y + mask.shape[0], x : x + mask.shape[1]]
+            region += (np.array(_hex_to_bgr(color), np.float32) - region) * mask[
+                :, :, None
+            ]
+
+    def text(
+        self, color: str, x: float, y: float, text: str, font, line_h: float, pre=False
+    ) -> None:
+        """Draw one line of text whose line box starts at (x, y)."""
+        from PIL import Image, ImageDraw
+
+        ascent, descent = font.getmetrics()
+        width = math.ceil(font.getlength(text)) + 2
+        height = max(1, math.ceil(line_h))
+        img = Image.new("L", (width, height), 0)
+        top = (line_h - (ascent + descent)) / 2
+        ImageDraw.Draw(img).text((0, top), text, fill=255, font=font)
+        self.blit(color, round(x), round(y), np.asarray(img, np.float32) / 255.0, pre)
+
+
+def _panel_height(fs: float) -> float:
+    height = _PANEL_FIRST_MARGIN + _PANEL_GAP * (len(_PANEL_ITEMS) - 1)
+    for item in _PANEL_ITEMS:
+        if item is None:
+            height += len(_CROWN) * _CROWN_LINE_HEIGHT * fs
+        else:
+            height += item[2] * fs * _LINE_HEIGHT
+    return height
+
+
+def _frame_layout(
+    art_w: float,
+    art_h: float,
+    header_w: float,
+    fs: float,
+    info_panel: bool,
+    aspect: float = 3 / 4,
+) -> tuple[float, float, float, float]:
+    """Return (frame_w, frame_h, natural_w, natural_h) in CSS px, as in render.ts.
+
+    aspect is the frame's width / height (render.ts uses 3:4 portrait).
+    """
+    row_w, row_h = art_w, art_h
+    natural_h = 2 * PADDING
+    if info_panel:
+        row_w += PADDING + _PANEL_WIDTH_EM * fs
+        row_h = max(row_h, _panel_height(fs))
+        natural_h += len(_BBS_HEADER) * _HEADER_LINE_HEIGHT * fs + PADDING
+    natural_w = 2 * PADDING + max(row_w, header_w)
+    natural_h += row_h
+
+    # <pre> takes ~80% of the height at the given aspect ratio; take whichever
+    # constraint needs more space so nothing is clipped
+    h_from_pre = math.ceil(art_h / 0.8)
+    w_from_pre = math.ceil(h_from_pre * aspect)
+    if w_from_pre >= natural_w:
+        frame_w, frame_h = w_from_pre, h_from_pre
+    else:
+        frame_w = math.ceil(natural_w)
+        frame_h = max(math.ceil(natural_w / aspect), h_from_pre)
+    return frame_w, max(frame_h, math.ceil(natural_h)), natural_w, natural_h
+
+
+def _crt_overlay(img: np.ndarray, scale: int) -> np.ndarray:
+    """Scanlines, corner vignette, top-left glare and rounded corners."""
+    h, w = img.shape[:2]
+    out = img.astype(np.float32)
+
+    ys = (np.arange(h, dtype=np.float32) + 0.5)[:, None]
+    xs = (np.arange(w, dtype=np.float32) + 0.5)[None, :]
+
+    # repeating-linear-gradient(0deg, transparent 0-2px, rgba(0,0,0,.55) 2-4px)
+    from_bottom = (h - 1 - np.arange(h)) % (4 * scale)
+    out[from_bottom >= 2 * scale] *= 0.45
+
+    # radial-gradient(ellipse at center, transparent 50%, rgba(0,0,0,.88) 100%)
+    d = np.hypot(
+        (xs - w / 2) / (w / 2 * math.sqrt(2)), (ys - h / 2) / (h / 2 * math.sqrt(2))
+    )
+    out *= (1 - np.clip((d - 0.5) / 0.5, 0, 1) * 0.88)[:, :, None]
+
+    # radial-gradient(ellipse at 28% 18%, rgba(255,255,255,.05) 0%, transparent 55%)
+    d = np.hypot(
+        (xs - 0.28 * w) / (0.72 * w * math.sqrt(2)),
+        (ys - 0.18 * h) / (0.82 * h * math.sqrt(2)),
+    )
+    glare = (np.clip(1 - d / 0.55, 0, 1) * 0.05)[:, :, None]
+    out += (255 - out) * glare
+
+    # overflow: hidden + border-radius leaves the corners on the plain body
+    r = _CORNER_RADIUS * scale
+    cx = np.clip(xs, r, w - r)
+    cy = np.clip(ys, r, h - r)
+    outside = np.hypot(xs - cx, ys - cy) > r
+    out[outside] = img[outside]
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+
+def render_ascii(
+    rows: list[str],
+    font_path: str | Path = FONT_PATH,
+    font_size: int = DEFAULT_FONT_SIZE,
+    color: str = DEFAULT_COLOR,
+    min_height: int = DEFAULT_MIN_HEIGHT,
+    info_panel: bool = False,
+    scanlines: bool = False,
+    aspect: float = 3 / 4,
+) -> np.ndarray:
+    """Render ASCII rows to a BGR image laid out like render.ts.
+
+    The frame is sized in CSS px and then scaled by the smallest integer
+    factor that makes it at least min_height tall; fonts are rasterized at
+    the scaled size (like deviceScaleFactor) rather than upsampled. aspect
+    sets the frame's width / height (3:4 portrait by default).
+    """
+    font_path = str(font_path)
+    base = glyph_atlas(font_path, font_size)
+    n_rows = len(rows)
+    n_cols = max((len(r) for r in rows), default=0)
+    header_font = _font(font_path, font_size)
+    header_w = (
+        max(sum(header_font.getlength(t) for _, t in line) for line in _BBS_HEADER)
+        if info_panel
+        else 0.0
+    )
+    _, frame_h, _, _ = _frame_layout(
+        n_cols * base.cell_w,
+        n_rows * base.cell_h,
+        header_w,
+        font_size,
+        info_panel,
+        aspect,
+    )
+
+    s = max(1, math.ceil(min_height / frame_h))
+    fs = font_size * s
+    atlas = glyph_atlas(font_path, fs)
+    art = atlas.compose(rows)
+    art_h, art_w = art.shape
+    pad = PADDING * s
+    if info_panel:
+        font = _font(font_path, fs)
+        header_w = max(sum(font.getlength(t) for _, t in line) for line in _BBS_HEADER)
+    width, height, natural_w, natural_h = _frame_layout(
+        art_w / s, art_h / s, header_w / s, font_size, info_panel, aspect
+    )
+    width, height = width * s, height * s
+    canvas = _Canvas(width, height, bold_pre=s if scanlines else 0)
+
+    # Content block centred in the frame (extra space becomes padding)
+    x0 = (width - natural_w * s) / 2 + pad
+    y = (height - natural_h * s) / 2 + pad
+
+    if info_panel:
+        font = _font(font_path, fs)
+        line_h = _HEADER_LINE_HEIGHT * fs
+        for line in _BBS_HEADER:
+            x = x0
+            for c, text in line:
+                canvas.text(c, x, y, text, font, line_h)
+                x += font.getlength(text)
+            y += line_h
+        y += pad
+
+    panel_h = _panel_height(font_size) * s if info_panel else 0.0
+    row_h = max(art_h, panel_h)
+    canvas.blit(color, round(x0), round(y + (row_h - art_h) / 2), art, pre=True)
+
+    if info_panel:
+        _draw_panel(canvas, font_path, fs, s, x0 + art_w + pad, y, row_h, panel_h)
+
+    bg = _hex_to_bgr(_BACKGROUND_SCANLINES if scanlines else _BACKGROUND)
+    out = np.empty((height, width, 3), np.float32)
+    out[:] = bg
+
+    if scanlines:
+        # Lateral chromatic aberration: text-shadow -2px pink, +2px darker cyan
+        # (blur 2px) under the bold <pre> text
+        shift = 2 * s
+        sigma = max(0.5, float(s))
+        rows_on = np.flatnonzero(canvas.pre.any(axis=1))
+        cols_on = np.flatnonzero(canvas.pre.any(axis=0))
+        if rows_on.size:
+            reach = shift + math.ceil(3 * sigma)
+            ys = slice(max(0, rows_on[0] - reach), rows_on[-1] + reach + 1)
+            xs = slice(max(0, cols_on[0] - reach), cols_on[-1] + reach + 1)
+            region = out[ys, xs]
+            for dx, shadow in ((shift, "#41bcbc"), (-shift, "#db7497")):
+                m = np.roll(canvas.pre[ys, xs], dx, axis=1)
+                m = cv2.GaussianBlur(m, (0, 0), sigmaX=sigma)
+                color_bgr = np.array(_hex_to_bgr(shadow), np.float32)
+                region += (color_bgr - region) * m[:, :, None]
+
+    canvas.composite(out)
+
+    img = np.clip(out + 0.5, 0, 255).astype(np.uint8)
+    return _crt_overlay(img, s) if scanlines else img
+
+
+def _draw_panel(
+    canvas: _Canvas,
+    font_path: str,
+    fs: int,
+    s: int,
+    x: float,
+    row_top: float,
+    row_h: float,
+    panel_h: float,
+) -> None:
+    """Mayday 5525 info panel: border-left, then a centred column of lines."""
+    panel_w = _PANEL_WIDTH_EM * fs
+    border = np.ones((max(1, round(panel_h)), max(1, s)), np.float32)
+    y = row_top + (row_h - panel_h) / 2
+    canvas.blit(_BORDER_COLOR, round(x), round(y), border, pre=False)
+
+    inner_x = x + s + PADDING * s / 2
+    center = inner_x + (panel_w - s - PADDING * s / 2) / 2
+    for i, item in enumerate(_PANEL_ITEMS):
+        if item is None:
+            font = _font(font_path, fs)
+            line_h = _CROWN_LINE_HEIGHT * fs
+            left = center - max(font.getlength(line) for line in _CROWN) / 2
+            for line in _CROWN:
+                canvas.text(_WHITE, left, y, line, font, line_h, pre=True)
+                y += line_h
+        else:
+            c, text, em = item
+            font = _font(font_path, max(1, round(fs * em)))
+            line_h = em * fs * _LINE_HEIGHT
+            canvas.text(c, center - font.getlength(text) / 2, y, text, font, line_h)
+            y += line_h
+        y += _PANEL_GAP * s + (_PANEL_FIRST_MARGIN * s if i == 0 else 0)
+
+
+def render_ascii_file(
+    txt_path: str | Path,
+    output_path: str | Path | None = None,
+    **kwargs,
+) -> Path:
+    """Render <stem>.txt to <stem>_rendered.png (or output_path); see render_ascii."""
+    txt_path = Path(txt_path)
+    rows = txt_path.read_text(encoding="utf-8").split("\n")
+    out = (
+        Path(output_path)
+        if output_path
+        else txt_path.with_name(txt_path.stem + "_rendered.png")
+    )
+    cv2.imwrite(str(out), render_ascii(rows, **kwargs))
+    return out
+
+
+def ascii_frame(
+    rows: list[str],
+    width: int,
+    height: int,
+    method: str = "atkinson",
+    pack_opts: dict | None = None,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """Render ASCII rows straight to a panel frame.
+
+    The frame is laid out at the panel's aspect ratio and at least panel
+    height, area-resampled to width×height, then dithered and packed like
+    `geink process` output.
+
+    Returns (preview, packed, bpp) like encode_frame.
+    """
+    from .packing_toolkit import encode_frame
+
+    kwargs.setdefault("min_height", height)
+    img = render_ascii(rows, aspect=width / height, **kwargs)
+    bgr = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    return encode_frame(bgr, method, **(pack_opts or {}))
@@ -0,0 +1,411 @@
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+import cv2
+import numpy as np
+from loguru import logger
+
+from . import metrics
+from .config import TARGET_HEIGHT, TARGET_WIDTH
+
+# (height, width) of each corpus size
+SIZES: dict[str, tuple[int, int]] = {
+    "panel": (TARGET_HEIGHT, TARGET_WIDTH),
+    "4k": (2160, 3840),
+    "24mp": (4000, 6000),
+}
+
+
+def _rng(kind: str, h: int, w: int) -> np.random.Generator:
+    # Seeded per (corpus, size) so every run, and every machine, benches
+    # the same pixels
+    return np.random.default_rng([sum(map(ord, kind)), h, w])
+
+
+def _smooth_noise(rng: np.random.Generator, h: int, w: int, cells: int) -> np.ndarray:
+    small = rng.random((cells, max(1, cells * w // h), 3), dtype=np.float32)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+
+
+def gradient(h: int, w: int) -> np.ndarray:
+    """Horizontal BGR ramps plus a radial falloff: smooth tones, no texture."""
+    x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+    radial = 1 - np.hypot(x - 0.5, y - 0.5) * 1.4
+    img = np.stack([x + 0 * y, y + 0 * x, np.clip(radial, 0, 1)], axis=2)
+    return (img * 255).astype(np.uint8)
+
+
+def noise(h: int, w: int) -> np.ndarray:
+    """Uniform white noise: worst case for error diffusion and compression."""
+    return _rng("noise", h, w).integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+def photo(h: int, w: int) -> np.ndarray:
+    """Photo-like: soft color fields, mid-frequency texture, grain and a
+    subject on a flat backdrop (exercises the bounds / pad path)."""
+    rng = _rng("photo", h, w)
+    base = _smooth_noise(rng, h, w, 6) * 0.7 + _smooth_noise(rng, h, w, 48) * 0.3
+    img = (base * 255).astype(np.float32)
+    img += rng.normal(0, 6, (h, w, 3)).astype(np.float32)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    pad_y, pad_x = h // 10, w // 10
+    framed = np.full_like(img, 235)
+    framed[pad_y : h - pad_y, pad_x : w - pad_x] = img[
+        pad_y : h - pad_y, pad_x : w - pad_x
+    ]
+    return framed
+
+
+def line_art(h: int, w: int) -> np.ndarray:
+    """Black strokes on white: lines, circles and rectangles."""
+    rng = _rng("line_art", h, w)
+    img = np.full((h, w, 3), 255, np.uint8)
+    thickness = max(1, min(h, w) // 300)
+    for _ in range(60):
+        p1 = (int(rng.integers(w)), int(rng.integers(h)))
+        p2 = (int(rng.integers(w)), int(rng.integers(h)))
+        shape = rng.integers(3)
+        if shape == 0:
+            cv2.line(img, p1, p2, (0, 0, 0), thickness, cv2.LINE_AA)
+        elif shape == 1:
+            radius = int(rng.integers(min(h, w) // 40, min(h, w) // 6))
+            cv2.circle(img, p1, radius, (0, 0, 0), thickness, cv2.LINE_AA)
+        else:
+            cv2.rectangle(img, p1, p2, (0, 0, 0), thickness)
+    return img
+
+
+def sprites(h: int, w: int) -> np.ndarray:
+    """BGRA sprite sheet: opaque blobs on a transparent background."""
+    rng = _rng("sprites", h, w)
+    img = np.zeros((h, w, 4), np.uint8)
+    cell = max(24, min(h, w) // 20)
+    for y in range(cell // 2, h - cell // 2, cell):
+        for x in range(cell // 2, w - cell // 2, cell):
+            color = tuple(int(c) for c in rng.integers(0, 256, 3)) + (255,)
+            axes = (int(rng.integers(cell // 6, cell // 2)),) * 2
+            cv2.ellipse(img, (x, y), axes, 0, 0, 360, color, -1)
+    return img
+
+
+CORPORA: dict[str, Callable[[int, int], np.ndarray]] = {
+    "gradient": gradient,
+    "noise": noise,
+    "photo": photo,
+    "line_art": line_art,
+    "sprites": sprites,
+}
+
+
+def _panel_input(img: np.ndarray) -> np.ndarray:
+    """What the dithering stages see in the real pipeline: a panel-sized frame."""
+    return cv2.resize(img, (TARGET_WIDTH, TARGET_HEIGHT), interpolation=cv2.INTER_AREA)
+
+
+def _case_apply_dithering(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .dithering_toolkit import apply_dithering
+
+    gray = cv2.cvtColor(_panel_input(img), cv2.COLOR_BGR2GRAY)
+    return lambda: apply_dithering(gray, "atkinson", levels=2)
+
+
+def _case_preprocess_image(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .preprocess_toolkit import preprocess_image
+
+    return lambda: preprocess_image(str(path), TARGET_WIDTH, TARGET_HEIGHT)
+
+
+def _case_color_dithering(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .pointillism_toolkit import DEFAULT_PALETTE, color_atkinson_dithering
+
+    panel = _panel_input(img)
+    return lambda: color_atkinson_dithering(panel, DEFAULT_PALETTE)
+
+
+def _case_export_dots(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .packing_toolkit import palette_indices
+    from .pointillism_toolkit import DEFAULT_PALETTE, export_dots_json
+
+    # Nearest-palette quantization stands in for the dithered frame
+    indices = palette_indices(img, DEFAULT_PALETTE)
+    radius = max(1, round(0.01 * min(img.shape[:2])))
+
+    def run() -> dict:
+        random.seed(0)  # same jitter every repeat
+        return export_dots_json(indices, DEFAULT_PALETTE, base_radius=radius, jitter=1)
+
+    return run
+
+
+def _case_ascii_art(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .ascii_art_toolkit import generate_ascii_art
+
+    return lambda: generate_ascii_art(img, num_rows=60)
+
+
+def _case_grid_cut(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .grid_cutter import grid_cut_image
+
+    return lambda: grid_cut_image(str(path), 4, 4)
+
+
+def _case_extract_elements(img: np.ndarray, path: Path, work: Path) -> Callable:
+    from .edge_cutter import extract_elements
+
+    return lambda: extract_elements(str(path))
+
+
+# name → (setup, corpora, sizes). setup(img, png_path, work_dir) does the
+# untimed preparation and returns the zero-argument callable that is timed.
+# The per-pixel Python error diffusion only runs at panel size, which is
+# also the only size it sees in `process`.
+CASES: dict[str, tuple[Callable, tuple[str, ...], tuple[str, ...]]] = {
+    "apply_dithering": (_case_apply_dithering, ("gradient", "photo"), ("panel",)),
+    "preprocess_image": (
+        _case_preprocess_image,
+        ("gradient", "photo", "noise"),
+        tuple(SIZES),
+    ),
+    "color_atkinson_dithering": (_case_color_dithering, ("photo",), ("panel",)),
+    "export_dots_json": (_case_export_dots, ("photo",), tuple(SIZES)),
+    "generate_ascii_art": (_case_ascii_art, ("photo", "line_art"), tuple(SIZES)),
+    "grid_cut": (_case_grid_cut, ("photo",), tuple(SIZES)),
+    "extract_elements": (_case_extract_elements, ("sprites",), tuple(SIZES)),
+}
+
+
+def _run_case(
+    fn: Callable, warmup: int, repeats: int
+) -> tuple[list[float], list[float], float | None]:
+    """Returns (wall ms per repeat, cpu ms per repeat, peak RSS growth MB)."""
+    for _ in range(warmup):
+        fn()
+    wall, cpu = [], []
+    peak_growth: float | None = None
+    for _ in range(repeats):
+        start_rss = metrics.rss_mb()[0]
+        tracked = metrics.reset_peak_rss()
+        t_wall, t_cpu = time.perf_counter(), time.process_time()
+        fn()
+        wall.append((time.perf_counter() - t_wall) * 1000)
+        cpu.append((time.process_time() - t_cpu) * 1000)
+        if tracked:
+            growth = max(0.0, metrics.rss_mb()[1] - start_rss)
+            peak_growth = max(peak_growth or 0.0, growth)
+    return wall, cpu, peak_growth
+
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": cv2.getNumberOfCPUs(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def run_bench(
+    cases: list[str],
+    sizes: list[str],
+    warmup: int = 1,
+    repeats: int = 3,
+) -> dict:
+    """
+    Time every (case, corpus, size) combination and return the results dict
+    written by `geink bench`.
+    """
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="geink-bench-") as tmp:
+        inputs: dict[tuple[str, str], tuple[np.ndarray, Path]] = {}
+        for name in cases:
+            setup, corpora, case_sizes = CASES[name]
+            for size in (s for s in sizes if s in case_sizes):
+                h, w = SIZES[size]
+                for corpus in corpora:
+                    if (corpus, size) not in inputs:
+                        img = CORPORA[corpus](h, w)
+                        path = Path(tmp) / f"{corpus}_{size}.png"
+                        cv2.imwrite(str(path), img)
+                        inputs[corpus, size] = img, path
+                    img, path = inputs[corpus, size]
+                    work = Path(tmp) / f"{name}_{corpus}_{size}"
+                    work.mkdir()
+                    # Cases that write (grid_cut, extract_elements) write
+                    # next to their input, so give each its own copy
+                    case_path = work / path.name
+                    case_path.write_bytes(path.read_bytes())
+
+                    key = f"{name}/{corpus}/{size}"
+                    # The stages log every step; keep the bench output readable
+                    logger.disable(__package__)
+                    try:
+                        fn = setup(img, case_path, work)
+                        wall, cpu, peak = _run_case(fn, warmup, repeats)
+                    finally:
+                        logger.enable(__package__)
+                    results[key] = {
+                        "case": name,
+                        "corpus": corpus,
+                        "size": size,
+                        "shape": [h, w],
+                        "repeats": repeats,
+                        "wall_ms": {
+                            "min": round(min(wall), 3),
+                            "median": round(statistics.median(wall), 3),
+                            "mean": round(statistics.fmean(wall), 3),
+                            "max": round(max(wall), 3),
+                        },
+                        "cpu_ms_median": round(statistics.median(cpu), 3),
+                        "peak_mb": None if peak is None else round(peak, 1),
+                    }
+                    logger.info(
+                        f"{key:<44} median {statistics.median(wall):>10.1f} ms"
+                        f"  min {min(wall):>10.1f} ms"
+                        + (f"  peak +{peak:.1f} MB" if peak is not None else "")
+                    )
+    return {
+        "environment": _environment(),
+        "warmup": warmup,
+        "repeats": repeats,
+        "results": results,
+    }
+
+
+def compare(
+    current: dict, baseline: dict, threshold: float, min_delta_ms: float
+) -> list[str]:
+    """
+    Log a baseline comparison and return the keys whose median wall time
+    grew by more than `threshold` (a fraction) and `min_delta_ms`.
+    """
+    regressions = []
+    lines = [f"{'case':<44}{'baseline':>12}{'current':>12}{'change':>9}"]
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            lines.append(f"{key:<44}{'-':>12}{result['wall_ms']['median']:>12.1f}")
+            continue
+        before, after = base["wall_ms"]["median"], result["wall_ms"]["median"]
+        change = after / before - 1 if before > 0 else 0.0
+        flag = ""
+        if change > threshold and after - before > min_delta_ms:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        elif change < -threshold and before - after > min_delta_ms:
+            flag = "  faster"
+        lines.append(f"{key:<44}{before:>12.1f}{after:>12.1f}{change:>+9.1%}{flag}")
+    logger.info("\n".join(lines))
+    return regressions
+
+
+def _split(value: str, choices: dict) -> list[str]:
+    names = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [n for n in names if n not in choices]
+    if unknown:
+        raise click.BadParameter(
+            f"unknown {', '.join(unknown)}; choose from {', '.join(choices)}"
+        )
+    return names
+
+
+@click.command("bench")
+@click.option(
+    "--cases",
+    default=",".join(CASES),
+    show_default=True,
+    help="Comma-separated stages to bench",
+)
+@click.option(
+    "--sizes",
+    default="panel,4k",
+    show_default=True,
+    help=f"Comma-separated corpus sizes ({', '.join(SIZES)})",
+)
+@click.option("--warmup", type=int, default=1, show_default=True)
+@click.option("--repeats", "-n", type=int, default=3, show_default=True)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    default="bench.json",
+    show_default=True,
+    help="Where to write the JSON results",
+)
+@click.option(
+    "--compare",
+    "baseline_path",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Baseline JSON from an earlier run; exit 1 if a stage regressed",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.15,
+    show_default=True,
+    help="Allowed median slowdown before --compare fails (0.15 = 15%)",
+)
+@click.option(
+    "--min-delta-ms",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Ignore slowdowns smaller than this many ms (timer noise)",
+)
+@click.pass_context
+def bench_cmd(
+    ctx: click.Context,
+    cases: str,
+    sizes: str,
+    warmup: int,
+    repeats: int,
+    output: str,
+    baseline_path: str | None,
+    threshold: float,
+    min_delta_ms: float,
+) -> None:
+    """
+    Benchmark the pipeline stages on deterministic synthetic images.
+
+    Corpora (gradient, noise, photo-like, line art, sprite sheet) are
+    generated from fixed seeds at panel, 4K and 24 MP sizes; each stage
+    runs --warmup times untimed, then --repeats timed runs recording wall
+    time, CPU time and peak RSS growth. Results go to --output as JSON.
+
+    Examples:
+        geink bench
+        geink bench --cases apply_dithering,grid_cut --sizes panel -n 5
+        geink bench --sizes panel,4k,24mp -o new.json --compare bench.json
+    """
+    case_names = _split(cases, CASES)
+    size_names = _split(sizes, SIZES)
+    if repeats < 1:
+        raise click.BadParameter("must be >= 1", param_hint="--repeats")
+
+    report = run_bench(case_names, size_names, warmup, repeats)
+
+    Path(output).write_text(json.dumps(report, indent=2))
+    logger.success(f"Bench results: {output} ({len(report['results'])} cases)")
+
+    if baseline_path:
+        baseline = json.loads(Path(baseline_path).read_text())
+        regressions = compare(report, baseline, threshold, min_delta_ms)
+        if regressions:
+            logger.error(
+                f"{len(regressions)} stage(s) slower than {baseline_path} "
+                f"by more than {threshold:.0%}: {', '.join(regressions)}"
+            )
+            ctx.exit(1)
+        logger.success(f"No regressions against {baseline_path}")
@@ -1,6 +1,7 @@
 import math
 import os
-from typing import Callable, TypeVar
+from collections.abc import Callable
+from typing import TypeVar
 
 from dotenv import dotenv_values
 
@@ -11,6 +12,8 @@ config = dotenv_values(".env")
 DEFAULT_TARGET_WIDTH = 800
 DEFAULT_TARGET_HEIGHT = 480
 DEFAULT_COLOR_LEVELS = 2  # 1-bit (2 levels)
+DEFAULT_SAM_CACHE_DIR = "~/.cache/geink/sam"
+DEFAULT_SAM_CACHE_MAX_MB = 2048  # ViT embeddings are ~4 MB each
 
 T = TypeVar("T")
 
@@ -48,14 +51,31 @@ COLOR_LEVELS: int = _color_levels
 # Calculate bits per pixel
 BITS_PER_PIXEL = int(math.log2(COLOR_LEVELS))
 
+# On-disk SAM image-embedding cache (see sam_cache.py)
+SAM_CACHE_DIR = get_config_value("GEINK_SAM_CACHE_DIR", DEFAULT_SAM_CACHE_DIR, str)
+SAM_CACHE_MAX_MB = get_config_value(
+    "GEINK_SAM_CACHE_MAX_MB", DEFAULT_SAM_CACHE_MAX_MB, int
+)
+
+# Per-stage timing/memory records (JSON lines), see metrics.py; empty = off
+METRICS_PATH = get_config_value("GEINK_METRICS", "", str)
+
+# Tone curve applied before dithering (see tone.py), e.g. "mono" or
+# "gray4,gamma=1.3"; "linear" dithers the raw luminance
+TONE = get_config_value("GEINK_TONE", "linear", str)
+
 # Supported image extensions
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".webp"}
 
 # Ensure these variables are accessible by other modules
 __all__ = [
-    "TARGET_WIDTH",
-    "TARGET_HEIGHT",
-    "COLOR_LEVELS",
     "BITS_PER_PIXEL",
+    "COLOR_LEVELS",
     "IMAGE_EXTENSIONS",
+    "METRICS_PATH",
+    "SAM_CACHE_DIR",
+    "SAM_CACHE_MAX_MB",
+    "TARGET_HEIGHT",
+    "TARGET_WIDTH",
+    "TONE",
 ]
@@ -1,4 +1,5 @@
-from typing import Callable
+import struct
+from collections.abc import Callable
 
 import numpy as np
 from loguru import logger
@@ -79,12 +80,18 @@ def error_diffusion(
     img: np.ndarray,
     quantize_fn: Callable[[np.ndarray], np.ndarray],
     kernel: list[tuple[int, int, float]],
+    serpentine: bool = False,
 ) -> np.ndarray:
-    """Generic error-diffusion dithering. Works for both grayscale and color images."""
+    """
+    Generic error-diffusion dithering. Works for both grayscale and color images.
+
+    serpentine=True scans odd rows right to left with the kernel mirrored.
+    """
     dithered = img.astype(np.float32)
     h, w = dithered.shape[:2]
     for y in range(h):
-        for x in range(w):
+        mirror = -1 if serpentine and y % 2 == 1 else 1
+        for x in range(w)[::mirror]:
             old = dithered[y, x].copy()
             new = quantize_fn(old)
             dithered[y, x] = new
@@ -92,16 +99,229 @@ def error_diffusion(
             if np.all(error == 0):
                 continue
             for dy, dx, weight in kernel:
-                ny, nx = y + dy, x + dx
+                ny, nx = y + dy, x + mirror * dx
                 if 0 <= ny < h and 0 <= nx < w:
                     dithered[ny, nx] += error * weight
     return np.clip(dithered, 0, 255).astype(np.uint8)
 
 
+# Packs three floats as float32, rounding them the way numpy float32 math does
+_F32X3 = struct.Struct("3f")
+
+
+def _wavefront_skew(kernel: list[tuple[int, int, float]]) -> int:
+    """Smallest s for which every kernel target comes after its source in x + s·y."""
+    return max([1] + [(-dx) // dy + 1 for dy, dx, _ in kernel if dy > 0])
+
+
+def _index_dtype(palette: np.ndarray) -> type:
+    return np.uint8 if len(palette) <= 256 else np.intp
+
+
+def _palette_diffusion_wavefront(
+    src: np.ndarray, palette: np.ndarray, kernel: list[tuple[int, int, float]]
+) -> np.ndarray:
+    """
+    Raster-order palette error diffusion, one anti-diagonal at a time.
+
+    Pixel (y, x) is processed at time t = x + skew·y. Every kernel target
+    (y+dy, x+dx) lands at a strictly later time, so all pixels sharing a t
+    are independent and are quantized in one vectorized step; in the flat
+    image they form a strided slice. Errors are kept pre-multiplied by each
+    kernel weight in a ring buffer indexed by time, and added to a pixel in
+    the same order the reference loop adds them (raster order of the
+    sources), so every float32 operation — and thus every palette choice —
+    is identical to error_diffusion(). Besides the index map, memory is a
+    few diagonals' worth; the image is never copied to float.
+    """
+    h, w = src.shape[:2]
+    flat_src = src.reshape(-1, 3)
+    # Sources in raster order: later rows first, then later columns
+    order = sorted(kernel, key=lambda k: (-k[0], -k[1]))
+    skew = _wavefront_skew(kernel)
+    lags = [dx + skew * dy for dy, dx, _ in order]
+    ring = max(lags) + 1
+    pad = max(dy for dy, _, _ in order)
+    weights = np.array([wt for _, _, wt in order], np.float32)[:, None, None]
+    # err[t % ring, k, c, pad + y]: error of the pixel on row y at time t, × weight k
+    err = np.zeros((ring, len(order), 3, h + pad), np.float32)
+    terms = [(lag, k, pad - dy) for k, ((dy, _, _), lag) in enumerate(zip(order, lags))]
+    pal_t = np.ascontiguousarray(palette.T)
+    pal_col = pal_t[:, :, None]
+    indices = np.empty(h * w, _index_dtype(palette))
+    stride = w - skew
+    for t in range(w + skew * (h - 1)):
+        y0 = max(0, -((w - 1 - t) // skew))
+        y1 = min(h - 1, t // skew)
+        n = y1 + 1 - y0
+        start = t + y0 * stride
+        diag = slice(start, start + (n - 1) * stride + 1, stride)
+        # uint8 + float32 promotes to float32, as the reference's astype does
+        lag, k, off = terms[0]
+        value = flat_src[diag].T + err[(t - lag) % ring, k, :, y0 + off : y0 + off + n]
+        for lag, k, off in terms[1:]:
+            value += err[(t - lag) % ring, k, :, y0 + off : y0 + off + n]
+        diff = pal_col - value[:, None, :]
+        diff *= diff
+        dist = diff[0] + diff[1]
+        dist += diff[2]
+        idx = dist.argmin(axis=0)
+        slot = err[t % ring]
+        slot.fill(0)
+        np.multiply(
+            value - np.take(pal_t, idx, axis=1),
+            weights,
+            out=slot[:, :, y0 + pad : y1 + 1 + pad],
+        )
+        indices[diag] = idx
+    return indices.reshape(h, w)
+
+
+def _round_f32(b: float, g: float, r: float) -> tuple[float, ...]:
+    return _F32X3.unpack(_F32X3.pack(b, g, r))
+
+
+def _palette_diffusion_serpentine(
+    src: np.ndarray, palette: np.ndarray, kernel: list[tuple[int, int, float]]
+) -> np.ndarray:
+    """
+    Serpentine palette error diffusion: odd rows run right to left with the
+    kernel mirrored. A reversed row needs the previous row's final errors,
+    so rows can't overlap; each row is scanned in plain Python and its errors
+    are spread to the rows below in one vectorized add per kernel term.
+    Only the rows the kernel reaches are held in float, in a rolling buffer.
+
+    Every palette choice is identical to error_diffusion(..., serpentine=True):
+    the scan rounds each sum and product to float32 (one double op rounded
+    to float32 is the float32 result), a near-tie in the double-precision
+    distances is re-decided in float32, and the terms for the rows below run
+    in the order the scan reaches their sources.
+    """
+    h, w = src.shape[:2]
+    pad = max(abs(dx) for _, dx, _ in kernel)
+    rows = max(dy for dy, _, _ in kernel) + 1
+    acc = np.zeros((rows, w + 2 * pad, 3), np.float32)
+    acc[: min(rows, h), pad : pad + w] = src[:rows]
+    in_row = [(dx, float(np.float32(wt))) for dy, dx, wt in kernel if dy == 0]
+    # A pixel below receives from the largest dx first, whichever way the
+    # row above was scanned
+    below = sorted(
+        ((dy, dx, np.float32(wt)) for dy, dx, wt in kernel if dy > 0),
+        key=lambda k: (k[0], -k[1]),
+    )
+    colors = palette.tolist()
+    indices = np.empty((h, w), _index_dtype(palette))
+    row_err = np.empty((w, 3), np.float32)
+    for y in range(h):
+        reverse = y % 2 == 1
+        current = acc[y % rows]
+        values = current[pad : pad + w].tolist()
+        if reverse:
+            values.reverse()
+        row_idx = [0] * w
+        for x, (b, g, r) in enumerate(values):
+            best, best_d, next_d = 0, float("inf"), float("inf")
+            for i, (pb, pg, pr) in enumerate(colors):
+                d = (pb - b) ** 2 + (pg - g) ** 2 + (pr - r) ** 2
+                if d < best_d:
+                    best, best_d, next_d = i, d, best_d
+                elif d < next_d:
+                    next_d = d
+            if next_d - best_d <= best_d * 1e-5:
+                pixel = np.array((b, g, r), np.float32)
+                best = int(np.argmin(np.sum((palette - pixel) ** 2, axis=1)))
+            pb, pg, pr = colors[best]
+            eb, eg, er = _round_f32(b - pb, g - pg, r - pr)
+            row_idx[x] = best
+            row_err[x] = eb, eg, er
+            for dx, wt in in_row:
+                if x + dx < w:
+                    tb, tg, tr = values[x + dx]
+                    db, dg, dr = _round_f32(eb * wt, eg * wt, er * wt)
+                    values[x + dx] = _round_f32(tb + db, tg + dg, tr + dr)
+        if reverse:
+            row_idx.reverse()
+        indices[y] = row_idx
+        errors = row_err[::-1] if reverse else row_err
+        for dy, dx, wt in below:
+            if y + dy < h:
+                dx = -dx if reverse else dx
+                target = acc[(y + dy) % rows, pad + dx : pad + dx + w]
+                target += errors * wt
+        # Recycle this row's buffer for the first row the kernel hasn't reached
+        current.fill(0)
+        if y + rows < h:
+            current[pad : pad + w] = src[y + rows]
+    return indices
+
+
+def palette_diffusion_indices(
+    img: np.ndarray,
+    palette: np.ndarray,
+    kernel: list[tuple[int, int, float]],
+    serpentine: bool = False,
+) -> np.ndarray:
+    """
+    Error-diffuse a BGR image onto an arbitrary palette (N×3).
+
+    Returns the H×W map of palette indices (uint8 for palettes of up to 256
+    colors). Each choice is exactly the nearest-color pick that
+    error_diffusion() with the same kernel and scan direction makes; the
+    raster scan is ~100× faster than it. serpentine=True alternates the
+    scan direction per row, which avoids directional artifacts but runs row
+    by row.
+    """
+    palette = np.asarray(palette, dtype=np.float32)
+    src = np.ascontiguousarray(img).reshape(img.shape[0], img.shape[1], 3)
+    w = src.shape[1]
+    if serpentine:
+        return _palette_diffusion_serpentine(src, palette, kernel)
+    if w > _wavefront_skew(kernel):
+        return _palette_diffusion_wavefront(src, palette, kernel)
+    # Too narrow for the diagonal slices; a few columns are cheap anyway
+    chosen: list[int] = []
+
+    def nearest(pixel: np.ndarray) -> np.ndarray:
+        chosen.append(int(np.argmin(np.sum((palette - pixel) ** 2, axis=1))))
+        return palette[chosen[-1]]
+
+    error_diffusion(src, nearest, kernel)
+    return np.array(chosen, _index_dtype(palette)).reshape(src.shape[:2])
+
+
+def palette_to_bgr(indices: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Materialize an index map as a uint8 BGR image."""
+    return np.clip(palette, 0, 255).astype(np.uint8)[indices]
+
+
+def palette_error_diffusion(
+    img: np.ndarray,
+    palette: np.ndarray,
+    kernel: list[tuple[int, int, float]],
+    serpentine: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """palette_diffusion_indices(), also returning the BGR image: (bgr, indices)."""
+    indices = palette_diffusion_indices(img, palette, kernel, serpentine)
+    return palette_to_bgr(indices, palette), indices
+
+
 def _threshold(pixel: np.ndarray) -> np.ndarray:
     return np.where(pixel >= 128.0, 255.0, 0.0)
 
 
+def _level_quantizer(levels: int) -> Callable[[np.ndarray], np.ndarray]:
+    """Snap a pixel to the nearest of `levels` evenly spaced gray values in [0, 255]."""
+    step = 255.0 / (levels - 1)
+    return lambda pixel: np.clip(np.round(pixel / step), 0, levels - 1) * step
+
+
+def quantize_levels(gray_img: np.ndarray, levels: int) -> np.ndarray:
+    """Uniform (non-dithered) quantization to `levels` evenly spaced gray values."""
+    step = 255.0 / (levels - 1)
+    levels_img = np.round(gray_img.astype(np.float32) / step)
+    return np.round(levels_img * step).astype(np.uint8)
+
+
 def binary_thresholding(gray_img: np.ndarray, threshold: int = 128) -> np.ndarray:
     result = gray_img.copy()
     result[result <= threshold] = 0
@@ -110,13 +330,19 @@ def binary_thresholding(gray_img: np.ndarray, threshold: int = 128) -> np.ndarra
 
 
 def bayer_dithering(
-    gray_img: np.ndarray, matrix: np.ndarray = BAYER_MATRIX_4x4
+    gray_img: np.ndarray, matrix: np.ndarray = BAYER_MATRIX_4x4, levels: int = 2
 ) -> np.ndarray:
     h, w = gray_img.shape[:2]
     mh, mw = matrix.shape
     tiled = np.tile(matrix, (h // mh + 1, w // mw + 1))[:h, :w]
     normalized = gray_img.astype(np.float32) / 255.0
-    return np.where(normalized > tiled, 255, 0).astype(np.uint8)
+    if levels == 2:
+        return np.where(normalized > tiled, 255, 0).astype(np.uint8)
+    # N-level: the threshold picks between the two levels bracketing each pixel
+    scaled = normalized * (levels - 1)
+    base = np.floor(scaled)
+    level = np.minimum(base + (scaled - base > tiled), levels - 1)
+    return np.round(level * (255.0 / (levels - 1))).astype(np.uint8)
 
 
 def color_bayer_dithering(
@@ -141,17 +367,25 @@ def color_bayer_dithering(
 def apply_dithering(
     gray_img: np.ndarray,
     dither_method: str = "atkinson",
+    levels: int = 2,
 ) -> np.ndarray:
+    """Dither a grayscale image to `levels` evenly spaced gray values (2 = 1-bit)."""
+    if levels < 2:
+        raise ValueError(f"levels 必须 >= 2，当前: {levels}")
+    bits = f"{levels} 级" if levels > 2 else "1-bit"
     if dither_method == "binary_threshold":
-        logger.info("应用 binary_threshold 抖动（1-bit）。")
-        return binary_thresholding(gray_img)
+        logger.info(f"应用 binary_threshold 抖动（{bits}）。")
+        if levels == 2:
+            return binary_thresholding(gray_img)
+        return quantize_levels(gray_img, levels)
     if dither_method == "bayer":
-        logger.info("应用 bayer 有序抖动（1-bit）。")
-        return bayer_dithering(gray_img)
+        logger.info(f"应用 bayer 有序抖动（{bits}）。")
+        return bayer_dithering(gray_img, levels=levels)
     kernel = DITHER_KERNELS.get(dither_method)
     if kernel is None:
         raise ValueError(
             f"不支持的抖动方法: {dither_method}，可选: {list(DITHER_KERNELS) + ['binary_threshold', 'bayer']}"
         )
-    logger.info(f"应用 {dither_method} 抖动（1-bit）。")
-    return error_diffusion(gray_img, _threshold, kernel)
+    logger.info(f"应用 {dither_method} 抖动（{bits}）。")
+    quantize_fn = _threshold if levels == 2 else _level_quantizer(levels)
+    return error_diffusion(gray_img, quantize_fn, kernel)
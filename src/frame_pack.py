@@ -0,0 +1,235 @@
+"""
+单文件帧包 (.gpk)：把成千上万个 .bin 帧合并成一个可 mmap 的容器。
+
+Layout (little endian):
+    header   MAGIC, version, alignment, frame count, index offset, index size
+    payloads frame bytes, each starting on an `alignment` boundary
+    index    one record per frame: offset, size, width, height, bpp,
+             blake2b-128 content hash, utf-8 name
+
+The index lives at the end so frames can be appended without moving payloads.
+Appending never touches the old index: new payloads and then a new index are
+written after it, and the header is rewritten last to point at the new index.
+A run that dies before close() leaves the pack exactly as it was (plus unused
+bytes at the end); each append leaves the previous index behind as dead space.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+MAGIC = b"GEINKPK1"
+VERSION = 1
+DEFAULT_ALIGNMENT = 64
+PACK_SUFFIX = ".gpk"
+
+_HEADER = struct.Struct("<8sHHIQQ")
+_ENTRY = struct.Struct("<QQIIB16sH")
+
+
+class FrameEntry(NamedTuple):
+    name: str
+    offset: int
+    size: int
+    width: int
+    height: int
+    bpp: int
+    digest: bytes
+
+
+def content_hash(data: bytes | memoryview) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def is_frame_pack(path: str | Path) -> bool:
+    """Return True if path is a file that starts with the frame-pack magic."""
+    p = Path(path)
+    if not p.is_file():
+        return False
+    with open(p, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _parse_header(buf: bytes | mmap.mmap) -> tuple[int, int, int, int]:
+    """Return (alignment, count, index_offset, index_size)."""
+    magic, version, alignment, count, index_offset, index_size = _HEADER.unpack_from(
+        buf, 0
+    )
+    if magic != MAGIC:
+        raise ValueError("not a geink frame pack")
+    if version != VERSION:
+        raise ValueError(f"unsupported frame pack version: {version}")
+    return alignment, count, index_offset, index_size
+
+
+def _parse_index(buf: bytes | mmap.mmap, pos: int, count: int) -> list[FrameEntry]:
+    entries: list[FrameEntry] = []
+    for _ in range(count):
+        offset, size, width, height, bpp, digest, name_len = _ENTRY.unpack_from(
+            buf, pos
+        )
+        pos += _ENTRY.size
+        name = bytes(buf[pos : pos + name_len]).decode("utf-8")
+        pos += name_len
+        entries.append(FrameEntry(name, offset, size, width, height, bpp, digest))
+    return entries
+
+
+class FramePackWriter:
+    """
+    Append frames to a pack file. Opening an existing pack keeps its frames;
+    adding a frame under an existing name replaces that entry. An existing
+    file that isn't a pack raises ValueError instead of being overwritten.
+
+    Usage:
+        with FramePackWriter("frames.gpk") as pack:
+            pack.add("photo", data, 800, 480, 1)
+    """
+
+    def __init__(
+        self, path: str | Path, alignment: int = DEFAULT_ALIGNMENT, append: bool = True
+    ) -> None:
+        self.path = Path(path)
+        is_pack = is_frame_pack(self.path)
+        if not is_pack and self.path.exists() and self.path.stat().st_size:
+            raise ValueError(f"{self.path} exists and is not a geink frame pack")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._entries: dict[str, FrameEntry] = {}
+
+        # The file stays open for the writer's lifetime; close() closes it
+        if append and is_pack:
+            self._file = open(self.path, "r+b")  # noqa: SIM115
+            self.alignment, count, index_offset, index_size = _parse_header(
+                self._file.read(_HEADER.size)
+            )
+            self._file.seek(index_offset)
+            index = self._file.read(index_size)
+            self._entries = {e.name: e for e in _parse_index(index, 0, count)}
+            # Keep the old index (and the header pointing at it) valid until
+            # close(): new payloads go after everything already in the file
+            self._file.seek(0, 2)
+        else:
+            self.alignment = alignment
+            self._file = open(self.path, "wb")  # noqa: SIM115
+            self._file.write(_HEADER.pack(MAGIC, VERSION, alignment, 0, 0, 0))
+
+    def __enter__(self) -> "Self":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pad_to_alignment(self) -> int:
+        pos = self._file.tell()
+        pad = -pos % self.alignment
+        if pad:
+            self._file.write(b"\0" * pad)
+        return pos + pad
+
+    def add(
+        self,
+        name: str,
+        data: bytes | memoryview,
+        width: int,
+        height: int,
+        bpp: int,
+    ) -> FrameEntry:
+        offset = self._pad_to_alignment()
+        self._file.write(data)
+        entry = FrameEntry(
+            name, offset, len(data), width, height, bpp, content_hash(data)
+        )
+        self._entries.pop(name, None)
+        self._entries[name] = entry
+        return entry
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        index_offset = self._pad_to_alignment()
+        for e in self._entries.values():
+            name = e.name.encode("utf-8")
+            self._file.write(
+                _ENTRY.pack(
+                    e.offset, e.size, e.width, e.height, e.bpp, e.digest, len(name)
+                )
+            )
+            self._file.write(name)
+        index_size = self._file.tell() - index_offset
+        # The new index must be on disk before the header points at it
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.seek(0)
+        self._file.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                self.alignment,
+                len(self._entries),
+                index_offset,
+                index_size,
+            )
+        )
+        self._file.close()
+
+
+class FramePack:
+    """
+    Read-only, memory-mapped view of a pack. Frames are returned as zero-copy
+    memoryviews into the mapping; drop them before close().
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.alignment, count, index_offset, _ = _parse_header(self._mmap)
+        self.entries = _parse_index(self._mmap, index_offset, count)
+        self._by_name = {e.name: i for i, e in enumerate(self.entries)}
+
+    def __enter__(self) -> "Self":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._by_name
+
+    def __iter__(self) -> Iterator[tuple[FrameEntry, memoryview]]:
+        for e in self.entries:
+            yield e, self._view[e.offset : e.offset + e.size]
+
+    def entry(self, key: str | int) -> FrameEntry:
+        """Look up a frame by name or by position in the index."""
+        if isinstance(key, int):
+            return self.entries[key]
+        if key not in self._by_name:
+            raise KeyError(f"frame not found in {self.path.name}: {key}")
+        return self.entries[self._by_name[key]]
+
+    def __getitem__(self, key: str | int) -> memoryview:
+        e = self.entry(key)
+        return self._view[e.offset : e.offset + e.size]
+
+    def verify(self, key: str | int) -> bool:
+        """Recompute a frame's content hash and compare it with the index."""
+        return content_hash(self[key]) == self.entry(key).digest
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
@@ -1,31 +1,79 @@
-import json
-import subprocess
+import importlib
+from collections.abc import Callable, Iterator
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import click
-import cv2
-import numpy as np
-import requests
 from loguru import logger
 
-from .ascii_art_toolkit import generate_ascii_art
-from .config import IMAGE_EXTENSIONS, TARGET_HEIGHT, TARGET_WIDTH
-from .dithering_toolkit import apply_dithering
-from .edge_cutter import edge_cut_cmd
-from .grid_cutter import grid_cut_image
-from .pointillism_toolkit import (
-    DEFAULT_PALETTE,
-    color_atkinson_dithering,
-    create_color_blocks,
-    export_dots_json,
+from . import metrics
+from .config import (
+    COLOR_LEVELS,
+    IMAGE_EXTENSIONS,
+    TARGET_HEIGHT,
+    TARGET_WIDTH,
+    TONE,
 )
-from .preprocess_toolkit import preprocess_image
+from .frame_pack import FrameEntry, FramePack, FramePackWriter, is_frame_pack
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Heavy dependencies (cv2, numpy, requests, the *_toolkit modules) are imported
+# inside each command so `geink --help`, `geink upload` and `geink gen-header`
+# don't pay for the imaging stack.
 
 # Configure loguru to write to stdout for Click CLI testing
 logger.remove()
 _ = logger.add(lambda msg: print(msg, end=""), format="{message}")
 
 
+class LazyGroup(click.Group):
+    """
+    click.Group whose commands from other modules are imported on first use.
+
+    lazy_subcommands maps a command name to ("module:attr", short help); the
+    short help lets `--help` list the command without importing its module.
+    """
+
+    def __init__(
+        self,
+        *args,
+        lazy_subcommands: dict[str, tuple[str, str]] | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name not in self.commands and cmd_name in self.lazy_subcommands:
+            target, _ = self.lazy_subcommands[cmd_name]
+            module_name, attr = target.split(":")
+            module = importlib.import_module(module_name, package=__package__)
+            self.add_command(getattr(module, attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(
+        self, ctx: click.Context, formatter: click.HelpFormatter
+    ) -> None:
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+                if cmd.hidden:
+                    continue
+                limit = formatter.width - 6 - len(name)
+                rows.append((name, cmd.get_short_help_str(limit)))
+            else:
+                rows.append((name, self.lazy_subcommands[name][1]))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
 def _process_image(
     img_path: str,
     bin_path: str | Path,
@@ -33,27 +81,291 @@ def _process_image(
     width: int,
     height: int,
     method: str,
+    pack_opts: dict | None = None,
+    frame_pack: FramePackWriter | None = None,
+    resample: str = "exact",
 ) -> bool:
-    """Preprocess → grayscale → dither → save preview + .bin"""
-    bgr = preprocess_image(img_path, width, height)
-    if bgr is None:
-        return False
+    """Preprocess → grayscale/palette → dither → pack → save preview + .bin
 
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-    dithered = apply_dithering(gray, method)
+    With frame_pack set, the frame is appended to the pack (named after the
+    image stem) instead of being written as a separate .bin.
+    """
+    from .preprocess_toolkit import preprocess_image
 
-    Path(bin_path).parent.mkdir(parents=True, exist_ok=True)
-    _ = cv2.imwrite(str(preview_path), dithered)
-    _ = Path(bin_path).write_bytes(np.packbits((dithered < 128).reshape(-1)).tobytes())
+    with metrics.image(img_path):
+        bgr = preprocess_image(img_path, width, height, resample)
+        if bgr is None:
+            return False
+        _write_frame(
+            bgr,
+            Path(img_path).stem,
+            bin_path,
+            preview_path,
+            width,
+            height,
+            method,
+            pack_opts,
+            frame_pack,
+        )
+    return True
 
-    logger.success(f"bin: {bin_path}")
+
+def _write_frame(
+    bgr: "np.ndarray",
+    name: str,
+    bin_path: str | Path,
+    preview_path: str | Path,
+    width: int,
+    height: int,
+    method: str,
+    pack_opts: dict | None = None,
+    frame_pack: FramePackWriter | None = None,
+) -> None:
+    """Dither + pack a preprocessed frame; write its preview and .bin (or pack entry)."""
+    import cv2
+
+    from .packing_toolkit import encode_frame
+
+    preview, packed, bpp = encode_frame(bgr, method, **(pack_opts or {}))
+
+    with metrics.stage("write"):
+        Path(preview_path).parent.mkdir(parents=True, exist_ok=True)
+        _ = cv2.imwrite(str(preview_path), preview)
+        if frame_pack is not None:
+            frame_pack.add(name, packed.data, width, height, bpp)
+        else:
+            _ = Path(bin_path).write_bytes(packed.tobytes())
+    if frame_pack is not None:
+        logger.success(f"frame: {name} -> {frame_pack.path}")
+    else:
+        logger.success(f"bin: {bin_path}")
     logger.success(f"preview: {preview_path}")
-    return True
 
 
-@click.group()
-def cli() -> None:
+def _process_frames(
+    img_path: str,
+    out_dir: Path,
+    width: int,
+    height: int,
+    method: str,
+    pack_opts: dict | None = None,
+    frame_pack: FramePackWriter | None = None,
+    frame_step: int = 1,
+    max_frames: int | None = None,
+    count: int | None = None,
+    resample: str = "exact",
+) -> int:
+    """
+    _process_image for a multi-frame GIF/TIFF: frames are decoded one at a
+    time and written as out_dir/0000.bin, 0001.bin, ... (numbered by source
+    frame), or appended to frame_pack as <stem>_0000, ...
+
+    Returns the number of frames written.
+    """
+    from .preprocess_toolkit import (
+        frame_count,
+        iter_frames,
+        preprocess_array,
+        select_frames,
+    )
+
+    total = count if count is not None else frame_count(img_path)
+    indices = select_frames(total, frame_step, max_frames)
+    logger.info(f"{img_path}: {total} 帧，处理其中 {len(indices)} 帧")
+    stem = Path(img_path).stem
+    written = 0
+    for index, frame in iter_frames(img_path, indices):
+        with metrics.image(f"{img_path}#{index}"):
+            bgr = preprocess_array(frame, width, height, resample)
+            _write_frame(
+                bgr,
+                f"{stem}_{index:04d}",
+                out_dir / f"{index:04d}.bin",
+                out_dir / f"{index:04d}_preview.png",
+                width,
+                height,
+                method,
+                pack_opts,
+                frame_pack,
+            )
+        written += 1
+    return written
+
+
+def _pack_options(f: Callable) -> Callable:
+    """Shared .bin layout options for commands that emit panel frames."""
+    options = [
+        click.option(
+            "--color-levels",
+            "-c",
+            "levels",
+            type=int,
+            default=COLOR_LEVELS,
+            help="Gray levels for grayscale panels (power of 2, default GEINK_COLOR_LEVELS)",
+        ),
+        click.option(
+            "--palette",
+            default=None,
+            help="Dither to palette indices for color panels instead of gray levels (e.g. 7color)",
+        ),
+        click.option(
+            "--bpp",
+            type=int,
+            default=None,
+            help="Bits per pixel (default: derived from levels)",
+        ),
+        click.option(
+            "--bit-order",
+            type=click.Choice(["msb", "lsb"]),
+            default="msb",
+            help="Whether the first pixel of each byte lands in the high or low bits",
+        ),
+        click.option(
+            "--invert/--no-invert",
+            default=None,
+            help="Store complemented values (default: on for gray, off for palettes)",
+        ),
+        click.option(
+            "--row-align",
+            type=int,
+            default=0,
+            help="Pad each row to a multiple of this many bytes (default 0 = continuous bit stream)",
+        ),
+        click.option(
+            "--tone",
+            default=TONE,
+            help="Tone curve before dithering: PROFILE[,key=value...] with PROFILE one of "
+            "linear, mono, gray4, gray16, 7color (default GEINK_TONE)",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _dedup_options(f: Callable) -> Callable:
+    """Shared near-duplicate skipping options (see phash_index.py)."""
+    options = [
+        click.option(
+            "--dedup",
+            is_flag=True,
+            default=False,
+            help="Skip near-duplicate images (perceptual hashes cached per directory in .geink_phash.json)",
+        ),
+        click.option(
+            "--dedup-distance",
+            type=click.IntRange(0, 63),
+            default=8,
+            help="Max Hamming distance (of 64 bits) for two images to count as near-duplicates",
+        ),
+        click.option(
+            "--dedup-hash",
+            type=click.Choice(["phash", "dhash"]),
+            default="phash",
+            help="phash: DCT hash, robust to re-encoding and small edits; dhash: gradient hash, cheaper",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _resample_option(f: Callable) -> Callable:
+    """--resample for commands that preprocess photos down to panel size."""
+    return click.option(
+        "--resample",
+        type=click.Choice(["exact", "quality", "fast"]),
+        default="exact",
+        help="Downscaling: exact (one Lanczos step from full size, unchanged output), quality (2× INTER_AREA pyramid + Lanczos, ~2× faster), fast (pyramid + bilinear)",
+    )(f)
+
+
+def _build_pack_opts(
+    levels: int,
+    palette: str | None,
+    bpp: int | None,
+    bit_order: str,
+    invert: bool | None,
+    row_align: int,
+    tone: str,
+) -> dict:
+    """Validate the _pack_options values and turn them into encode_frame kwargs."""
+    if levels < 2 or levels & (levels - 1):
+        raise click.BadParameter("must be a power of 2", param_hint="--color-levels")
+    if palette is not None:
+        from .packing_toolkit import PALETTES
+
+        if palette not in PALETTES:
+            raise click.BadParameter(
+                f"choose from {', '.join(sorted(PALETTES))}", param_hint="--palette"
+            )
+    from .tone import parse_tone
+
+    try:
+        curve = parse_tone(tone)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--tone") from None
+    return {
+        "levels": levels,
+        "palette": palette,
+        "bpp": bpp,
+        "msb_first": bit_order == "msb",
+        "invert": invert,
+        "row_align": row_align or None,
+        "tone": curve,
+    }
+
+
+def _open_pack(pack_path: str | None) -> FramePackWriter | None:
+    """FramePackWriter for --pack, refusing to overwrite a file that isn't a pack."""
+    if not pack_path:
+        return None
+    try:
+        return FramePackWriter(pack_path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--pack") from None
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "bench": (
+            ".bench:bench_cmd",
+            "Benchmark the pipeline stages on deterministic synthetic images.",
+        ),
+        "edge-cut": (
+            ".edge_cutter:edge_cut_cmd",
+            "Extract independent elements from an image using edge/alpha...",
+        ),
+        "ascii-video": (
+            ".ascii_video:ascii_video_cmd",
+            "Convert a video (file or camera index) to a streaming ASCII...",
+        ),
+        "profile": (
+            ".profiler:profile_cmd",
+            "Run another geink command under a profiler.",
+        ),
+        "serve": (
+            ".server:serve_cmd",
+            "Run a persistent HTTP service with warm worker processes.",
+        ),
+    },
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append per-stage timing/memory records (JSON lines) to this file "
+    "and print a percentile summary at exit (or set GEINK_METRICS)",
+)
+@click.pass_context
+def cli(ctx: click.Context, metrics_path: str | None) -> None:
     """Geink CLI for e-paper image processing."""
+    if metrics_path:
+        metrics.enable(metrics_path)
+    if metrics.enabled():
+        ctx.call_on_close(metrics.summary)
 
 
 @cli.command()
@@ -68,72 +380,405 @@ def cli() -> None:
     default="atkinson",
     help="Dithering algorithm",
 )
+@_pack_options
+@click.option(
+    "--pack",
+    "pack_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append frames to this .gpk frame pack instead of writing .bin files",
+)
+@click.option(
+    "--frame-step",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Multi-frame GIF/TIFF/WebP input: keep every Nth frame",
+)
+@click.option(
+    "--max-frames",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Multi-frame input: evenly decimate to at most this many frames",
+)
+@_resample_option
+@_dedup_options
 def process(
     input_path: str,
     output_path: str | None,
     width: int,
     height: int,
     method: str,
+    levels: int,
+    palette: str | None,
+    bpp: int | None,
+    bit_order: str,
+    invert: bool | None,
+    row_align: int,
+    tone: str,
+    pack_path: str | None,
+    frame_step: int,
+    max_frames: int | None,
+    resample: str,
+    dedup: bool,
+    dedup_distance: int,
+    dedup_hash: str,
 ) -> None:
     """
     Process image(s) to EPD binary format.
 
-    Outputs a .bin file and a _preview.png alongside it.
+    Outputs a .bin file and a _preview.png alongside it. Animated GIFs and
+    multi-page TIFFs are streamed frame by frame into a numbered sequence
+    in <stem>_frames/ (or into the --pack container).
 
     Examples:
         geink process photo.jpg
         geink process photo.jpg output.bin
         geink process ./photos/
+        geink process photo.jpg -c 4
+        geink process photo.jpg --palette 7color
+        geink process ./photos/ --pack photos.gpk
+        geink process ./photos/ --dedup
+        geink process anim.gif --max-frames 24 --pack anim.gpk
     """
+    from .preprocess_toolkit import frame_count
+
     input_obj = Path(input_path)
+    pack_opts = _build_pack_opts(
+        levels, palette, bpp, bit_order, invert, row_align, tone
+    )
+    frame_pack = _open_pack(pack_path)
+    dedup_filter = None
 
-    if input_obj.is_file():
-        bin_out = Path(output_path) if output_path else input_obj.with_suffix(".bin")
-        preview_out = bin_out.with_name(bin_out.stem + "_preview.png")
-        if not _process_image(input_path, bin_out, preview_out, width, height, method):
-            logger.error("Processing failed.")
-    else:
-        count = 0
-        for img_file in sorted(input_obj.iterdir()):
-            if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
-                continue
-            if "_preview" in img_file.name:
-                continue
-            bin_out = img_file.with_suffix(".bin")
-            preview_out = img_file.with_name(img_file.stem + "_preview.png")
-            if _process_image(
-                str(img_file), bin_out, preview_out, width, height, method
+    try:
+        if input_obj.is_file():
+            bin_out = (
+                Path(output_path) if output_path else input_obj.with_suffix(".bin")
+            )
+            preview_out = bin_out.with_name(bin_out.stem + "_preview.png")
+            frames = frame_count(input_path)
+            if frames > 1:
+                written = _process_frames(
+                    input_path,
+                    bin_out.with_name(bin_out.stem + "_frames"),
+                    width,
+                    height,
+                    method,
+                    pack_opts,
+                    frame_pack,
+                    frame_step,
+                    max_frames,
+                    frames,
+                    resample=resample,
+                )
+                logger.success(f"Processed {written} frames of {input_path}")
+            elif not _process_image(
+                input_path,
+                bin_out,
+                preview_out,
+                width,
+                height,
+                method,
+                pack_opts,
+                frame_pack,
+                resample=resample,
             ):
-                count += 1
-        logger.success(f"Processed {count} images in {input_obj}")
+                logger.error("Processing failed.")
+        else:
+            if dedup:
+                from .phash_index import NearDuplicateFilter
+
+                dedup_filter = NearDuplicateFilter(
+                    input_obj, dedup_hash, dedup_distance
+                )
+            count = 0
+            for img_file in sorted(input_obj.iterdir()):
+                if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                if "_preview" in img_file.name:
+                    continue
+                if dedup_filter is not None and not dedup_filter.keep_file(img_file):
+                    continue
+                frames = frame_count(img_file)
+                if frames > 1:
+                    written = _process_frames(
+                        str(img_file),
+                        img_file.with_name(img_file.stem + "_frames"),
+                        width,
+                        height,
+                        method,
+                        pack_opts,
+                        frame_pack,
+                        frame_step,
+                        max_frames,
+                        frames,
+                        resample=resample,
+                    )
+                    count += written > 0
+                    continue
+                bin_out = img_file.with_suffix(".bin")
+                preview_out = img_file.with_name(img_file.stem + "_preview.png")
+                if _process_image(
+                    str(img_file),
+                    bin_out,
+                    preview_out,
+                    width,
+                    height,
+                    method,
+                    pack_opts,
+                    frame_pack,
+                    resample=resample,
+                ):
+                    count += 1
+            logger.success(f"Processed {count} images in {input_obj}")
+    finally:
+        if dedup_filter is not None:
+            dedup_filter.close()
+        if frame_pack is not None:
+            frame_pack.close()
+            logger.success(f"Frame pack: {pack_path} ({len(frame_pack)} frames)")
 
 
 @cli.command()
 @click.argument("input_path", type=click.Path(exists=True))
 @click.option("--rows", "-r", type=int, required=True, help="Number of rows")
 @click.option("--cols", "-c", type=int, required=True, help="Number of columns")
-def gridcut(input_path: str, rows: int, cols: int) -> None:
+@click.option(
+    "--workers",
+    "-j",
+    type=int,
+    default=None,
+    help="Threads writing tiles (default: ThreadPoolExecutor default)",
+)
+def gridcut(input_path: str, rows: int, cols: int, workers: int | None) -> None:
     """
     Cut an image or directory of images into a grid.
 
     Output tiles are saved in a subdirectory named after the image.
     Example: input.jpg -> input/r0_c0.png, input/r0_c1.png, ...
+
+    TIFF inputs are read one tile row at a time (striped/tiled region
+    reads, or a memory map when uncompressed), so gigapixel scans don't
+    need to fit in RAM.
     """
+    from .grid_cutter import grid_cut_image
+
     input_obj = Path(input_path)
 
     if input_obj.is_file():
-        if not grid_cut_image(input_path, rows, cols):
+        with metrics.image(input_path):
+            ok = grid_cut_image(input_path, rows, cols, workers)
+        if not ok:
             logger.error("Grid cut failed.")
     else:
         count = 0
         for img_file in input_obj.iterdir():
             if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
                 continue
-            if grid_cut_image(str(img_file), rows, cols):
-                count += 1
+            with metrics.image(img_file):
+                ok = grid_cut_image(str(img_file), rows, cols, workers)
+            count += ok
         logger.success(f"Grid cut {count} images")
 
 
+def _wall_image(
+    img_path: str,
+    rows: int,
+    cols: int,
+    width: int,
+    height: int,
+    bezel_x: int,
+    bezel_y: int,
+    method: str,
+    pack_opts: dict,
+    frame_pack: FramePackWriter | None = None,
+    resample: str = "exact",
+) -> bool:
+    """Preprocess to the full wall canvas → dither once → slice into per-panel .bin"""
+    import cv2
+
+    from .packing_toolkit import dither_frame, panel_frames, resolve_format
+    from .preprocess_toolkit import preprocess_image
+
+    canvas_w = cols * width + (cols - 1) * bezel_x
+    canvas_h = rows * height + (rows - 1) * bezel_y
+    bgr = preprocess_image(img_path, canvas_w, canvas_h, resample)
+    if bgr is None:
+        return False
+
+    with metrics.stage("dither"):
+        preview, indices = dither_frame(
+            bgr,
+            method,
+            levels=pack_opts["levels"],
+            palette=pack_opts["palette"],
+            tone=pack_opts["tone"],
+        )
+    bpp, invert = resolve_format(
+        pack_opts["levels"], pack_opts["palette"], pack_opts["bpp"], pack_opts["invert"]
+    )
+    with metrics.stage("pack"):
+        frames = panel_frames(
+            indices,
+            rows,
+            cols,
+            width,
+            height,
+            gap_x=bezel_x,
+            gap_y=bezel_y,
+            bpp=bpp,
+            msb_first=pack_opts["msb_first"],
+            invert=invert,
+            row_align=pack_opts["row_align"],
+        )
+
+    input_file = Path(img_path)
+    out_dir = input_file.parent / f"{input_file.stem}_wall"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with metrics.stage("write"):
+        _ = cv2.imwrite(str(out_dir / "preview.png"), preview)
+
+        for idx, frame in enumerate(frames):
+            name = f"r{idx // cols}_c{idx % cols}"
+            data = frame.tobytes()
+            if frame_pack is not None:
+                frame_pack.add(f"{input_file.stem}_{name}", data, width, height, bpp)
+            else:
+                _ = (out_dir / f"{name}.bin").write_bytes(data)
+
+    logger.success(
+        f"Wall {rows}x{cols} ({canvas_w}x{canvas_h}): {img_path} -> {len(frames)} panels -> {out_dir}"
+    )
+    return True
+
+
+@cli.command()
+@click.argument("input_path", type=click.Path(exists=True))
+@click.option("--rows", type=int, required=True, help="Panel rows in the wall")
+@click.option("--cols", type=int, required=True, help="Panel columns in the wall")
+@click.option("--width", "-w", type=int, default=TARGET_WIDTH, help="Panel width")
+@click.option("--height", "-h", type=int, default=TARGET_HEIGHT, help="Panel height")
+@click.option(
+    "--bezel-x",
+    type=int,
+    default=0,
+    help="Horizontal gap between panels, in panel pixels (hidden behind bezels)",
+)
+@click.option(
+    "--bezel-y",
+    type=int,
+    default=0,
+    help="Vertical gap between panels, in panel pixels (hidden behind bezels)",
+)
+@click.option(
+    "--method",
+    "-m",
+    type=click.Choice(["atkinson", "binary_threshold"]),
+    default="atkinson",
+    help="Dithering algorithm",
+)
+@_pack_options
+@click.option(
+    "--pack",
+    "pack_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append panel frames to this .gpk frame pack instead of writing .bin files",
+)
+@_resample_option
+def wall(
+    input_path: str,
+    rows: int,
+    cols: int,
+    width: int,
+    height: int,
+    bezel_x: int,
+    bezel_y: int,
+    method: str,
+    levels: int,
+    palette: str | None,
+    bpp: int | None,
+    bit_order: str,
+    invert: bool | None,
+    row_align: int,
+    tone: str,
+    pack_path: str | None,
+    resample: str,
+) -> None:
+    """
+    Drive a rows×cols wall of panels from one image.
+
+    The image is preprocessed to the whole wall resolution (plus bezel gaps)
+    and dithered once, so error diffusion runs across panel borders without
+    seams; the packed canvas is then sliced into one frame per panel.
+    Output: <name>_wall/r0_c0.bin, r0_c1.bin, ... and preview.png.
+
+    Examples:
+        geink wall photo.jpg --rows 2 --cols 3
+        geink wall photo.jpg --rows 2 --cols 2 --bezel-x 24 --bezel-y 24 --pack wall.gpk
+    """
+    if rows < 1 or cols < 1:
+        raise click.BadParameter("rows and cols must be >= 1")
+    pack_opts = _build_pack_opts(
+        levels, palette, bpp, bit_order, invert, row_align, tone
+    )
+    frame_pack = _open_pack(pack_path)
+    input_obj = Path(input_path)
+    args = (rows, cols, width, height, bezel_x, bezel_y, method, pack_opts, frame_pack)
+    kwargs = {"resample": resample}
+
+    try:
+        if input_obj.is_file():
+            with metrics.image(input_path):
+                ok = _wall_image(input_path, *args, **kwargs)
+            if not ok:
+                logger.error("Wall processing failed.")
+        else:
+            count = 0
+            for img_file in sorted(input_obj.iterdir()):
+                if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                with metrics.image(img_file):
+                    count += _wall_image(str(img_file), *args, **kwargs)
+            logger.success(f"Processed {count} walls in {input_obj}")
+    finally:
+        if frame_pack is not None:
+            frame_pack.close()
+            logger.success(f"Frame pack: {pack_path} ({len(frame_pack)} frames)")
+
+
+_POINTILLIZE_DITHERS = ["floyd_steinberg", "stucki", "atkinson", "jjn", "bayer"]
+_RENDER_DIR = Path(__file__).parent.parent / "render"
+
+
+def _render_pointillism(dots_json: Path, final_out: Path) -> bool:
+    """Draw a dots.json with the render/ Node.js Canvas script."""
+    import subprocess
+
+    logger.info("调用 Node.js Canvas 渲染...")
+    with metrics.stage("render"):
+        try:
+            result = subprocess.run(
+                [
+                    str(_RENDER_DIR / "node_modules" / ".bin" / "ts-node"),
+                    str(_RENDER_DIR / "src" / "pointillism.ts"),
+                    str(dots_json.resolve()),
+                    str(final_out.resolve()),
+                ],
+                cwd=str(_RENDER_DIR),
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+        except OSError as e:
+            logger.error(f"Node.js 渲染失败: {e}（先在 render/ 下执行 npm install）")
+            return False
+    if result.returncode != 0:
+        logger.error(f"Node.js 渲染失败:\n{result.stderr}")
+        return False
+    logger.info(result.stdout.strip())
+    return True
+
+
 @cli.command()
 @click.argument("input_path", type=click.Path(exists=True))
 @click.argument("output_path", type=click.Path(), required=False)
@@ -173,10 +818,29 @@ def gridcut(input_path: str, rows: int, cols: int) -> None:
 )
 @click.option(
     "--dither",
-    type=click.Choice(["floyd_steinberg", "stucki", "atkinson", "jjn", "bayer"]),
+    type=click.Choice(_POINTILLIZE_DITHERS),
     default="floyd_steinberg",
     help="Dithering algorithm: floyd_steinberg (best for photos), stucki (smoothest), atkinson (graphics), jjn (Jarvis-Judice-Ninke), bayer (ordered)",
 )
+@click.option(
+    "--texture-dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Draw dots with the brush PNGs in this directory (random texture and rotation per dot) instead of flat discs",
+)
+@click.option(
+    "--serpentine",
+    is_flag=True,
+    help="Alternate the error-diffusion scan direction per row (fewer directional artifacts, slower)",
+)
+@click.option(
+    "--sweep",
+    "sweeps",
+    multiple=True,
+    metavar="PARAM=V1,V2,...",
+    help="Render every combination of these values (repeatable; PARAM is spatial-rad, color-rad, dither, dot-ratio, jitter or alpha) into a contact sheet",
+)
+@_dedup_options
 def pointillize(
     input_path: str,
     output_path: str | None,
@@ -186,31 +850,88 @@ def pointillize(
     jitter: float,
     pipeline_alpha: float,
     dither: str,
+    texture_dir: str | None,
+    serpentine: bool,
+    sweeps: tuple[str, ...],
+    dedup: bool,
+    dedup_distance: int,
+    dedup_hash: str,
 ) -> None:
     """
     Convert image(s) to color pointillism art.
 
     Pipeline: mean-shift color blocking → 7-color dithering → overlapping dot rendering.
 
+    With --sweep, each image is rendered once per parameter combination
+    into <stem>/sweep/ plus a <stem>/<stem>_sweep.png contact sheet; stage
+    outputs are reused across combinations, so e.g. sweeping only --alpha
+    runs mean shift, dithering and dot export once.
+
     Examples:
         geink pointillize photo.jpg
         geink pointillize photo.jpg out.png --scale 6 --dot-radius 5
+        geink pointillize photo.jpg --sweep alpha=0.3,0.5,0.7 --sweep dither=floyd_steinberg,atkinson
     """
+    import json
+
+    import cv2
+
+    from .pointillism_toolkit import (
+        DEFAULT_PALETTE,
+        color_dither_indices,
+        create_color_blocks,
+        export_dots_json,
+        palette_to_bgr,
+        prepare_textures,
+    )
+    from .sweep import dot_geometry
+
     input_obj = Path(input_path)
+    if texture_dir is not None:
+        # Re-encoded once up front; the renderer loads them from .fixed/
+        texture_dir = str(Path(prepare_textures(texture_dir)).resolve())
+
+    grid: dict[str, list] = {}
+    if sweeps:
+        from .sweep import parse_sweep
+
+        try:
+            grid = parse_sweep(sweeps)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--sweep") from None
+        bad = set(grid.get("dither", ())) - set(_POINTILLIZE_DITHERS)
+        if bad:
+            raise click.BadParameter(
+                f"unknown dither {', '.join(sorted(bad))}", param_hint="--sweep"
+            )
+
+    def sweep_one(img_file: Path) -> bool:
+        from .sweep import run_sweep
 
-    _render_dir = Path(__file__).parent.parent / "render"
-    _ts_node = _render_dir / "node_modules" / ".bin" / "ts-node"
-    _renderer = _render_dir / "src" / "pointillism.ts"
+        base = {
+            "spatial_rad": spatial_rad,
+            "color_rad": color_rad,
+            "dither": dither,
+            "serpentine": serpentine,
+            "texture_dir": texture_dir,
+            "dot_ratio": dot_ratio,
+            "jitter": jitter,
+            "alpha": pipeline_alpha,
+        }
+        sheet = run_sweep(img_file, base, grid, _render_pointillism)
+        if sheet is not None:
+            logger.success(f"Contact sheet saved to: {sheet}")
+        return sheet is not None
 
     def process_one(img_file: Path, out_file: Path) -> bool:
-        img = cv2.imread(str(img_file))
+        with metrics.stage("decode"):
+            img = cv2.imread(str(img_file))
         if img is None:
             logger.error(f"Cannot read {img_file}")
             return False
 
         h, w = img.shape[:2]
-        dot_radius = max(1, round(dot_ratio * min(h, w)))
-        jitter_px = max(1, round(jitter * dot_radius))
+        dot_radius, jitter_px = dot_geometry(h, w, dot_ratio, jitter)
 
         # 创建同名目录保存中间步骤和成品
         out_dir = img_file.parent / img_file.stem
@@ -221,43 +942,44 @@ def pointillize(
         )
 
         # 步骤 1：色块化
-        blocked = create_color_blocks(img, spatial_rad=spatial_rad, color_rad=color_rad)
-        cv2.imwrite(str(out_dir / f"{img_file.stem}_blocked.png"), blocked)
+        with metrics.stage("mean_shift"):
+            blocked = create_color_blocks(
+                img, spatial_rad=spatial_rad, color_rad=color_rad
+            )
+        with metrics.stage("write"):
+            cv2.imwrite(str(out_dir / f"{img_file.stem}_blocked.png"), blocked)
 
         # 步骤 2：抖动
-        dithered = color_atkinson_dithering(blocked, DEFAULT_PALETTE, method=dither)
-        cv2.imwrite(str(out_dir / f"{img_file.stem}_dithered.png"), dithered)
+        with metrics.stage("dither"):
+            indices = color_dither_indices(
+                blocked, DEFAULT_PALETTE, method=dither, serpentine=serpentine
+            )
+        # Only the index map is needed from here on
+        del img, blocked
+        with metrics.stage("write"):
+            cv2.imwrite(
+                str(out_dir / f"{img_file.stem}_dithered.png"),
+                palette_to_bgr(indices, DEFAULT_PALETTE),
+            )
 
         # 步骤 3：导出点数据
-        dots_data = export_dots_json(
-            dithered,
-            base_radius=dot_radius,
-            jitter=jitter_px,
-            alpha=pipeline_alpha,
-            texture_dir=None,
-        )
+        with metrics.stage("dot_export"):
+            dots_data = export_dots_json(
+                indices,
+                DEFAULT_PALETTE,
+                base_radius=dot_radius,
+                jitter=jitter_px,
+                alpha=pipeline_alpha,
+                texture_dir=texture_dir,
+            )
         dots_json = out_dir / f"{img_file.stem}_dots.json"
-        with open(dots_json, "w") as f:
+        with metrics.stage("write"), open(dots_json, "w") as f:
             json.dump(dots_data, f)
 
         # 步骤 4：Node.js Canvas 渲染
         final_out = out_dir / f"{img_file.stem}_pointillism.png"
-        logger.info("调用 Node.js Canvas 渲染...")
-        result = subprocess.run(
-            [
-                str(_ts_node),
-                str(_renderer),
-                str(dots_json.resolve()),
-                str(final_out.resolve()),
-            ],
-            cwd=str(_render_dir),
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            logger.error(f"Node.js 渲染失败:\n{result.stderr}")
+        if not _render_pointillism(dots_json, final_out):
             return False
-        logger.info(result.stdout.strip())
 
         logger.success(f"Intermediate steps saved to: {out_dir}/")
         logger.success(f"Final art saved to: {final_out}")
@@ -269,17 +991,29 @@ def pointillize(
             if output_path
             else input_obj.with_name(input_obj.stem + "_pointillism.png")
         )
-        _ = process_one(input_obj, out)
+        with metrics.image(input_obj):
+            _ = sweep_one(input_obj) if grid else process_one(input_obj, out)
     else:
+        dedup_filter = None
+        if dedup:
+            from .phash_index import NearDuplicateFilter
+
+            dedup_filter = NearDuplicateFilter(input_obj, dedup_hash, dedup_distance)
         count = 0
-        for img_file in sorted(input_obj.iterdir()):
-            if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
-                continue
-            if "_pointillism" in img_file.name:
-                continue
-            out = img_file.with_name(img_file.stem + "_pointillism.png")
-            if process_one(img_file, out):
-                count += 1
+        try:
+            for img_file in sorted(input_obj.iterdir()):
+                if img_file.suffix.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                if "_pointillism" in img_file.name:
+                    continue
+                if dedup_filter is not None and not dedup_filter.keep_file(img_file):
+                    continue
+                out = img_file.with_name(img_file.stem + "_pointillism.png")
+                with metrics.image(img_file):
+                    count += sweep_one(img_file) if grid else process_one(img_file, out)
+        finally:
+            if dedup_filter is not None:
+                dedup_filter.close()
         logger.success(f"Generated {count} art pieces in {input_obj}")
 
 
@@ -296,8 +1030,31 @@ def pointillize(
     "--render",
     is_flag=True,
     default=False,
-    help="Automatically render the ASCII .txt to .png using the TypeScript renderer",
+    help="Render the ASCII .txt to <stem>_ascii_rendered.png",
+)
+@click.option(
+    "--renderer",
+    type=click.Choice(["native", "ts"]),
+    default="native",
+    help="native: in-process glyph-atlas renderer; ts: render/ puppeteer script",
 )
+@click.option(
+    "--bin",
+    "emit_bin",
+    is_flag=True,
+    default=False,
+    help="Also write the rendered art as a dithered panel frame (<stem>_ascii.bin)",
+)
+@click.option("--width", "-w", type=int, default=TARGET_WIDTH, help="Target width")
+@click.option("--height", "-h", type=int, default=TARGET_HEIGHT, help="Target height")
+@click.option(
+    "--method",
+    "-m",
+    type=click.Choice(["atkinson", "binary_threshold"]),
+    default="atkinson",
+    help="Dithering algorithm for --bin",
+)
+@_pack_options
 @click.option(
     "--info-panel",
     is_flag=True,
@@ -322,131 +1079,370 @@ def pointillize(
     default="vit_h",
     help="SAM ViT variant (only used when --sam-checkpoint is given)",
 )
+@click.option(
+    "--no-sam-cache",
+    is_flag=True,
+    default=False,
+    help="Always run the SAM image encoder instead of using the on-disk embedding cache",
+)
+@click.option(
+    "--workers",
+    "-j",
+    type=int,
+    default=None,
+    help="Worker processes for directory input (default: CPU count)",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=4,
+    help="Images per SAM encoder batch for directory input",
+)
 def ascii_art(
     input_path: str,
     rows: int | None,
     render: bool,
+    renderer: str,
+    emit_bin: bool,
+    width: int,
+    height: int,
+    method: str,
+    levels: int,
+    palette: str | None,
+    bpp: int | None,
+    bit_order: str,
+    invert: bool | None,
+    row_align: int,
+    tone: str,
     info_panel: bool,
     scanlines: bool,
     sam_checkpoint: str | None,
     sam_model_type: str,
+    no_sam_cache: bool,
+    workers: int | None,
+    batch_size: int,
 ) -> None:
     """
-    Convert image to ASCII art and save as .txt.
+    Convert an image or directory of images to ASCII art and save as .txt.
 
     --rows sets exactly how many lines the ASCII output has; columns scale proportionally.
-    Use render/ (TypeScript) to turn the .txt into a styled PNG.
+    --render turns the .txt into a styled PNG; --bin renders it straight to a
+    packed panel frame with the same layout options as `process`.
+
+    For a directory, images are converted in a process pool and the SAM model
+    (if any) is loaded once, embedding --batch-size images per encoder pass.
+    Results are reported in file-name order.
 
     Examples:
         geink ascii-art photo.jpg -r 30
         geink ascii-art photo.jpg -r 60 --render --scanlines
+        geink ascii-art photos/ -r 30 -j 8
+        geink ascii-art photo.jpg -r 30 --bin --scanlines
     """
-    input_file = Path(input_path)
-    img = cv2.imread(str(input_file))
-    if img is None:
-        logger.error(f"Cannot read {input_path}")
+    from .ascii_art_toolkit import (
+        ascii_art_batch,
+        ascii_art_font_available,
+        ascii_art_out_dir,
+    )
+
+    input_obj = Path(input_path)
+    pack_opts = _build_pack_opts(
+        levels, palette, bpp, bit_order, invert, row_align, tone
+    )
+    style = {"info_panel": info_panel, "scanlines": scanlines}
+    native = (render and renderer == "native") or emit_bin
+    if native and not ascii_art_font_available():
+        logger.error("SarasaMonoSC-Regular.ttf not found in the repository root")
         return
 
-    out_dir = input_file.parent / input_file.stem
-    out_dir.mkdir(parents=True, exist_ok=True)
+    def finish(txt_out: Path) -> None:
+        if render and renderer == "ts":
+            with metrics.stage("render"):
+                _render_ascii(txt_out, info_panel, scanlines)
+        elif render:
+            from .ascii_renderer import render_ascii_file
+
+            with metrics.stage("render"):
+                png = render_ascii_file(txt_out, **style)
+            logger.success(f"Rendered: {png}")
+        if emit_bin:
+            _ascii_bin(txt_out, width, height, method, pack_opts, style)
+
+    if input_obj.is_file():
+        import cv2
 
+        from .ascii_art_toolkit import generate_ascii_art
+
+        with metrics.image(input_obj), metrics.stage("decode"):
+            img = cv2.imread(str(input_obj))
+        if img is None:
+            logger.error(f"Cannot read {input_path}")
+            return
+
+        out_dir = ascii_art_out_dir(input_obj)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        logger.info(
+            f"Generating ASCII art for {input_obj.name}"
+            + (f" ({rows} rows)" if rows else "")
+            + "..."
+        )
+        with metrics.image(input_obj):
+            generate_ascii_art(
+                img,
+                num_rows=rows,
+                out_dir=out_dir,
+                stem=input_obj.stem,
+                sam_checkpoint=sam_checkpoint,
+                sam_model_type=sam_model_type,
+                sam_cache=not no_sam_cache,
+            )
+
+            txt_out = out_dir / f"{input_obj.stem}_ascii.txt"
+            logger.success(f"Intermediate steps saved to: {out_dir}/")
+            logger.success(f"ASCII art saved to: {txt_out}")
+            finish(txt_out)
+        return
+
+    img_files = [
+        f
+        for f in sorted(input_obj.iterdir())
+        if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS
+    ]
     logger.info(
-        f"Generating ASCII art for {input_file.name}"
+        f"Generating ASCII art for {len(img_files)} images in {input_obj}"
         + (f" ({rows} rows)" if rows else "")
         + "..."
     )
-    generate_ascii_art(
-        img,
+    count = 0
+    for img_file, txt_out in ascii_art_batch(
+        img_files,
         num_rows=rows,
-        out_dir=out_dir,
-        stem=input_file.stem,
         sam_checkpoint=sam_checkpoint,
         sam_model_type=sam_model_type,
-    )
+        sam_cache=not no_sam_cache,
+        workers=workers,
+        batch_size=batch_size,
+    ):
+        if txt_out is None:
+            logger.error(f"Cannot read {img_file}")
+            continue
+        logger.info(f"{img_file.name} → {txt_out}")
+        count += 1
+        with metrics.image(img_file):
+            finish(txt_out)
+    logger.success(f"Generated {count} ASCII art pieces in {input_obj}")
 
-    txt_out = out_dir / f"{input_file.stem}_ascii.txt"
-    logger.success(f"Intermediate steps saved to: {out_dir}/")
-    logger.success(f"ASCII art saved to: {txt_out}")
 
-    if render:
-        import subprocess
+def _ascii_bin(
+    txt_out: Path, width: int, height: int, method: str, pack_opts: dict, style: dict
+) -> None:
+    """Render an ASCII .txt straight to <stem>.bin + <stem>_preview.png."""
+    import cv2
 
-        render_dir = Path(__file__).parent.parent / "render"
-        render_script = render_dir / "src" / "render.ts"
+    from .ascii_renderer import ascii_frame
 
-        if not render_script.exists():
-            logger.error(f"Renderer not found at {render_script}")
-            return
+    rows = txt_out.read_text(encoding="utf-8").split("\n")
+    with metrics.stage("render"):
+        preview, packed, _ = ascii_frame(
+            rows, width, height, method, pack_opts, **style
+        )
+    bin_out = txt_out.with_suffix(".bin")
+    preview_out = txt_out.with_name(txt_out.stem + "_preview.png")
+    with metrics.stage("write"):
+        _ = cv2.imwrite(str(preview_out), preview)
+        _ = bin_out.write_bytes(packed.tobytes())
+    logger.success(f"bin: {bin_out}")
+    logger.success(f"preview: {preview_out}")
 
-        cmd = ["npx", "ts-node", str(render_script), str(txt_out.resolve())]
-        if info_panel:
-            cmd.append("--info-panel")
-        if scanlines:
-            cmd.append("--scanlines")
-        logger.info(f"Rendering: {' '.join(cmd)}")
-        try:
-            # Run in the render directory so it can find tsconfig.json etc.
-            result = subprocess.run(
-                cmd, cwd=str(render_dir), capture_output=True, text=True, check=True
-            )
-            logger.info(result.stdout.strip())
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Rendering failed:\n{e.stderr}")
-    else:
-        logger.info(f"Render to PNG: cd render && npx ts-node src/render.ts {txt_out}")
+
+def _render_ascii(txt_out: Path, info_panel: bool, scanlines: bool) -> None:
+    """Render an ASCII .txt to PNG with the TypeScript renderer."""
+    import subprocess
+
+    render_dir = Path(__file__).parent.parent / "render"
+    render_script = render_dir / "src" / "render.ts"
+
+    if not render_script.exists():
+        logger.error(f"Renderer not found at {render_script}")
+        return
+
+    cmd = ["npx", "ts-node", str(render_script), str(txt_out.resolve())]
+    if info_panel:
+        cmd.append("--info-panel")
+    if scanlines:
+        cmd.append("--scanlines")
+    logger.info(f"Rendering: {' '.join(cmd)}")
+    try:
+        # Run in the render directory so it can find tsconfig.json etc.
+        result = subprocess.run(
+            cmd, cwd=str(render_dir), capture_output=True, text=True, check=True
+        )
+        logger.info(result.stdout.strip())
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Rendering failed:\n{e.stderr}")
 
 
 @cli.command()
 @click.argument("bin_path", type=click.Path(exists=True))
 @click.option("--host", "-H", required=True, help="ESPSlider IP address")
-def upload(bin_path: str, host: str) -> None:
+@click.option(
+    "--frame",
+    "-f",
+    default=None,
+    help="Name of the frame to upload when BIN_PATH is a .gpk frame pack",
+)
+@click.option(
+    "--frame-index",
+    type=int,
+    default=None,
+    help="Position of the frame in a .gpk pack's index (default: the first frame)",
+)
+def upload(
+    bin_path: str, host: str, frame: str | None, frame_index: int | None
+) -> None:
     """
-    Upload a .bin file to ESPSlider over WiFi.
+    Upload a .bin file (or one frame of a .gpk pack) to ESPSlider over WiFi.
 
     Example:
         geink upload image.bin --host 192.168.1.100
+        geink upload photos.gpk --frame sunset --host 192.168.1.100
+        geink upload photos.gpk --frame-index 3 --host 192.168.1.100
     """
+    import requests
+
+    if frame is not None and frame_index is not None:
+        raise click.UsageError("--frame and --frame-index are mutually exclusive")
     bin_file = Path(bin_path)
-    data = bin_file.read_bytes()
-    logger.info(f"Uploading {bin_file.name} ({len(data)} bytes) to {host}...")
+    if is_frame_pack(bin_file):
+        with FramePack(bin_file) as pack:
+            key: str | int = frame if frame is not None else frame_index or 0
+            try:
+                entry = pack.entry(key)
+            except (KeyError, IndexError):
+                raise click.BadParameter(
+                    f"no such frame in {bin_file.name}: {key}",
+                    param_hint="--frame" if frame is not None else "--frame-index",
+                ) from None
+            name = f"{entry.name}.bin"
+            data = bytes(pack[key])
+    else:
+        name = bin_file.name
+        data = bin_file.read_bytes()
+    logger.info(f"Uploading {name} ({len(data)} bytes) to {host}...")
 
     try:
-        response = requests.post(
-            f"http://{host}/upload",
-            files={"file": (bin_file.name, data, "application/octet-stream")},
-            timeout=30,
-        )
+        with metrics.stage("upload"):
+            response = requests.post(
+                f"http://{host}/upload",
+                files={"file": (name, data, "application/octet-stream")},
+                timeout=30,
+            )
         if response.status_code == 200:
-            logger.success(f"Uploaded {bin_file.name}")
+            logger.success(f"Uploaded {name}")
         else:
             logger.error(
                 f"Upload failed: {response.status_code} {response.text.strip()}"
             )
-    except Exception as e:
+    except requests.RequestException as e:
         logger.error(f"Network error: {e}")
 
 
+def _iter_frames(
+    src: Path,
+) -> Iterator[tuple[str, bytes | memoryview, FrameEntry | None]]:
+    """
+    Yield (label, data, entry) for every frame in a .gpk pack or a directory
+    of .bin files; entry is the pack index record, None for .bin files.
+    """
+    if is_frame_pack(src):
+        with FramePack(src) as pack:
+            for entry, view in pack:
+                yield entry.name, view, entry
+                view.release()
+    else:
+        for path in sorted(src.glob("*.bin")):
+            yield path.name, path.read_bytes(), None
+
+
+def _keep_frame(
+    dedup_filter,
+    src: Path,
+    label: str,
+    data: bytes | memoryview,
+    entry: FrameEntry | None,
+) -> bool:
+    """
+    --dedup for gen-header: hash the _preview.png `process` wrote next to a
+    .bin when there is one, otherwise the unpacked frame itself.
+    """
+    import numpy as np
+
+    from .packing_toolkit import packed_size, unpack_pixels
+    from .phash_index import load_gray
+
+    if entry is not None:
+        width, height, bpp = entry.width, entry.height, entry.bpp
+        key, stamp = f"{src.name}:{label}", entry.digest.hex()
+    else:
+        path = src / label
+        stat = path.stat()
+        key, stamp = label, f"{stat.st_size}:{stat.st_mtime_ns}"
+        preview = path.with_name(path.stem + "_preview.png")
+        if preview.exists():
+            return dedup_filter.keep(label, key, stamp, lambda: load_gray(preview))
+        # A bare .bin has no header: assume panel size and infer the depth
+        width, height = TARGET_WIDTH, TARGET_HEIGHT
+        bpp = next(
+            (b for b in (1, 2, 4, 8) if packed_size(width, height, b) == len(data)),
+            None,
+        )
+
+    def load():
+        if bpp is None:
+            return None
+        try:
+            values = unpack_pixels(data, width, height, bpp)
+        except ValueError:
+            return None
+        return (values * (255 // ((1 << bpp) - 1))).astype(np.uint8)
+
+    return dedup_filter.keep(label, key, stamp, load)
+
+
 @cli.command("gen-header")
-@click.argument("bin_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("bin_dir", type=click.Path(exists=True))
 @click.argument("output", type=click.Path(), required=False)
-def gen_header(bin_dir: str, output: str | None) -> None:
+@_dedup_options
+def gen_header(
+    bin_dir: str,
+    output: str | None,
+    dedup: bool,
+    dedup_distance: int,
+    dedup_hash: str,
+) -> None:
     """
     Generate a PROGMEM C header from .bin files for ESPSlider.
 
-    BIN_DIR   directory containing .bin files
+    BIN_DIR   directory containing .bin files, or a .gpk frame pack
     OUTPUT    path for the generated .h file (default: ESPSlider/images.h)
 
     Example:
         geink gen-header test_img/
         geink gen-header test_img/ ESPSlider/images.h
+        geink gen-header photos.gpk
+        geink gen-header test_img/ --dedup
     """
     src = Path(bin_dir)
-    bins = sorted(src.glob("*.bin"))
-    if not bins:
-        logger.error(f"No .bin files found in {src}")
+    if src.is_file() and not is_frame_pack(src):
+        logger.error(f"{src} is neither a directory nor a frame pack")
         return
 
-    out = Path(output) if output else Path(__file__).parent.parent / "ESPSlider" / "images.h"
+    out = (
+        Path(output)
+        if output
+        else Path(__file__).parent.parent / "ESPSlider" / "images.h"
+    )
     out.parent.mkdir(parents=True, exist_ok=True)
 
     lines = [
@@ -455,15 +1451,30 @@ def gen_header(bin_dir: str, output: str | None) -> None:
         "#include <pgmspace.h>",
         "",
     ]
+    dedup_filter = None
+    if dedup:
+        from .phash_index import NearDuplicateFilter
+
+        dedup_filter = NearDuplicateFilter(
+            src.parent if src.is_file() else src, dedup_hash, dedup_distance
+        )
     names: list[tuple[str, int]] = []
-    for i, path in enumerate(bins):
-        data = path.read_bytes()
-        name = f"img_{i}"
+    for label, data, entry in _iter_frames(src):
+        if dedup_filter is not None and not _keep_frame(
+            dedup_filter, src, label, data, entry
+        ):
+            continue
+        name = f"img_{len(names)}"
         names.append((name, len(data)))
         hex_vals = ", ".join(f"0x{b:02x}" for b in data)
-        lines.append(f"// {path.name}  ({len(data)} bytes)")
+        lines.append(f"// {label}  ({len(data)} bytes)")
         lines.append(f"static const uint8_t {name}[] PROGMEM = {{{hex_vals}}};")
         lines.append("")
+    if dedup_filter is not None:
+        dedup_filter.close()
+    if not names:
+        logger.error(f"No .bin frames found in {src}")
+        return
 
     lines += [
         "struct ImageEntry { const uint8_t *data; size_t size; };",
@@ -479,11 +1490,9 @@ def gen_header(bin_dir: str, output: str | None) -> None:
 
     out.write_text("\n".join(lines) + "\n")
     total = sum(s for _, s in names)
-    logger.success(f"Generated {out}  ({len(names)} images, {total / 1024:.1f} KB total)")
-
-
-# Register commands from sub-modules
-cli.add_command(edge_cut_cmd)
+    logger.success(
+        f"Generated {out}  ({len(names)} images, {total / 1024:.1f} KB total)"
+    )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,28 @@
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import cv2
 import numpy as np
 from loguru import logger
 
+from . import metrics
+
+
+def grid_bounds(
+    h: int, w: int, rows: int, cols: int
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    每个网格行/列的 [start, end) 像素范围；余数归入最后一行/列。
+
+    Returns:
+        (ys, xs): rows 个 (y_start, y_end) 和 cols 个 (x_start, x_end)
+    """
+    tile_h, tile_w = h // rows, w // cols
+    ys = [(r * tile_h, (r + 1) * tile_h if r < rows - 1 else h) for r in range(rows)]
+    xs = [(c * tile_w, (c + 1) * tile_w if c < cols - 1 else w) for c in range(cols)]
+    return ys, xs
+
 
 def grid_cut(image: np.ndarray | str | Path, rows: int, cols: int) -> list[np.ndarray]:
     """
@@ -31,42 +50,175 @@ def grid_cut(image: np.ndarray | str | Path, rows: int, cols: int) -> list[np.nd
     else:
         img = image
 
-    h, w = img.shape[:2]
-    tile_h: int = h // rows
-    tile_w: int = w // cols
+    ys, xs = grid_bounds(*img.shape[:2], rows, cols)
+    tiles: list[np.ndarray] = [
+        img[y_start:y_end, x_start:x_end]
+        for y_start, y_end in ys
+        for x_start, x_end in xs
+    ]
 
-    tiles: list[np.ndarray] = []
-    for r in range(rows):
-        for c in range(cols):
-            y_start = r * tile_h
-            y_end = (r + 1) * tile_h if r < (rows - 1) else h
-            x_start = c * tile_w
-            x_end = (c + 1) * tile_w if c < (cols - 1) else w
+    return tiles
 
-            tile = img[int(y_start) : int(y_end), int(x_start) : int(x_end)]
-            tiles.append(tile)
 
-    return tiles
+def _to_bgr(pixels: np.ndarray) -> np.ndarray:
+    """RGB → BGR view (灰度原样返回)，与 cv2.imread 的通道顺序一致"""
+    return pixels[..., ::-1] if pixels.ndim == 3 else pixels
+
 
+class _TiffRegionReader:
+    """
+    按行带读取 TIFF：只解码与 [y_start, y_end) 相交的条带/瓦片。
+
+    未压缩的连续存储直接内存映射；其余逐段解码，跨两个行带的段缓存一份，
+    不会重复解码。输出与 cv2.imread(IMREAD_UNCHANGED) 一致（RGB → BGR）。
+    """
 
-def grid_cut_image(img_path: str, rows: int, cols: int) -> bool:
+    def __init__(self, tif, page, mmap: np.ndarray | None = None) -> None:
+        self._tif = tif
+        self._page = page
+        self.shape: tuple[int, ...] = tuple(page.shape)
+        self._mmap = mmap
+        self._seg_h = page.tilelength or page.rowsperstrip or page.imagelength
+        self._seg_w = page.tilewidth or page.imagewidth
+        self._per_row = -(-page.imagewidth // self._seg_w)
+        self._cached: tuple[int, np.ndarray] | None = None
+
+    @classmethod
+    def open(cls, img_path: str) -> "_TiffRegionReader | None":
+        """无法按区域读取（非 TIFF、未安装 tifffile 或布局不支持）时返回 None"""
+        if Path(img_path).suffix.lower() not in (".tif", ".tiff"):
+            return None
+        try:
+            import tifffile
+        except ImportError:
+            logger.warning("未安装 tifffile，整图读取")
+            return None
+
+        try:
+            tif = tifffile.TiffFile(img_path)
+        except (OSError, tifffile.TiffFileError):
+            return None
+        page = tif.pages.first
+        supported = (
+            page.photometric
+            in (tifffile.PHOTOMETRIC.MINISBLACK, tifffile.PHOTOMETRIC.RGB)
+            and page.planarconfig == tifffile.PLANARCONFIG.CONTIG
+            and page.imagedepth == 1
+            # OpenCV premultiplies RGBA via libtiff; keep its decode for alpha
+            and page.samplesperpixel in (1, 3)
+            and page.dtype in (np.uint8, np.uint16, np.float32)
+            # LZW/JPEG etc. need imagecodecs; let OpenCV decode those
+            and page.compression in tifffile.TIFF.DECOMPRESSORS
+        )
+        if not supported:
+            tif.close()
+            return None
+        mmap = None
+        if page.is_memmappable:
+            mmap = tifffile.memmap(img_path, page=0, mode="r")
+        return cls(tif, page, mmap)
+
+    def close(self) -> None:
+        self._tif.close()
+
+    def _segment_row(self, sr: int) -> np.ndarray:
+        """解码第 sr 行段（完整宽度），只缓存最近一行"""
+        if self._cached is not None and self._cached[0] == sr:
+            return self._cached[1]
+        page, fh = self._page, self._tif.filehandle
+        y = sr * self._seg_h
+        h = min(self._seg_h, page.imagelength - y)
+        out = np.zeros((h, *self.shape[1:]), dtype=page.dtype)
+        for sc in range(self._per_row):
+            index = sr * self._per_row + sc
+            if not page.databytecounts[index]:
+                continue
+            fh.seek(page.dataoffsets[index])
+            segment = page.decode(fh.read(page.databytecounts[index]), index)[0]
+            x = sc * self._seg_w
+            w = min(self._seg_w, page.imagewidth - x)
+            out[:, x : x + w] = _to_bgr(
+                segment[0, :h, :w].reshape(h, w, *self.shape[2:])
+            )
+        self._cached = (sr, out)
+        return out
+
+    def read(self, y_start: int, y_end: int) -> np.ndarray:
+        """返回 [y_start, y_end) 的完整宽度像素带"""
+        if self._mmap is not None:
+            band = self._mmap[y_start:y_end]
+            return np.ascontiguousarray(_to_bgr(band)) if band.ndim == 3 else band
+
+        first, last = y_start // self._seg_h, (y_end - 1) // self._seg_h
+        band = np.empty((y_end - y_start, *self.shape[1:]), dtype=self._page.dtype)
+        for sr in range(first, last + 1):
+            seg_y = sr * self._seg_h
+            rows = self._segment_row(sr)
+            lo, hi = max(y_start, seg_y), min(y_end, seg_y + len(rows))
+            band[lo - y_start : hi - y_start] = rows[lo - seg_y : hi - seg_y]
+        return band
+
+
+def iter_grid_rows(
+    img_path: str, rows: int, cols: int
+) -> Iterator[list[np.ndarray]] | None:
+    """
+    按行优先顺序逐行产出网格子图，边界与 grid_cut() 完全一致。
+
+    TIFF 只读取当前网格行所需的像素带，内存占用与一行子图成正比；
+    其他格式（或不支持的 TIFF 布局）整图读取后按行产出。
+
+    Returns:
+        每次产出一行 cols 个子图的迭代器；图片读取失败时返回 None
+    """
+    if rows < 1 or cols < 1:
+        raise ValueError("rows and cols must be >= 1")
+
+    reader = _TiffRegionReader.open(img_path)
+    if reader is None:
+        with metrics.stage("decode"):
+            img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return None
+        tiles = grid_cut(img, rows, cols)
+        return (tiles[r * cols : (r + 1) * cols] for r in range(rows))
+
+    def _rows() -> Iterator[list[np.ndarray]]:
+        try:
+            ys, xs = grid_bounds(*reader.shape[:2], rows, cols)
+            for y_start, y_end in ys:
+                with metrics.stage("decode"):
+                    band = reader.read(y_start, y_end)
+                yield [band[:, x_start:x_end] for x_start, x_end in xs]
+        finally:
+            reader.close()
+
+    return _rows()
+
+
+def grid_cut_image(
+    img_path: str, rows: int, cols: int, workers: int | None = None
+) -> bool:
     """
     切割单张图片并保存到源目录下无扩展名的子文件夹。
 
+    逐个网格行读取，子图由线程池写出；读取下一行时上一行仍在写，
+    因此同时驻留的最多两行子图。
+
     Args:
         img_path: 图片路径
         rows: 行数
         cols: 列数
+        workers: 写文件线程数（默认 ThreadPoolExecutor 的默认值）
 
     Returns:
         bool: 成功返回 True
     """
-    img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-    if img is None:
+    grid_rows = iter_grid_rows(img_path, rows, cols)
+    if grid_rows is None:
         logger.error(f"无法读取图片: {img_path}")
         return False
 
-    tiles = grid_cut(img, rows, cols)
     input_path = Path(img_path)
 
     output_dir = input_path.parent / input_path.stem
@@ -74,11 +226,27 @@ def grid_cut_image(img_path: str, rows: int, cols: int) -> bool:
 
     suffix = input_path.suffix
 
-    for idx, tile in enumerate(tiles):
-        row = idx // cols
-        col = idx % cols
-        output_file = output_dir / f"r{row}_c{col}{suffix}"
-        _ = cv2.imwrite(str(output_file), tile)
-
-    logger.success(f"切割完成: {img_path} -> {len(tiles)} 个子图 -> {output_dir}")
+    def _wait(futures: list[Future]) -> bool:
+        # Only the time spent blocked on writers counts; the rest overlaps decode
+        with metrics.stage("write"):
+            return all(f.result() for f in futures)
+
+    ok = True
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: list[Future] = []
+        for row, tiles in enumerate(grid_rows):
+            submitted = [
+                pool.submit(
+                    cv2.imwrite, str(output_dir / f"r{row}_c{col}{suffix}"), tile
+                )
+                for col, tile in enumerate(tiles)
+            ]
+            ok &= _wait(pending)
+            pending = submitted
+        ok &= _wait(pending)
+
+    if not ok:
+        logger.error(f"部分子图写入失败: {output_dir}")
+        return False
+    logger.success(f"切割完成: {img_path} -> {rows * cols} 个子图 -> {output_dir}")
     return True
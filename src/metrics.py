@@ -0,0 +1,243 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from pathlib import Path
+
+from loguru import logger
+
+from .config import METRICS_PATH
+
+# Records are appended as JSON lines to the file named by GEINK_METRICS
+# (environment, .env or `geink --metrics`). enable() exports it so pool
+# workers, forked or spawned, report into the same file; GEINK_METRICS_RUN
+# tags the records of one CLI invocation so summary() can pick them out.
+METRICS_ENV = "GEINK_METRICS"
+RUN_ENV = "GEINK_METRICS_RUN"
+
+_NULL = nullcontext()
+_path: str | None = None
+_fd: int | None = None
+_local = threading.local()
+# Called as hook(stage, entering) at every stage boundary, even with no
+# metrics file (geink profile --tracemalloc diffs allocations this way)
+_hooks: list[Callable[[str, bool], None]] = []
+# Linux lets a process reset its RSS high-water mark, which gives a real
+# per-stage peak; elsewhere peak_mb is the process-lifetime maximum.
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+_can_reset_peak = sys.platform == "linux" and os.access(_CLEAR_REFS, os.W_OK)
+
+
+def enable(path: str | Path) -> None:
+    """Start recording stage metrics to path (JSON lines, appended)."""
+    global _path, _fd
+    _path = str(Path(path).resolve())
+    os.environ[METRICS_ENV] = _path
+    os.environ.setdefault(RUN_ENV, uuid.uuid4().hex[:12])
+    if _fd is not None:
+        os.close(_fd)
+    _fd = None
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+def add_hook(hook: Callable[[str, bool], None]) -> None:
+    """Call hook(stage, entering) on entry to and exit from every stage."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, bool], None]) -> None:
+    _hooks.remove(hook)
+
+
+def rss_mb() -> tuple[float, float]:
+    """(current RSS, high-water RSS) in MB."""
+    current = peak = 0.0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return current, peak
+
+
+def reset_peak_rss() -> bool:
+    """Reset the RSS high-water mark; False where the platform can't."""
+    global _can_reset_peak
+    if not _can_reset_peak:
+        return False
+    try:
+        _CLEAR_REFS.write_text("5")
+    except OSError:
+        _can_reset_peak = False
+    return _can_reset_peak
+
+
+def _write(record: dict) -> None:
+    global _fd
+    if _fd is None:
+        _fd = os.open(_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    # One write() per line so records from concurrent workers don't interleave
+    os.write(_fd, (json.dumps(record, ensure_ascii=False) + "\n").encode())
+
+
+def _stack() -> list[dict]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def _measure(name: str) -> Iterator[None]:
+    for hook in _hooks:
+        hook(name, True)
+    try:
+        if _path is None:
+            yield
+        else:
+            with _record(name):
+                yield
+    finally:
+        for hook in reversed(_hooks):
+            hook(name, False)
+
+
+@contextmanager
+def _record(name: str) -> Iterator[None]:
+    # Memory is only tracked on the main thread: the high-water mark is
+    # process-wide, so resetting it from a writer thread would clobber the
+    # stage running on the main thread.
+    track_mem = threading.current_thread() is threading.main_thread()
+    stack = _stack()
+    frame = {"child_peak": 0.0}
+    if track_mem:
+        rss, peak = rss_mb()
+        if stack:
+            stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+        reset_peak_rss()
+        frame["rss"] = rss
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        stack.pop()
+        record = {
+            "run": os.environ.get(RUN_ENV),
+            "pid": os.getpid(),
+            "image": getattr(_local, "image", None),
+            "stage": name,
+            "wall_ms": round(wall * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+        }
+        if track_mem:
+            _, peak = rss_mb()
+            peak = max(peak, frame["child_peak"])
+            if stack:
+                stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+            record["peak_mb"] = round(peak, 1)
+            record["alloc_mb"] = round(max(0.0, peak - frame["rss"]), 1)
+        _write(record)
+
+
+def stage(name: str) -> AbstractContextManager[None]:
+    """
+    Time a pipeline stage: wall time, CPU time and peak RSS growth.
+
+    Returns a shared no-op context manager when metrics are off, so
+    instrumented code only pays for one function call.
+    """
+    if _path is None and not _hooks:
+        return _NULL
+    return _measure(name)
+
+
+@contextmanager
+def _tag(label: str) -> Iterator[None]:
+    previous = getattr(_local, "image", None)
+    _local.image = label
+    try:
+        yield
+    finally:
+        _local.image = previous
+
+
+def image(label: str | Path) -> AbstractContextManager[None]:
+    """Attribute the stages recorded inside this block to one input image."""
+    if _path is None:
+        return _NULL
+    return _tag(str(label))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def summary() -> None:
+    """Log p50/p90/p99/max per stage for this run's records."""
+    if _path is None:
+        return
+    run = os.environ.get(RUN_ENV)
+    stages: dict[str, dict[str, list[float]]] = {}
+    try:
+        with open(_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法读取 metrics 文件 {_path}: {e}")
+        return
+
+    for record in records:
+        if record.get("run") != run:
+            continue
+        columns = stages.setdefault(record["stage"], {"wall_ms": [], "cpu_ms": []})
+        columns["wall_ms"].append(record["wall_ms"])
+        columns["cpu_ms"].append(record["cpu_ms"])
+        if "alloc_mb" in record:
+            columns.setdefault("alloc_mb", []).append(record["alloc_mb"])
+    if not stages:
+        return
+
+    header = (
+        f"{'stage':<14}{'n':>6}{'wall p50':>10}{'p90':>9}{'p99':>9}{'max':>9}"
+        f"{'cpu p50':>9}{'alloc p90':>11}"
+    )
+    lines = [f"metrics ({_path}):", header]
+    for name, columns in sorted(
+        stages.items(), key=lambda item: -sum(item[1]["wall_ms"])
+    ):
+        wall = sorted(columns["wall_ms"])
+        cpu = sorted(columns["cpu_ms"])
+        alloc = sorted(columns.get("alloc_mb", []))
+        alloc_p90 = f"{_percentile(alloc, 90):>8.1f} MB" if alloc else f"{'-':>11}"
+        lines.append(
+            f"{name:<14}{len(wall):>6}"
+            f"{_percentile(wall, 50):>10.1f}{_percentile(wall, 90):>9.1f}"
+            f"{_percentile(wall, 99):>9.1f}{wall[-1]:>9.1f}"
+            f"{_percentile(cpu, 50):>9.1f}{alloc_p90}"
+        )
+    logger.info("\n".join(lines))
+
+
+# Pool workers (and plain `GEINK_METRICS=out.jsonl geink ...` runs) pick the
+# destination up from the environment.
+if METRICS_PATH:
+    enable(METRICS_PATH)
@@ -0,0 +1,323 @@
+import math
+
+import numpy as np
+
+from . import metrics
+from .dithering_toolkit import (
+    DITHER_KERNELS,
+    apply_dithering,
+    palette_diffusion_indices,
+)
+from .pointillism_toolkit import color_atkinson_dithering
+from .tone import ToneCurve, tone_bgr, tone_gray
+
+# Waveshare 7-color ACeP panels (OpenCV BGR 格式), in the controller's index order:
+# 0 black, 1 white, 2 green, 3 blue, 4 red, 5 yellow, 6 orange
+EPD_7COLOR_PALETTE: np.ndarray = np.array(
+    [
+        [0, 0, 0],
+        [255, 255, 255],
+        [0, 255, 0],
+        [255, 0, 0],
+        [0, 0, 255],
+        [0, 255, 255],
+        [0, 128, 255],
+    ],
+    dtype=np.float32,
+)
+
+
+def bits_for_palette(num_colors: int) -> int:
+    """Smallest byte-aligned bit width (1/2/4/8) that can index `num_colors` entries."""
+    needed = max(1, math.ceil(math.log2(num_colors)))
+    for bpp in (1, 2, 4, 8):
+        if bpp >= needed:
+            return bpp
+    raise ValueError(f"palette too large: {num_colors} colors")
+
+
+def gray_to_levels(gray_img: np.ndarray, levels: int) -> np.ndarray:
+    """Map a quantized gray image (0-255) to level indices 0..levels-1 (0 = black)."""
+    scaled = gray_img.astype(np.float32) * ((levels - 1) / 255.0)
+    return np.rint(scaled).astype(np.uint8)
+
+
+def levels_to_gray(indices: np.ndarray, levels: int) -> np.ndarray:
+    """Inverse of gray_to_levels, used for previews."""
+    return np.round(indices.astype(np.float32) * (255.0 / (levels - 1))).astype(
+        np.uint8
+    )
+
+
+def palette_indices(img_bgr: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Return the index of the nearest palette color for every pixel (uint8 H×W)."""
+    pixels = img_bgr.reshape(-1, 1, 3).astype(np.float32)
+    distances = np.sum((pixels - palette[np.newaxis, :, :]) ** 2, axis=2)
+    return np.argmin(distances, axis=1).astype(np.uint8).reshape(img_bgr.shape[:2])
+
+
+def _row_bytes(width: int, bpp: int, row_align: int) -> int:
+    raw = (width * bpp + 7) // 8
+    return (raw + row_align - 1) // row_align * row_align
+
+
+def pack_pixels(
+    indices: np.ndarray,
+    bpp: int = 1,
+    msb_first: bool = True,
+    invert: bool = False,
+    row_align: int | None = None,
+) -> np.ndarray:
+    """
+    Pack an H×W array of small integers (gray levels or palette indices) into bytes.
+
+    bpp:        bits per pixel; 1/2/4/8 use a reshape + shift-or fast path,
+                other widths (e.g. 3) go through a bit-plane expansion
+    msb_first:  first pixel of each byte lands in the high bits (EPD convention)
+    invert:     store the bitwise complement of each value (e.g. black = 1 in
+                the existing 1-bit .bin frames)
+    row_align:  pad each row to a multiple of this many bytes; None (the
+                default, and the original .bin layout) packs the whole frame
+                as one continuous bit stream
+
+    Returns a flat uint8 array.
+    """
+    if not 1 <= bpp <= 8:
+        raise ValueError(f"bpp must be in 1..8, got {bpp}")
+    mask = np.uint8((1 << bpp) - 1)
+    values = indices.astype(np.uint8) & mask
+    if invert:
+        values ^= mask
+    if row_align is None:
+        values = values.reshape(1, -1)
+        row_align = 1
+
+    rows, width = values.shape
+    row_bytes = _row_bytes(width, bpp, row_align)
+    if 8 % bpp == 0:
+        per_byte = 8 // bpp
+        padded = np.zeros((rows, row_bytes * per_byte), dtype=np.uint8)
+        padded[:, :width] = values
+        groups = padded.reshape(rows, row_bytes, per_byte)
+        shifts = np.arange(per_byte, dtype=np.uint8) * np.uint8(bpp)
+        if msb_first:
+            shifts = shifts[::-1]
+        packed = np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+    else:
+        # Expand every value into its bpp bits, then pack the resulting bit stream
+        bit_pos = np.arange(bpp, dtype=np.uint8)
+        if msb_first:
+            bit_pos = bit_pos[::-1]
+        bits = (values[:, :, np.newaxis] >> bit_pos) & 1
+        bits = bits.reshape(rows, width * bpp)
+        padded = np.zeros((rows, row_bytes * 8), dtype=np.uint8)
+        padded[:, : width * bpp] = bits
+        packed = np.packbits(padded, axis=1, bitorder="big" if msb_first else "little")
+
+    return packed.reshape(-1)
+
+
+def unpack_pixels(
+    data: bytes | memoryview | np.ndarray,
+    width: int,
+    height: int,
+    bpp: int = 1,
+    msb_first: bool = True,
+    invert: bool = False,
+    row_align: int | None = None,
+) -> np.ndarray:
+    """Inverse of pack_pixels: return the H×W uint8 array of indices."""
+    if not 1 <= bpp <= 8:
+        raise ValueError(f"bpp must be in 1..8, got {bpp}")
+    buf = data if isinstance(data, np.ndarray) else np.frombuffer(data, np.uint8)
+
+    if row_align is None:
+        rows, cols = 1, width * height
+        row_align = 1
+    else:
+        rows, cols = height, width
+    row_bytes = _row_bytes(cols, bpp, row_align)
+    if buf.size < rows * row_bytes:
+        raise ValueError(
+            f"buffer too small: {buf.size} bytes, expected {rows * row_bytes}"
+        )
+    grid = buf[: rows * row_bytes].reshape(rows, row_bytes)
+
+    mask = np.uint8((1 << bpp) - 1)
+    if 8 % bpp == 0:
+        per_byte = 8 // bpp
+        shifts = np.arange(per_byte, dtype=np.uint8) * np.uint8(bpp)
+        if msb_first:
+            shifts = shifts[::-1]
+        values = (grid[:, :, np.newaxis] >> shifts) & mask
+        values = values.reshape(rows, row_bytes * per_byte)[:, :cols]
+    else:
+        bits = np.unpackbits(grid, axis=1, bitorder="big" if msb_first else "little")
+        bits = bits[:, : cols * bpp].reshape(rows, cols, bpp)
+        weights = (1 << np.arange(bpp)).astype(np.uint8)
+        if msb_first:
+            weights = weights[::-1]
+        values = np.sum(bits * weights, axis=2, dtype=np.uint8)
+
+    values = values.reshape(height, width).astype(np.uint8)
+    return values ^ mask if invert else values
+
+
+def packed_size(
+    width: int, height: int, bpp: int = 1, row_align: int | None = None
+) -> int:
+    """Number of bytes pack_pixels produces for a width×height frame."""
+    if row_align is None:
+        return (width * height * bpp + 7) // 8
+    return height * _row_bytes(width, bpp, row_align)
+
+
+PALETTES: dict[str, np.ndarray] = {
+    "7color": EPD_7COLOR_PALETTE,
+}
+
+
+def dither_frame(
+    bgr: np.ndarray,
+    method: str = "atkinson",
+    levels: int = 2,
+    palette: str | None = None,
+    tone: ToneCurve | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Dither a preprocessed BGR frame to gray levels or palette indices.
+
+    Grayscale panels are dithered to `levels` gray values; with `palette` set
+    (a key of PALETTES) the frame is dithered to palette indices instead.
+    `tone` (see tone.parse_tone) is applied to the gray, or to every color
+    channel, before dithering.
+
+    Returns (preview, indices): a displayable uint8 image and the H×W index map.
+    """
+    if palette is None:
+        gray = tone_gray(bgr, tone)
+        preview = apply_dithering(gray, method, levels=levels)
+        return preview, gray_to_levels(preview, levels)
+
+    colors = PALETTES[palette]
+    bgr = tone_bgr(bgr, tone)
+    if method == "binary_threshold":
+        indices = palette_indices(bgr, colors)
+    elif method in DITHER_KERNELS:
+        indices = palette_diffusion_indices(bgr, colors, DITHER_KERNELS[method])
+    else:
+        dithered = color_atkinson_dithering(bgr, colors, method=method)
+        indices = palette_indices(dithered, colors)
+    return colors[indices].astype(np.uint8), indices
+
+
+def resolve_format(
+    levels: int = 2,
+    palette: str | None = None,
+    bpp: int | None = None,
+    invert: bool | None = None,
+) -> tuple[int, bool]:
+    """
+    Fill in packing defaults and return (bpp, invert).
+
+    bpp defaults to log2(levels) for gray and the smallest byte-aligned width
+    for palettes. invert defaults to True for gray (the existing .bin layout
+    stores black as 1) and False for palette indices.
+    """
+    if palette is None:
+        bits = bpp or max(1, math.ceil(math.log2(levels)))
+        return bits, True if invert is None else invert
+    bits = bpp or bits_for_palette(len(PALETTES[palette]))
+    return bits, False if invert is None else invert
+
+
+def encode_frame(
+    bgr: np.ndarray,
+    method: str = "atkinson",
+    levels: int = 2,
+    palette: str | None = None,
+    bpp: int | None = None,
+    msb_first: bool = True,
+    invert: bool | None = None,
+    row_align: int | None = None,
+    tone: ToneCurve | None = None,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Dither a preprocessed BGR frame and pack it for the panel.
+
+    See dither_frame and resolve_format for how levels, palette, bpp, invert
+    and tone interact.
+
+    Returns (preview, packed, bpp): a displayable uint8 image, the flat packed
+    bytes and the bit width used.
+    """
+    with metrics.stage("dither"):
+        preview, indices = dither_frame(bgr, method, levels, palette, tone)
+    bits, invert = resolve_format(levels, palette, bpp, invert)
+    with metrics.stage("pack"):
+        packed = pack_pixels(
+            indices, bits, msb_first=msb_first, invert=invert, row_align=row_align
+        )
+    return preview, packed, bits
+
+
+def panel_frames(
+    indices: np.ndarray,
+    rows: int,
+    cols: int,
+    panel_w: int,
+    panel_h: int,
+    gap_x: int = 0,
+    gap_y: int = 0,
+    bpp: int = 1,
+    msb_first: bool = True,
+    invert: bool = False,
+    row_align: int | None = None,
+) -> list[np.ndarray]:
+    """
+    Pack a whole-wall index map once and cut it into per-panel frames.
+
+    The canvas is laid out as rows×cols panels separated by gap_x/gap_y pixels
+    of bezel that are dropped. When every panel starts and ends on a byte
+    boundary the canvas is packed in one pass and each frame is a zero-copy
+    (rows, bytes) view into that buffer; otherwise each panel is packed from
+    its own view of `indices`.
+
+    Returns the frames in row-major order.
+    """
+    stride_x, stride_y = panel_w + gap_x, panel_h + gap_y
+    # With byte-aligned panel rows, a continuous stream and 1-byte row
+    # alignment are the same bytes
+    aligned = (
+        row_align in (None, 1)
+        and (panel_w * bpp) % 8 == 0
+        and (stride_x * bpp) % 8 == 0
+    )
+
+    if aligned:
+        packed = pack_pixels(indices, bpp, msb_first, invert, row_align=1)
+        grid = packed.reshape(indices.shape[0], -1)
+        row_bytes = panel_w * bpp // 8
+        return [
+            grid[
+                r * stride_y : r * stride_y + panel_h,
+                c * stride_x * bpp // 8 : c * stride_x * bpp // 8 + row_bytes,
+            ]
+            for r in range(rows)
+            for c in range(cols)
+        ]
+
+    return [
+        pack_pixels(
+            indices[
+                r * stride_y : r * stride_y + panel_h,
+                c * stride_x : c * stride_x + panel_w,
+            ],
+            bpp,
+            msb_first,
+            invert,
+            row_align,
+        )
+        for r in range(rows)
+        for c in range(cols)
+    ]
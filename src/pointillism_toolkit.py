@@ -9,7 +9,8 @@ from .dithering_toolkit import (
     DITHER_KERNELS,
     FLOYD_STEINBERG_KERNEL,
     color_bayer_dithering,
-    error_diffusion,
+    palette_diffusion_indices,
+    palette_to_bgr,
 )
 
 
@@ -38,7 +39,8 @@ def prepare_textures(src_dir: str, only: list[str] | None = None) -> str:
             img = Image.open(f)
             img.load()
             img.save(out, format="PNG")
-        except Exception as e:
+        # PIL reports broken files as OSError, some plugins as SyntaxError
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
             logger.warning(f"跳过损坏纹理 {f.name}: {e}")
 
     count = len(list(dst.glob("*.png")))
@@ -94,31 +96,52 @@ def find_closest_palette_color(pixel: np.ndarray, palette: np.ndarray) -> np.nda
     return palette[closest_index]
 
 
-def color_atkinson_dithering(
+def _lookup_palette_indices(bgr: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Index map of an image whose pixels are all palette colors."""
+    colors = palette_to_bgr(np.arange(len(palette)), palette)
+    indices = np.zeros(bgr.shape[:2], np.uint8)
+    # Reversed so the first of any duplicate colors wins, like argmin
+    for i in range(len(colors) - 1, -1, -1):
+        indices[(bgr == colors[i]).all(axis=2)] = i
+    return indices
+
+
+def color_dither_indices(
     color_img: np.ndarray,
     palette: np.ndarray,
     method: str = "floyd_steinberg",
+    serpentine: bool = False,
 ) -> np.ndarray:
     """
-    第二阶段：数字排线与光学混合
+    第二阶段：数字排线与光学混合，返回 H×W uint8 调色板索引图
     method: "floyd_steinberg" (default, best for photos), "stucki" (smoothest), "atkinson" (graphics)
+    serpentine: 误差扩散时奇数行从右向左扫描（bayer 无效）
     """
     logger.info(f"应用彩色 {method} 抖动 (计算光学混合)...")
     if method == "bayer":
-        return color_bayer_dithering(
+        dithered = color_bayer_dithering(
             color_img,
             lambda p: find_closest_palette_color(p, palette),
         )
+        return _lookup_palette_indices(dithered, palette)
     kernel = DITHER_KERNELS.get(method, FLOYD_STEINBERG_KERNEL)
-    return error_diffusion(
-        color_img,
-        lambda p: find_closest_palette_color(p, palette),
-        kernel,
-    )
+    return palette_diffusion_indices(color_img, palette, kernel, serpentine)
+
+
+def color_atkinson_dithering(
+    color_img: np.ndarray,
+    palette: np.ndarray,
+    method: str = "floyd_steinberg",
+    serpentine: bool = False,
+) -> np.ndarray:
+    """color_dither_indices() 的 BGR 版本（调试输出、按 BGR 工作的调用方）"""
+    indices = color_dither_indices(color_img, palette, method, serpentine)
+    return palette_to_bgr(indices, palette)
 
 
 def export_dots_json(
-    dithered_img: np.ndarray,
+    indices: np.ndarray,
+    palette: np.ndarray,
     base_radius: int = 3,
     jitter: int = 1,
     bg_color: tuple[int, int, int] = (240, 245, 245),  # BGR
@@ -126,29 +149,28 @@ def export_dots_json(
     texture_dir: str | None = None,
 ) -> dict:
     """
-    第三阶段（数据）：将抖动后的像素矩阵转换为点列表，供 Node.js Canvas 渲染。
+    第三阶段（数据）：将抖动后的调色板索引图转换为点列表，供 Node.js Canvas 渲染。
+    每个点只记录调色板索引 c，颜色表以 RGB 写在 "palette" 中；白色点按索引跳过。
     返回 dict 可直接 json.dump 为 dots.json。
     """
-    h, w = dithered_img.shape[:2]
+    h, w = indices.shape[:2]
     logger.info(f"生成点彩数据... (基础半径: {base_radius}px)")
 
     step = max(1, base_radius * 2)  # 点间距 = 直径，点之间刚好相切
+    colors = palette_to_bgr(np.arange(len(palette)), palette)
+    white = np.flatnonzero((colors == 255).all(axis=1))
+    sampled = indices[step // 2 :: step, step // 2 :: step]
+    rows, cols = np.nonzero(~np.isin(sampled, white))
     dots = []
-    for y in range(step // 2, h, step):
-        for x in range(step // 2, w, step):
-            pixel_color = dithered_img[y, x]  # BGR uint8
-            if np.array_equal(pixel_color, [255, 255, 255]):
-                continue
-
-            cx = x + random.randint(-jitter, jitter)
-            cy = y + random.randint(-jitter, jitter)
-            r = base_radius + random.randint(0, base_radius // 4 + 1)
-
-            # BGR → RGB for JSON / Canvas
-            b, g, rv = int(pixel_color[0]), int(pixel_color[1]), int(pixel_color[2])
-            dots.append({"x": cx, "y": cy, "r": r, "rgb": [rv, g, b]})
-
-    # bg BGR → RGB
+    for gy, gx, c in zip(rows.tolist(), cols.tolist(), sampled[rows, cols].tolist()):
+        x = step // 2 + gx * step
+        y = step // 2 + gy * step
+        cx = x + random.randint(-jitter, jitter)
+        cy = y + random.randint(-jitter, jitter)
+        r = base_radius + random.randint(0, base_radius // 4 + 1)
+        dots.append({"x": cx, "y": cy, "r": r, "c": c})
+
+    # bg / palette BGR → RGB for JSON / Canvas
     bg_rgb: list[int] = [int(bg_color[2]), int(bg_color[1]), int(bg_color[0])]
     logger.info(f"共生成 {len(dots)} 个点")
     return {
@@ -158,5 +180,6 @@ def export_dots_json(
         "bg": bg_rgb,
         "alpha": alpha,
         "texture_dir": texture_dir,
+        "palette": colors[:, ::-1].tolist(),
         "dots": dots,
     }
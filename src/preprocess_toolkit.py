@@ -1,9 +1,22 @@
+from collections.abc import Iterator
+from pathlib import Path
+
 import cv2
 import numpy as np
 from loguru import logger
 
+from . import metrics
 from .config import TARGET_HEIGHT, TARGET_WIDTH
 
+# Formats that can hold more than one frame; cv2.imread only returns the first
+MULTI_FRAME_EXTENSIONS = {".gif", ".tif", ".tiff", ".webp"}
+
+# resize_to_target modes. "exact" (the default) is a single Lanczos resize of
+# the full image, as before the pyramid existed; "quality"/"fast" halve with
+# INTER_AREA until within 2× of the target, then finish with Lanczos / bilinear.
+RESAMPLE_MODES = ("exact", "quality", "fast")
+_FINAL_INTERPOLATION = {"quality": cv2.INTER_LANCZOS4, "fast": cv2.INTER_LINEAR}
+
 
 def get_background_color(img: np.ndarray) -> np.ndarray:
     from collections import Counter
@@ -89,13 +102,53 @@ def pad_to_ratio(img: np.ndarray, target_ratio: float) -> np.ndarray:
     )
 
 
+def halve_to_within(img: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Halve img with INTER_AREA while both sides stay >= width × height.
+
+    Each step is an exact 2×2 box average (an odd last row/column is dropped
+    first, keeping OpenCV on its integer-ratio fast path), so the result is
+    anti-aliased and less than 2× larger than the target on some side.
+    """
+    h, w = img.shape[:2]
+    while w // 2 >= width and h // 2 >= height:
+        img = cv2.resize(
+            img[: h - h % 2, : w - w % 2],
+            (w // 2, h // 2),
+            interpolation=cv2.INTER_AREA,
+        )
+        h, w = img.shape[:2]
+    return img
+
+
 def resize_to_target(
-    img: np.ndarray, target_width: int, target_height: int
+    img: np.ndarray,
+    target_width: int,
+    target_height: int,
+    resample: str = "exact",
 ) -> np.ndarray:
-    if img.shape[0] > img.shape[1]:
+    """Rotate to the target's orientation and resize (see RESAMPLE_MODES)."""
+    if resample not in RESAMPLE_MODES:
+        raise ValueError(f"unknown resample mode: {resample}")
+    # Rotate when the image orientation differs from the target's (portrait
+    # photos on a landscape panel, or landscape photos on a portrait wall)
+    rotate = (img.shape[0] > img.shape[1]) != (target_height > target_width)
+    if resample == "exact":
+        if rotate:
+            img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        return cv2.resize(
+            img, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4
+        )
+    # Reduce first and rotate the reduced image: the rotation is a full copy
+    if rotate:
+        img = halve_to_within(img, target_height, target_width)
         img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    else:
+        img = halve_to_within(img, target_width, target_height)
     return cv2.resize(
-        img, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4
+        img,
+        (target_width, target_height),
+        interpolation=_FINAL_INTERPOLATION[resample],
     )
 
 
@@ -103,30 +156,99 @@ def preprocess_image(
     input_image_path: str,
     target_width: int = TARGET_WIDTH,
     target_height: int = TARGET_HEIGHT,
+    resample: str = "exact",
 ) -> np.ndarray | None:
-    img = cv2.imread(input_image_path)
+    with metrics.stage("decode"):
+        img = cv2.imread(input_image_path)
     if img is None:
         logger.error(f"错误: 无法读取图片 {input_image_path}")
         return None
-
+    return preprocess_array(img, target_width, target_height, resample)
+
+
+def frame_count(input_image_path: str | Path) -> int:
+    """Number of frames/pages in an image file (1 for single-frame formats)."""
+    if Path(input_image_path).suffix.lower() not in MULTI_FRAME_EXTENSIONS:
+        return 1
+    from PIL import Image
+
+    try:
+        with Image.open(input_image_path) as img:
+            return getattr(img, "n_frames", 1)
+    except (OSError, ValueError):
+        return 1
+
+
+def select_frames(
+    count: int, step: int = 1, max_frames: int | None = None
+) -> list[int]:
+    """Every step-th frame index, then evenly decimated to at most max_frames."""
+    indices = list(range(0, count, max(1, step)))
+    if max_frames and len(indices) > max_frames:
+        indices = [indices[i * len(indices) // max_frames] for i in range(max_frames)]
+    return indices
+
+
+def _frame_to_bgr(frame) -> np.ndarray:
+    if frame.mode in ("I;16", "I;16B", "I;16L", "I"):
+        # 16-bit pages: keep the high byte, as cv2.imread does
+        gray = (np.asarray(frame, dtype=np.uint32) >> 8).clip(0, 255)
+        return cv2.cvtColor(gray.astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(np.asarray(frame.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+def iter_frames(
+    input_image_path: str | Path, indices: list[int]
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Lazily decode the given frames of a GIF/TIFF/WebP as (index, BGR image).
+
+    Frames are decoded one at a time by seeking, so memory stays at one
+    frame however long the animation or scan is. GIF frames come out fully
+    composited (disposal and partial-frame updates applied by Pillow).
+    """
+    from PIL import Image
+
+    with Image.open(input_image_path) as img:
+        for index in indices:
+            with metrics.stage("decode"):
+                try:
+                    img.seek(index)
+                except EOFError:
+                    logger.warning(f"{input_image_path} 只有 {index} 帧")
+                    return
+                bgr = _frame_to_bgr(img)
+            yield index, bgr
+
+
+def preprocess_array(
+    img: np.ndarray,
+    target_width: int = TARGET_WIDTH,
+    target_height: int = TARGET_HEIGHT,
+    resample: str = "exact",
+) -> np.ndarray:
+    """Same as preprocess_image, for an already decoded BGR image."""
     logger.info(f"原始尺寸: {img.shape[1]}x{img.shape[0]}")
 
-    bg_color = get_background_color(img)
-    left, right, top, bottom = detect_object_bounds(img, bg_color)
+    with metrics.stage("bounds"):
+        bg_color = get_background_color(img)
+        left, right, top, bottom = detect_object_bounds(img, bg_color)
     cropped = img[top:bottom, left:right]
     logger.info(f"裁切后尺寸: {cropped.shape[1]}x{cropped.shape[0]}")
 
     h, w = cropped.shape[:2]
-    target_ratio = (
-        target_width / target_height if w >= h else target_height / target_width
-    )
-
-    if is_solid_background(cropped):
-        logger.info("背景为纯色，进行Padding到指定比例...")
-        padded = pad_to_ratio(cropped, target_ratio)
-    else:
-        logger.info("背景不为纯色，尽量裁剪到目标比例...")
-        padded = crop_to_target_ratio(cropped, target_ratio)
+    long_side = max(target_width, target_height)
+    short_side = min(target_width, target_height)
+    target_ratio = long_side / short_side if w >= h else short_side / long_side
+
+    with metrics.stage("crop_pad"):
+        if is_solid_background(cropped):
+            logger.info("背景为纯色，进行Padding到指定比例...")
+            padded = pad_to_ratio(cropped, target_ratio)
+        else:
+            logger.info("背景不为纯色，尽量裁剪到目标比例...")
+            padded = crop_to_target_ratio(cropped, target_ratio)
 
     logger.info(f"处理后尺寸: {padded.shape[1]}x{padded.shape[0]}")
-    return resize_to_target(padded, target_width, target_height)
+    with metrics.stage("resize"):
+        return resize_to_target(padded, target_width, target_height, resample)
@@ -0,0 +1,358 @@
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import CodeType
+
+import click
+from loguru import logger
+
+from . import metrics
+
+_SRC_DIR = Path(__file__).resolve().parent
+
+# cProfile keys functions as (filename, lineno, name); builtins use "~"
+FuncKey = tuple[str, int, str]
+
+
+def _short_path(filename: str) -> str:
+    path = Path(filename)
+    try:
+        return f"src/{path.resolve().relative_to(_SRC_DIR)}"
+    except (OSError, ValueError):
+        return path.name
+
+
+def _in_src(filename: str) -> bool:
+    try:
+        return Path(filename).resolve().is_relative_to(_SRC_DIR)
+    except OSError:
+        return False
+
+
+def _label(func: FuncKey) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{name} ({_short_path(filename)}:{lineno})"
+
+
+def _code_key(code: CodeType) -> FuncKey:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class _Sampler(threading.Thread):
+    """Sample the target thread's Python stack every `interval` seconds."""
+
+    def __init__(self, interval: float, thread_id: int) -> None:
+        super().__init__(daemon=True, name="geink-profile-sampler")
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter[tuple[FuncKey, ...]] = Counter()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_code_key(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+def _trim_to(stacks: Counter, marker: FuncKey | None) -> Counter:
+    """Start every stack at `marker`, dropping the click/profiler frames above it."""
+    if marker is None:
+        return stacks
+    trimmed: Counter[tuple[FuncKey, ...]] = Counter()
+    for stack, count in stacks.items():
+        if marker in stack:
+            stack = stack[stack.index(marker) :]
+        trimmed[stack] += count
+    return trimmed
+
+
+def _folded_from_pstats(stats: dict, min_us: float = 1.0) -> Counter:
+    """
+    Expand cProfile's caller→callee edges into collapsed stacks (µs).
+
+    cProfile only keeps one level of callers, so time of a function reached
+    along several paths is split in proportion to each edge's cumulative
+    time; recursion is cut at the first repeat.
+    """
+    callees: dict[FuncKey, list[tuple[FuncKey, float]]] = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    roots = [f for f, (_, _, _, _, callers) in stats.items() if not callers]
+
+    folded: Counter[tuple[FuncKey, ...]] = Counter()
+
+    def walk(func: FuncKey, stack: tuple[FuncKey, ...], scale: float) -> None:
+        _, _, tottime, _cumtime, _ = stats[func]
+        self_us = tottime * scale * 1e6
+        if self_us >= min_us:
+            folded[stack] += self_us
+        for callee, edge_cum in callees.get(func, ()):
+            callee_cum = stats[callee][3]
+            if callee in stack or callee_cum <= 0:
+                continue
+            share = scale * edge_cum / callee_cum
+            if share * callee_cum * 1e6 >= min_us:
+                walk(callee, stack + (callee,), share)
+
+    for root in roots:
+        walk(root, (root,), 1.0)
+    return folded
+
+
+def _write_folded(path: Path, folded: Counter) -> None:
+    lines = [
+        f"{';'.join(_label(f) for f in stack)} {round(value)}"
+        for stack, value in folded.most_common()
+        if round(value) > 0
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def _table(header: str, rows: list[tuple[str, ...]]) -> str:
+    return "\n".join([header, *("".join(row) for row in rows)])
+
+
+def _pstats_table(stats: dict, top: int, src_only: bool) -> str:
+    ranked = sorted(stats.items(), key=lambda item: -item[1][2])
+    if src_only:
+        ranked = [item for item in ranked if _in_src(item[0][0])]
+    rows = []
+    for func, (_, ncalls, tottime, cumtime, _) in ranked[:top]:
+        rows.append(
+            (
+                f"{ncalls:>10}",
+                f"{tottime:>10.3f}",
+                f"{tottime / ncalls * 1e6 if ncalls else 0:>12.1f}",
+                f"{cumtime:>10.3f}",
+                f"  {_label(func)}",
+            )
+        )
+    header = f"{'ncalls':>10}{'tottime':>10}{'percall us':>12}{'cumtime':>10}  function"
+    return _table(header, rows)
+
+
+def _sample_table(stacks: Counter, interval: float, top: int, src_only: bool) -> str:
+    own: Counter[FuncKey] = Counter()
+    inclusive: Counter[FuncKey] = Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for func in set(stack):
+            inclusive[func] += count
+    total = sum(stacks.values()) or 1
+    if src_only:
+        # Code in src/ mostly hands off to NumPy/OpenCV, so rank it by the
+        # time spent under it rather than in its own frames
+        funcs = sorted((f for f in inclusive if _in_src(f[0])), key=inclusive.get)
+        funcs.reverse()
+    else:
+        funcs = [f for f, _ in own.most_common()]
+    rows = [
+        (
+            f"{own[f]:>8}",
+            f"{100 * own[f] / total:>7.1f}%",
+            f"{inclusive[f]:>10}",
+            f"{100 * inclusive[f] / total:>7.1f}%",
+            f"  {_label(f)}",
+        )
+        for f in funcs[:top]
+    ]
+    header = (
+        f"{'self':>8}{'self%':>8}{'total':>10}{'total%':>8}  function"
+        f"  ({total} samples, {interval * 1000:g} ms)"
+    )
+    return _table(header, rows)
+
+
+class _AllocTracker:
+    """metrics stage hook: tracemalloc snapshot diff between stage entry and exit."""
+
+    def __init__(self) -> None:
+        self._open: list = []
+        self.by_stage: dict[str, Counter[str]] = defaultdict(Counter)
+        self.calls: Counter[str] = Counter()
+
+    def _snapshot(self):
+        import tracemalloc
+
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+
+    def __call__(self, stage: str, entering: bool) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if entering:
+            self._open.append(self._snapshot())
+            return
+        before = self._open.pop()
+        self.calls[stage] += 1
+        for stat in self._snapshot().compare_to(before, "lineno"):
+            frame = stat.traceback[0]
+            site = f"{_short_path(frame.filename)}:{frame.lineno}"
+            self.by_stage[stage][site] += stat.size_diff
+
+    def report(self, top: int) -> str:
+        lines = []
+        for stage, sites in sorted(
+            self.by_stage.items(), key=lambda item: -sum(item[1].values())
+        ):
+            net = sum(sites.values())
+            lines.append(
+                f"{stage} ({self.calls[stage]}x, net {net / 1024 / 1024:+.2f} MB)"
+            )
+            for site, size in sites.most_common(top):
+                if size <= 0:
+                    break
+                lines.append(f"    {size / 1024:>+12.1f} KB  {site}")
+        return "\n".join(lines)
+
+
+@click.command(
+    "profile",
+    context_settings={"ignore_unknown_options": True, "allow_interspersed_args": False},
+)
+@click.argument("command_args", nargs=-1, type=click.UNPROCESSED, required=True)
+@click.option(
+    "--mode",
+    type=click.Choice(["cprofile", "sample"]),
+    default="cprofile",
+    help="cprofile: deterministic call counts; sample: low-overhead stack sampling",
+)
+@click.option(
+    "--interval",
+    type=float,
+    default=5.0,
+    help="Sampling interval in ms (--mode sample)",
+)
+@click.option(
+    "--output",
+    "-o",
+    "prefix",
+    default=None,
+    help="Write <prefix>.folded and <prefix>.prof (default: profile_<command>)",
+)
+@click.option("--top", type=int, default=25, help="Rows in the hot-function table")
+@click.option(
+    "--src-only",
+    is_flag=True,
+    default=False,
+    help="Only list functions defined in src/ in the table",
+)
+@click.option(
+    "--tracemalloc",
+    "trace_alloc",
+    is_flag=True,
+    default=False,
+    help="Diff tracemalloc snapshots across every pipeline stage (slow)",
+)
+@click.pass_context
+def profile_cmd(
+    ctx: click.Context,
+    command_args: tuple[str, ...],
+    mode: str,
+    interval: float,
+    prefix: str | None,
+    top: int,
+    src_only: bool,
+    trace_alloc: bool,
+) -> None:
+    """
+    Run another geink command under a profiler.
+
+    Writes collapsed stacks (<prefix>.folded, one "a;b;c value" line per
+    stack, for flamegraph.pl / speedscope / inferno) and logs a hot-function
+    table. cprofile mode also saves <prefix>.prof for pstats/snakeviz; its
+    folded values are µs reconstructed from caller→callee edges, sample
+    mode's are exact stacks counted in samples. Only this process is
+    profiled, not pool workers (use -j 1 where a command has it).
+
+    Profiler options go before the command name.
+
+    Examples:
+        geink profile process photos/ -c 4
+        geink profile --mode sample --src-only ascii-art photo.jpg -r 60
+        geink profile --tracemalloc -o wall wall poster.jpg --rows 2 --cols 2
+    """
+    root = ctx.find_root()
+    group = root.command
+    assert isinstance(group, click.Group)
+    name, cmd, rest = group.resolve_command(root, list(command_args))
+    if cmd is None or name == "profile":
+        raise click.BadParameter(f"cannot profile {name!r}", param_hint="COMMAND")
+
+    out = prefix or f"profile_{name}"
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    folded_path, prof_path = Path(f"{out}.folded"), Path(f"{out}.prof")
+    sub = cmd.make_context(name, rest, parent=root)
+
+    tracker = None
+    if trace_alloc:
+        import tracemalloc
+
+        tracker = _AllocTracker()
+        tracemalloc.start()
+        metrics.add_hook(tracker)
+
+    start = time.perf_counter()
+    try:
+        if mode == "cprofile":
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            with sub:
+                profiler.runcall(cmd.invoke, sub)
+            profiler.create_stats()
+            stats = pstats.Stats(profiler).stats
+        else:
+            sampler = _Sampler(interval / 1000, threading.get_ident())
+            sampler.start()
+            try:
+                with sub:
+                    cmd.invoke(sub)
+            finally:
+                sampler.stop()
+    finally:
+        elapsed = time.perf_counter() - start
+        if tracker is not None:
+            import tracemalloc
+
+            metrics.remove_hook(tracker)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    callback = _code_key(cmd.callback.__code__) if cmd.callback else None
+    if mode == "cprofile":
+        profiler.dump_stats(prof_path)
+        folded = _trim_to(_folded_from_pstats(stats), callback)
+        table = _pstats_table(stats, top, src_only)
+    else:
+        folded = _trim_to(sampler.stacks, callback)
+        table = _sample_table(folded, interval / 1000, top, src_only)
+
+    _write_folded(folded_path, folded)
+    logger.info(f"{name} ({mode}) {elapsed:.2f} s\n{table}")
+    if tracker is not None:
+        logger.info(
+            f"tracemalloc per stage (peak traced {peak / 1024 / 1024:.1f} MB):\n"
+            + tracker.report(5)
+        )
+    saved = [folded_path, prof_path] if mode == "cprofile" else [folded_path]
+    logger.success(f"Profile: {', '.join(map(str, saved))}")
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from .config import SAM_CACHE_DIR, SAM_CACHE_MAX_MB
+
+# Checkpoints are multi-GB, so their content hash is memoized in the cache dir
+# keyed by (path, size, mtime) instead of being recomputed on every run.
+_CHECKPOINT_INDEX = "checkpoints.json"
+_SUFFIX = ".pt"
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def restore_embedding(predictor, features, original_size, input_size) -> None:
+    """Put a precomputed image embedding into predictor, as set_image() would."""
+    predictor.reset_image()
+    predictor.features = features
+    predictor.original_size = tuple(original_size)
+    predictor.input_size = tuple(input_size)
+    predictor.is_image_set = True
+
+
+class SamEmbeddingCache:
+    """
+    On-disk cache of SamPredictor image embeddings.
+
+    Entries are keyed by image content, SAM model type and checkpoint content,
+    and hold the encoder features plus the size metadata set_image() records,
+    so a hit restores the predictor without running the ViT encoder. Total
+    size is bounded with least-recently-used eviction (file mtime is bumped
+    on every hit).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = SAM_CACHE_DIR,
+        max_bytes: int = SAM_CACHE_MAX_MB * 1024 * 1024,
+    ) -> None:
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_bytes = max_bytes
+
+    def _checkpoint_hash(self, checkpoint: str) -> str:
+        path = Path(checkpoint).resolve()
+        stat = path.stat()
+        stamp = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        index_path = self.cache_dir / _CHECKPOINT_INDEX
+        try:
+            index = json.loads(index_path.read_text())
+        except (OSError, ValueError):
+            index = {}
+        if stamp not in index:
+            logger.info(f"计算 SAM 权重哈希: {path.name}（仅首次）...")
+            index[stamp] = _file_sha256(path)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            index_path.write_text(json.dumps(index, indent=2))
+        return index[stamp]
+
+    def key(self, img_rgb: np.ndarray, checkpoint: str, model_type: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(str(img_rgb.shape).encode())
+        digest.update(np.ascontiguousarray(img_rgb).data)
+        digest.update(model_type.encode())
+        digest.update(self._checkpoint_hash(checkpoint).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{_SUFFIX}"
+
+    def load(self, key: str, predictor) -> bool:
+        """Restore a cached embedding into predictor; return False on a miss."""
+        import torch
+
+        path = self._path(key)
+        if not path.exists():
+            return False
+        try:
+            entry = torch.load(path, map_location=predictor.device)
+            fields = entry["features"], entry["original_size"], entry["input_size"]
+        except (
+            OSError,
+            EOFError,
+            RuntimeError,  # not a torch zip archive (truncated write, bad copy)
+            pickle.UnpicklingError,
+            KeyError,
+            TypeError,
+        ) as e:
+            logger.warning(f"SAM 缓存条目损坏，已删除 {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return False
+
+        restore_embedding(predictor, *fields)
+        os.utime(path)
+        logger.info(f"命中 SAM 嵌入缓存: {path.name}")
+        return True
+
+    def store(self, key: str, predictor) -> None:
+        import torch
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Unique temp name in the cache dir: concurrent runs storing the same
+        # key never share a half-written file, and os.replace stays atomic
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{key}.", suffix=".tmp", delete=False
+        ) as tmp:
+            try:
+                torch.save(
+                    {
+                        "features": predictor.features.detach().cpu(),
+                        "original_size": list(predictor.original_size),
+                        "input_size": list(predictor.input_size),
+                    },
+                    tmp,
+                )
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least-recently-used entries until the cache fits max_bytes."""
+        entries = [
+            (p.stat().st_mtime, p.stat().st_size, p)
+            for p in self.cache_dir.glob(f"*{_SUFFIX}")
+        ]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.info(f"淘汰 SAM 嵌入缓存: {path.name}")
@@ -0,0 +1,582 @@
+import contextlib
+import faulthandler
+import importlib
+import io
+import json
+import signal
+import socket
+import sys
+import threading
+import time
+import zipfile
+from collections.abc import Callable
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import active_children, get_context
+from urllib.parse import parse_qs, urlparse
+
+import click
+from loguru import logger
+
+from .config import TARGET_HEIGHT, TARGET_WIDTH, TONE
+
+# (body, content type, extra headers)
+JobResult = tuple[bytes, str, dict[str, str]]
+
+# A job stuck this long past its timeout inside native code (where the alarm
+# can't interrupt it) makes its worker exit; the server then restarts the pool
+_HARD_TIMEOUT_GRACE_S = 10.0
+
+# Idle keep-alive connections are closed after this many seconds
+_KEEPALIVE_TIMEOUT_S = 15.0
+
+# Integer query parameters checked in the request thread, before a job is
+# queued: name -> inclusive (min, max)
+_INT_RANGES: dict[str, dict[str, tuple[int, int]]] = {
+    "/process": {"width": (1, 8192), "height": (1, 8192)},
+    "/ascii-art": {"rows": (1, 2000)},
+    "/gridcut": {"rows": (1, 256), "cols": (1, 256)},
+}
+
+# Set per worker by _warm_worker from the serve options; never from a request,
+# since SAM checkpoints are unpickled by torch.load
+_sam_checkpoint: str | None = None
+_sam_model_type = "vit_h"
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+def _param(
+    params: dict[str, str], name: str, cast: Callable[[str], object], default: object
+) -> object:
+    if name not in params:
+        return default
+    try:
+        return cast(params[name])
+    except (TypeError, ValueError) as e:
+        raise _BadRequest(f"invalid {name}: {params[name]!r}") from e
+
+
+def _check_params(path: str, params: dict[str, str]) -> None:
+    """Reject out-of-range sizes and server-only options before queueing a job."""
+    for name in ("sam_checkpoint", "sam_model_type"):
+        if name in params:
+            option = name.replace("_", "-")
+            raise _BadRequest(f"{name} is set with `geink serve --{option}`")
+    for name, (lo, hi) in _INT_RANGES.get(path, {}).items():
+        value = _param(params, name, int, None)
+        if value is not None and not lo <= value <= hi:
+            raise _BadRequest(f"{name} must be in {lo}..{hi}: {value}")
+
+
+def _decode(data: bytes, flags: int | None = None):
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(
+        np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR if flags is None else flags
+    )
+    if img is None:
+        raise _BadRequest("request body is not a decodable image")
+    return img
+
+
+def _job_process(data: bytes, params: dict[str, str]) -> JobResult:
+    import cv2
+
+    from .dithering_toolkit import DITHER_KERNELS
+    from .packing_toolkit import PALETTES, encode_frame
+    from .preprocess_toolkit import RESAMPLE_MODES, preprocess_array
+    from .tone import parse_tone
+
+    palette = params.get("palette")
+    if palette is not None and palette not in PALETTES:
+        raise _BadRequest(f"unknown palette: {palette}")
+    method = params.get("method", "atkinson")
+    methods = [*DITHER_KERNELS, "binary_threshold", "bayer"]
+    if method not in methods:
+        raise _BadRequest(f"unknown method: {method}, choose from {', '.join(methods)}")
+    levels = _param(params, "levels", int, 2)
+    if not 2 <= levels <= 256 or levels & (levels - 1):
+        raise _BadRequest(f"levels must be a power of 2 in 2..256: {levels}")
+    bpp = _param(params, "bpp", int, None)
+    if bpp is not None and not 1 <= bpp <= 8:
+        raise _BadRequest(f"bpp must be in 1..8: {bpp}")
+    resample = params.get("resample", "exact")
+    if resample not in RESAMPLE_MODES:
+        raise _BadRequest(f"unknown resample mode: {resample}")
+    try:
+        tone = parse_tone(params.get("tone", TONE))
+    except ValueError as e:
+        raise _BadRequest(str(e)) from None
+    width = _param(params, "width", int, TARGET_WIDTH)
+    height = _param(params, "height", int, TARGET_HEIGHT)
+    bgr = preprocess_array(_decode(data), width, height, resample)
+    preview, packed, bpp = encode_frame(
+        bgr,
+        method,
+        levels=levels,
+        palette=palette,
+        bpp=bpp,
+        msb_first=params.get("bit_order", "msb") == "msb",
+        invert=_param(params, "invert", lambda v: v in ("1", "true"), None),
+        row_align=_param(params, "row_align", int, 0) or None,
+        tone=tone,
+    )
+    headers = {"X-Geink-Width": str(width), "X-Geink-Height": str(height)}
+    headers["X-Geink-Bpp"] = str(bpp)
+    if params.get("preview") in ("1", "true"):
+        return cv2.imencode(".png", preview)[1].tobytes(), "image/png", headers
+    return packed.tobytes(), "application/octet-stream", headers
+
+
+def _job_pointillize(data: bytes, params: dict[str, str]) -> JobResult:
+    from .pointillism_toolkit import (
+        DEFAULT_PALETTE,
+        color_dither_indices,
+        create_color_blocks,
+        export_dots_json,
+    )
+
+    img = _decode(data)
+    h, w = img.shape[:2]
+    dot_ratio = _param(params, "dot_ratio", float, 0.01)
+    dot_radius = max(1, round(dot_ratio * min(h, w)))
+    jitter = _param(params, "jitter", float, 0.3)
+    blocked = create_color_blocks(
+        img,
+        spatial_rad=_param(params, "spatial_rad", int, None),
+        color_rad=_param(params, "color_rad", int, None),
+    )
+    indices = color_dither_indices(
+        blocked, DEFAULT_PALETTE, method=params.get("dither", "floyd_steinberg")
+    )
+    dots = export_dots_json(
+        indices,
+        DEFAULT_PALETTE,
+        base_radius=dot_radius,
+        jitter=max(1, round(jitter * dot_radius)),
+        alpha=_param(params, "alpha", float, 0.5),
+    )
+    return json.dumps(dots).encode(), "application/json", {}
+
+
+def _job_ascii_art(data: bytes, params: dict[str, str]) -> JobResult:
+    from .ascii_art_toolkit import generate_ascii_art
+
+    rows = generate_ascii_art(
+        _decode(data),
+        num_rows=_param(params, "rows", int, None),
+        sam_checkpoint=_sam_checkpoint,
+        sam_model_type=_sam_model_type,
+        sam_cache=params.get("sam_cache", "1") not in ("0", "false"),
+    )
+    return "\n".join(rows).encode("utf-8"), "text/plain; charset=utf-8", {}
+
+
+def _job_gridcut(data: bytes, params: dict[str, str]) -> JobResult:
+    import cv2
+
+    from .grid_cutter import grid_cut
+
+    rows = _param(params, "rows", int, None)
+    cols = _param(params, "cols", int, None)
+    if rows is None or cols is None:
+        raise _BadRequest("rows and cols are required")
+    tiles = grid_cut(_decode(data, cv2.IMREAD_UNCHANGED), rows, cols)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for idx, tile in enumerate(tiles):
+            name = f"r{idx // cols}_c{idx % cols}.png"
+            zf.writestr(name, cv2.imencode(".png", tile)[1].tobytes())
+    return buf.getvalue(), "application/zip", {}
+
+
+JOBS: dict[str, Callable[[bytes, dict[str, str]], JobResult]] = {
+    "/process": _job_process,
+    "/pointillize": _job_pointillize,
+    "/ascii-art": _job_ascii_art,
+    "/gridcut": _job_gridcut,
+}
+
+
+def _warm_worker(sam_checkpoint: str | None, sam_model_type: str) -> None:
+    """Import the imaging stack once per worker so the first request isn't cold."""
+    global _sam_checkpoint, _sam_model_type
+    _sam_checkpoint, _sam_model_type = sam_checkpoint, sam_model_type
+    # Ctrl-C reaches the whole process group; the parent drains in-flight
+    # requests and then shuts the pool down, so workers must not die first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for module in (
+        "ascii_art_toolkit",
+        "grid_cutter",
+        "packing_toolkit",
+        "pointillism_toolkit",
+        "preprocess_toolkit",
+    ):
+        importlib.import_module(f".{module}", package=__package__)
+
+
+def _job_timeout(_signum: int, _frame: object) -> None:
+    raise TimeoutError("job timed out")
+
+
+def _run_job(
+    path: str, data: bytes, params: dict[str, str], timeout: float
+) -> tuple[JobResult, float]:
+    """
+    Worker entry point: returns the job result and its wall time in ms.
+
+    A job still running after `timeout` seconds is interrupted with
+    TimeoutError at its next Python bytecode. One stuck in a native call for
+    another _HARD_TIMEOUT_GRACE_S seconds gets its stack dumped to stderr and
+    the worker exits, so no job can hold a worker forever.
+    """
+    signal.signal(signal.SIGALRM, _job_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    faulthandler.dump_traceback_later(timeout + _HARD_TIMEOUT_GRACE_S, exit=True)
+    start = time.perf_counter()
+    try:
+        result = JOBS[path](data, params)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        faulthandler.cancel_dump_traceback_later()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def make_pool(
+    workers: int, sam_checkpoint: str | None = None, sam_model_type: str = "vit_h"
+) -> ProcessPoolExecutor:
+    """
+    Worker pool for GeinkServer, with every worker started right away.
+
+    Create it before any server thread starts. Workers are spawned, not
+    forked, so they never inherit the parent's threads, locks or signal
+    handlers.
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_warm_worker,
+        initargs=(sam_checkpoint, sam_model_type),
+    )
+    # Each submit with no idle worker starts a new one
+    for _ in range(workers):
+        pool.submit(int)
+    return pool
+
+
+class GeinkServer(ThreadingHTTPServer):
+    """
+    HTTP front end over a process pool. Requests beyond `workers + queue_size`
+    in flight are rejected with 429 instead of piling up; jobs running longer
+    than `job_timeout` seconds get a 504.
+    """
+
+    # close() waits for in-flight requests itself, with a deadline; a thread
+    # still running after that must not keep the process alive
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        workers: int,
+        queue_size: int,
+        job_timeout: float,
+        max_body: int,
+        sam_checkpoint: str | None = None,
+        sam_model_type: str = "vit_h",
+    ) -> None:
+        # The pool (and its spawned workers) exists before any handler thread does
+        self._pool_args = (workers, sam_checkpoint, sam_model_type)
+        self.pool = make_pool(*self._pool_args)
+        super().__init__(address, _Handler)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.job_timeout = job_timeout
+        self.max_body = max_body
+        self.force_close = threading.Event()
+        self._closing = False
+        self._pool_lock = threading.Lock()
+        self._connections: set[socket.socket] = set()
+        self._futures: set[Future] = set()
+        self._conn_lock = threading.Condition()
+
+    def process_request(self, request: socket.socket, client_address: object) -> None:
+        with self._conn_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request: socket.socket) -> None:
+        super().shutdown_request(request)
+        with self._conn_lock:
+            self._connections.discard(request)
+            self._conn_lock.notify_all()
+
+    def handle_error(self, request: socket.socket, client_address: object) -> None:
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logger.debug(f"{client_address[0]} 断开连接")
+            return
+        logger.opt(exception=True).error(f"{client_address[0]} 请求处理出错")
+
+    def submit(self, path: str, data: bytes, params: dict[str, str]) -> Future:
+        future = self.pool.submit(_run_job, path, data, params, self.job_timeout)
+        self._futures.add(future)
+        # The slot stays taken until the job really finishes, even if the
+        # request has already given up on it
+        future.add_done_callback(self.job_done)
+        return future
+
+    def job_done(self, future: Future) -> None:
+        """Free the job's slot; replace the pool if the job's worker died."""
+        self._futures.discard(future)
+        self.slots.release()
+        if self._closing or future.cancelled():
+            return
+        if isinstance(future.exception(), BrokenProcessPool):
+            # Runs on the broken pool's own management thread
+            threading.Thread(target=self._restart_pool).start()
+
+    def _restart_pool(self) -> None:
+        with self._pool_lock:
+            try:
+                # A healthy pool accepts the probe; only a broken one is replaced
+                self.pool.submit(int)
+                return
+            except BrokenProcessPool:
+                broken, self.pool = self.pool, make_pool(*self._pool_args)
+        logger.warning("worker 进程异常退出，已重启进程池")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """
+        Stop serving and wait for in-flight requests, then shut the pool down.
+
+        Queued jobs are cancelled and idle keep-alive connections closed right
+        away. Running jobs get `job_timeout` plus the hard-timeout grace to
+        finish; after that, or once `force_close` is set, the workers are
+        terminated instead.
+        """
+        self._closing = True
+        self.server_close()
+        for future in list(self._futures):
+            future.cancel()
+        deadline = time.monotonic() + self.job_timeout + _HARD_TIMEOUT_GRACE_S
+        with self._conn_lock:
+            # Handlers blocked reading the next request see EOF and return;
+            # responses still being computed can be written out
+            for conn in self._connections:
+                with contextlib.suppress(OSError):
+                    conn.shutdown(socket.SHUT_RD)
+            while self._connections and not self.force_close.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._conn_lock.wait(min(remaining, 0.5))
+            stranded = len(self._connections)
+        if stranded:
+            logger.warning(f"{stranded} 个请求未完成，终止 worker 进程")
+            for process in active_children():
+                process.terminate()
+        self.pool.shutdown(wait=not stranded, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: GeinkServer
+    protocol_version = "HTTP/1.1"
+    timeout = _KEEPALIVE_TIMEOUT_S
+
+    def log_message(self, fmt: str, *args: object) -> None:
+        logger.debug(f"{self.address_string()} {fmt % args}")
+
+    def _send(
+        self, status: int, body: bytes, content_type: str, headers: dict[str, str]
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: dict | None = None) -> None:
+        body = json.dumps({"error": message}).encode()
+        self._send(status, body, "application/json", headers or {})
+
+    def do_GET(self) -> None:
+        if urlparse(self.path).path == "/health":
+            self._send(200, b'{"status": "ok"}', "application/json", {})
+        else:
+            self._error(404, "not found")
+
+    def do_POST(self) -> None:
+        received = time.perf_counter()
+        url = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= self.server.max_body:
+            # The body is left unread, so the connection can't be reused
+            close = {"Connection": "close"}
+            if length < 0:
+                self._error(400, "invalid Content-Length", close)
+            else:
+                limit = self.server.max_body
+                self._error(413, f"request body over {limit} bytes: {length}", close)
+            return
+        data = self.rfile.read(length)
+        if url.path not in JOBS:
+            self._error(404, f"unknown endpoint {url.path}, try {sorted(JOBS)}")
+            return
+        if not data:
+            self._error(400, "empty request body")
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            _check_params(url.path, params)
+        except _BadRequest as e:
+            self._error(400, str(e))
+            return
+
+        if not self.server.slots.acquire(blocking=False):
+            self._error(429, "server saturated", {"Retry-After": "1"})
+            return
+        timeout = self.server.job_timeout
+        try:
+            future = self.server.submit(url.path, data, params)
+        except RuntimeError as e:
+            self.server.slots.release()
+            self._error(503, f"worker pool unavailable: {e}", {"Retry-After": "1"})
+            return
+        try:
+            # Allow for queueing behind other jobs on top of the job's own limit
+            (body, content_type, headers), work_ms = future.result(timeout * 2)
+        except _BadRequest as e:
+            self._error(400, str(e))
+            return
+        except (TimeoutError, FutureTimeout):
+            future.cancel()
+            self._error(504, f"{url.path} did not finish within {timeout:g}s")
+            return
+        except BrokenProcessPool:
+            self._error(503, "worker process died, retry", {"Retry-After": "1"})
+            return
+        except CancelledError:
+            headers = {"Retry-After": "1", "Connection": "close"}
+            self._error(503, "server shutting down", headers)
+            return
+        except Exception as e:
+            logger.exception(f"{url.path} failed")
+            self._error(500, f"{type(e).__name__}: {e}")
+            return
+
+        total_ms = (time.perf_counter() - received) * 1000
+        headers["X-Geink-Process-Ms"] = f"{work_ms:.1f}"
+        headers["X-Geink-Total-Ms"] = f"{total_ms:.1f}"
+        headers["Server-Timing"] = (
+            f"process;dur={work_ms:.1f}, queue;dur={max(0.0, total_ms - work_ms):.1f}"
+        )
+        self._send(200, body, content_type, headers)
+
+
+@click.command("serve")
+@click.option("--host", default="127.0.0.1", help="Address to bind")
+@click.option("--port", "-p", type=int, default=8765, help="Port to listen on")
+@click.option("--workers", "-w", type=int, default=2, help="Worker processes")
+@click.option(
+    "--queue-size",
+    type=int,
+    default=8,
+    help="Requests allowed to wait for a worker before returning 429",
+)
+@click.option(
+    "--timeout",
+    type=float,
+    default=120.0,
+    help="Seconds a job may run before it is interrupted and the request gets 504",
+)
+@click.option(
+    "--max-body-mb",
+    type=float,
+    default=64.0,
+    help="Largest request body accepted, in MiB; bigger uploads get 413",
+)
+@click.option(
+    "--sam-checkpoint",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="SAM .pth weights for /ascii-art (the only way to enable SAM edges)",
+)
+@click.option(
+    "--sam-model-type",
+    type=click.Choice(["vit_h", "vit_l", "vit_b"]),
+    default="vit_h",
+    help="SAM ViT variant (only used when --sam-checkpoint is given)",
+)
+def serve_cmd(
+    host: str,
+    port: int,
+    workers: int,
+    queue_size: int,
+    timeout: float,
+    max_body_mb: float,
+    sam_checkpoint: str | None,
+    sam_model_type: str,
+) -> None:
+    """
+    Run a persistent HTTP service with warm worker processes.
+
+    POST image bytes to /process, /pointillize, /ascii-art or /gridcut;
+    options go in the query string with the same names as the CLI flags
+    (underscored). SAM weights can only be chosen here, never per request.
+    Workers keep imports, SAM weights and other caches warm between requests.
+
+    On SIGTERM/SIGINT the server stops accepting, closes idle connections and
+    waits for running jobs; a second signal stops waiting and kills the workers.
+
+    Examples:
+        geink serve --workers 4
+        curl --data-binary @photo.jpg "localhost:8765/process?levels=4" -o photo.bin
+    """
+    server = GeinkServer(
+        (host, port),
+        workers,
+        queue_size,
+        timeout,
+        max_body=int(max_body_mb * 1024 * 1024),
+        sam_checkpoint=sam_checkpoint,
+        sam_model_type=sam_model_type,
+    )
+    stopping = threading.Event()
+
+    def _stop(signum: int, _frame: object) -> None:
+        if stopping.is_set():
+            logger.warning(f"再次收到信号 {signum}，不再等待进行中的请求")
+            server.force_close.set()
+            return
+        stopping.set()
+        logger.info(
+            f"收到信号 {signum}，等待进行中的请求完成（再次发送信号强制退出）..."
+        )
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    logger.success(
+        f"geink serve on http://{host}:{port} ({workers} workers, queue {queue_size})"
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+        logger.success("Server stopped.")
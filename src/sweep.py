@@ -0,0 +1,239 @@
+"""
+pointillize 参数扫描：decode → blocks → dither → dots → render 的阶段 DAG。
+
+Each stage depends on its own parameters plus everything upstream, so a
+stage output is keyed by the parameter prefix up to that stage. Variants
+are enumerated with upstream parameters varying slowest; consecutive
+variants then share their longest common prefix, and holding just the
+latest output per stage is enough for every combination to recompute
+only the stages its changed parameters invalidate.
+"""
+
+import itertools
+import json
+import math
+import random
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from . import metrics
+from .pointillism_toolkit import (
+    DEFAULT_PALETTE,
+    color_dither_indices,
+    create_color_blocks,
+    export_dots_json,
+)
+
+# Stage → the parameters it reads, in pipeline order
+STAGE_PARAMS: dict[str, tuple[str, ...]] = {
+    "blocks": ("spatial_rad", "color_rad"),
+    "dither": ("dither",),
+    "dots": ("dot_ratio", "jitter"),
+    "render": ("alpha",),
+}
+PARAM_ORDER: tuple[str, ...] = tuple(itertools.chain(*STAGE_PARAMS.values()))
+
+_PARSERS: dict[str, Callable[[str], Any]] = {
+    "spatial_rad": int,
+    "color_rad": int,
+    "dither": str,
+    "dot_ratio": float,
+    "jitter": float,
+    "alpha": float,
+}
+
+THUMB_WIDTH = 480
+_LABEL_H = 28
+
+
+def dot_geometry(h: int, w: int, dot_ratio: float, jitter: float) -> tuple[int, int]:
+    """(dot radius, jitter) in pixels, from fractions of the short side / radius."""
+    dot_radius = max(1, round(dot_ratio * min(h, w)))
+    return dot_radius, max(1, round(jitter * dot_radius))
+
+
+def parse_sweep(specs: tuple[str, ...]) -> dict[str, list]:
+    """Parse ("alpha=0.3,0.5", "dot-ratio=0.01,0.02") into value grids."""
+    grid: dict[str, list] = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        name = name.strip().lstrip("-").replace("-", "_")
+        if not sep or name not in _PARSERS:
+            raise ValueError(
+                f"expected PARAM=V1,V2,... with PARAM one of "
+                f"{', '.join(p.replace('_', '-') for p in PARAM_ORDER)}: {spec!r}"
+            )
+        parse = _PARSERS[name]
+        try:
+            grid[name] = [parse(v.strip()) for v in values.split(",") if v.strip()]
+        except ValueError as e:
+            raise ValueError(f"bad value in {spec!r}: {e}") from None
+        if not grid[name]:
+            raise ValueError(f"no values in {spec!r}")
+    return grid
+
+
+def variants(base: dict, grid: dict[str, list]) -> list[dict]:
+    """Every combination of grid over base, upstream parameters varying slowest."""
+    swept = [p for p in PARAM_ORDER if p in grid]
+    return [
+        base | dict(zip(swept, values))
+        for values in itertools.product(*(grid[p] for p in swept))
+    ]
+
+
+def variant_label(params: dict, grid: dict[str, list]) -> str:
+    return " ".join(
+        f"{p.replace('_', '-')}={params[p]}" for p in PARAM_ORDER if p in grid
+    )
+
+
+class StageMemo:
+    """Latest output of each stage, keyed by the parameter prefix it depends on."""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[tuple, Any]] = {}
+        self.computed: dict[str, int] = dict.fromkeys(STAGE_PARAMS, 0)
+
+    def get(self, stage: str, params: dict, compute: Callable[[], Any]) -> Any:
+        names = PARAM_ORDER[: PARAM_ORDER.index(STAGE_PARAMS[stage][-1]) + 1]
+        key = tuple(params[p] for p in names)
+        cached = self._entries.get(stage)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = compute()
+        self._entries[stage] = (key, value)
+        self.computed[stage] += 1
+        return value
+
+
+def _thumbnail(img: np.ndarray | None, label: str, h: int, w: int) -> np.ndarray:
+    """Labelled THUMB_WIDTH-wide tile; a gray box when the variant failed."""
+    th = max(1, round(h * THUMB_WIDTH / w))
+    if img is None:
+        thumb = np.full((th, THUMB_WIDTH, 3), 200, np.uint8)
+    else:
+        thumb = cv2.resize(img, (THUMB_WIDTH, th), interpolation=cv2.INTER_AREA)
+    bar = np.full((_LABEL_H, THUMB_WIDTH, 3), 255, np.uint8)
+    cv2.putText(
+        bar, label, (6, 19), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1, cv2.LINE_AA
+    )
+    return np.vstack([bar, thumb])
+
+
+def contact_sheet(tiles: list[np.ndarray], cols: int) -> np.ndarray:
+    """Lay labelled thumbnails out row-major on a white sheet."""
+    cell_h = max(t.shape[0] for t in tiles)
+    rows = math.ceil(len(tiles) / cols)
+    gap = 8
+    sheet = np.full(
+        (rows * (cell_h + gap) + gap, cols * (THUMB_WIDTH + gap) + gap, 3),
+        255,
+        np.uint8,
+    )
+    for i, tile in enumerate(tiles):
+        y = gap + (i // cols) * (cell_h + gap)
+        x = gap + (i % cols) * (THUMB_WIDTH + gap)
+        sheet[y : y + tile.shape[0], x : x + THUMB_WIDTH] = tile
+    return sheet
+
+
+def run_sweep(
+    img_file: Path,
+    base: dict,
+    grid: dict[str, list],
+    render: Callable[[Path, Path], bool],
+) -> Path | None:
+    """
+    Render every variant of img_file to <stem>/sweep/ and assemble a contact
+    sheet <stem>/<stem>_sweep.png. render(dots_json, png) draws one variant.
+    """
+    with metrics.stage("decode"):
+        img = cv2.imread(str(img_file))
+    if img is None:
+        logger.error(f"Cannot read {img_file}")
+        return None
+    h, w = img.shape[:2]
+
+    out_dir = img_file.parent / img_file.stem / "sweep"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    memo = StageMemo()
+    combos = variants(base, grid)
+    logger.info(f"Sweeping {img_file.name}: {len(combos)} variants")
+
+    def blocks(p: dict) -> np.ndarray:
+        with metrics.stage("mean_shift"):
+            return create_color_blocks(img, p["spatial_rad"], p["color_rad"])
+
+    def dither(p: dict) -> np.ndarray:
+        blocked = memo.get("blocks", p, lambda: blocks(p))
+        with metrics.stage("dither"):
+            return color_dither_indices(
+                blocked,
+                DEFAULT_PALETTE,
+                method=p["dither"],
+                serpentine=p.get("serpentine", False),
+            )
+
+    def dots(p: dict) -> dict:
+        indices = memo.get("dither", p, lambda: dither(p))
+        dot_radius, jitter_px = dot_geometry(h, w, p["dot_ratio"], p["jitter"])
+        # Same jitter pattern in every variant, so only the swept
+        # parameters differ between tiles
+        random.seed(0)
+        with metrics.stage("dot_export"):
+            return export_dots_json(
+                indices,
+                DEFAULT_PALETTE,
+                base_radius=dot_radius,
+                jitter=jitter_px,
+                texture_dir=p.get("texture_dir"),
+            )
+
+    def draw(p: dict, index: int) -> Path | None:
+        dots_data = memo.get("dots", p, lambda: dots(p))
+        dots_json = out_dir / f"{index:03d}_dots.json"
+        png = out_dir / f"{index:03d}.png"
+        with metrics.stage("write"), open(dots_json, "w") as f:
+            json.dump(dots_data | {"alpha": p["alpha"]}, f)
+        ok = render(dots_json, png)
+        dots_json.unlink(missing_ok=True)
+        return png if ok else None
+
+    tiles = []
+    rendered_any = False
+    for index, params in enumerate(combos):
+        label = variant_label(params, grid)
+        png = memo.get("render", params, lambda p=params, i=index: draw(p, i))
+        rendered = cv2.imread(str(png)) if png is not None else None
+        if rendered is None:
+            logger.error(f"渲染失败: {label}")
+        else:
+            rendered_any = True
+            logger.info(f"[{index + 1}/{len(combos)}] {label} -> {png}")
+        tiles.append(_thumbnail(rendered, label, h, w))
+
+    logger.info(
+        "阶段计算次数: "
+        + ", ".join(f"{stage} {n}x" for stage, n in memo.computed.items())
+    )
+    (out_dir / "variants.json").write_text(
+        json.dumps(
+            [{"file": f"{i:03d}.png"} | c for i, c in enumerate(combos)], indent=2
+        )
+    )
+    if not rendered_any:
+        return None
+
+    # One sheet row per combination of everything but the last swept parameter
+    last = [p for p in PARAM_ORDER if p in grid][-1] if grid else None
+    cols = len(grid[last]) if last else 1
+    sheet_path = img_file.parent / img_file.stem / f"{img_file.stem}_sweep.png"
+    with metrics.stage("write"):
+        cv2.imwrite(str(sheet_path), contact_sheet(tiles, cols))
+    return sheet_path
@@ -0,0 +1,141 @@
+"""
+Tone mapping ahead of dithering: levels, gamma and an S-curve, compiled into
+one 256-entry LUT.
+
+E-paper panels have a much narrower and darker tonal range than the screens
+source images were graded for, so dithering the raw luminance tends to give
+muddy mid-tones. The whole curve is a function of one uint8 value, so it is
+evaluated once per 256 inputs (cached across frames) and applied with a
+single cv2.LUT pass over the image right after the gray conversion.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+
+class ToneCurve(NamedTuple):
+    gamma: float = 1.0  # > 1 lifts mid-tones, < 1 darkens them
+    contrast: float = 0.0  # S-curve steepness around mid-gray; 0 = linear
+    black: int = 0  # input level mapped to black
+    white: int = 255  # input level mapped to white
+    # > 0: choose black/white per frame, clipping this fraction at each end
+    auto_levels: float = 0.0
+
+
+# Starting points per panel type, keyed like --palette / the gray level count
+TONE_PROFILES: dict[str, ToneCurve] = {
+    "linear": ToneCurve(),
+    "mono": ToneCurve(gamma=1.2, contrast=4.0, auto_levels=0.005),
+    "gray4": ToneCurve(gamma=1.1, contrast=2.5, auto_levels=0.005),
+    "gray16": ToneCurve(gamma=1.0, contrast=1.5, auto_levels=0.002),
+    "7color": ToneCurve(gamma=1.3, contrast=2.0, auto_levels=0.005),
+}
+
+_FIELDS = {
+    "gamma": float,
+    "contrast": float,
+    "black": int,
+    "white": int,
+    "auto_levels": float,
+}
+
+# Auto-levels histograms come from every _SAMPLE_STEP-th pixel of every
+# _SAMPLE_STEP-th row: 1/16 of the frame is plenty for percentile points
+_SAMPLE_STEP = 4
+
+
+def parse_tone(spec: str) -> ToneCurve | None:
+    """
+    Parse "PROFILE", "PROFILE,key=value,..." or "key=value,..." into a curve.
+
+    Keys override the named profile's fields (or linear's when no profile is
+    given). Returns None for an identity curve, so callers can skip the LUT.
+    """
+    curve = TONE_PROFILES["linear"]
+    for i, part in enumerate(p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip().lstrip("-").replace("-", "_")
+        if not sep:
+            if i and name in TONE_PROFILES:
+                raise ValueError(f"the tone profile must come first: {spec!r}")
+            if name not in TONE_PROFILES:
+                raise ValueError(
+                    f"unknown tone profile {part!r}, choose from "
+                    f"{', '.join(TONE_PROFILES)}"
+                )
+            curve = TONE_PROFILES[name]
+        elif name in _FIELDS:
+            try:
+                curve = curve._replace(**{name: _FIELDS[name](value.strip())})
+            except ValueError as e:
+                raise ValueError(f"bad value in {part!r}: {e}") from None
+        else:
+            raise ValueError(
+                f"unknown tone setting {name!r}, expected one of "
+                f"{', '.join(f.replace('_', '-') for f in _FIELDS)}"
+            )
+    if curve.gamma <= 0:
+        raise ValueError(f"gamma must be positive: {curve.gamma}")
+    if not 0 <= curve.black < curve.white <= 255:
+        raise ValueError(
+            f"need 0 <= black < white <= 255: {curve.black}, {curve.white}"
+        )
+    if not 0 <= curve.auto_levels < 0.5:
+        raise ValueError(f"auto-levels must be in [0, 0.5): {curve.auto_levels}")
+    return None if curve == TONE_PROFILES["linear"] else curve
+
+
+def auto_range(sample: np.ndarray, clip: float) -> tuple[int, int]:
+    """(black, white) input levels clipping `clip` of sample's pixels at each end."""
+    cdf = np.cumsum(np.bincount(sample.ravel(), minlength=256))
+    n = cdf[-1]
+    black = int(np.searchsorted(cdf, clip * n, side="right"))
+    white = int(np.searchsorted(cdf, (1 - clip) * n, side="left"))
+    # Near-flat frames: stretching a sliver of levels would only amplify noise
+    if white - black < 16:
+        return 0, 255
+    return black, white
+
+
+@lru_cache(maxsize=256)
+def tone_lut(curve: ToneCurve, black: int, white: int) -> np.ndarray:
+    """The 256-entry uint8 LUT for curve with the given black/white points."""
+    x = np.clip((np.arange(256) - black) / (white - black), 0.0, 1.0)
+    x = x ** (1.0 / curve.gamma)
+    if curve.contrast > 0:
+        # Logistic around mid-gray, rescaled so 0 and 1 stay fixed
+        k = curve.contrast
+        lo, hi = 1 / (1 + np.exp(k / 2)), 1 / (1 + np.exp(-k / 2))
+        x = (1 / (1 + np.exp(-k * (x - 0.5))) - lo) / (hi - lo)
+    lut = np.rint(x * 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def tone_gray(bgr: np.ndarray, curve: ToneCurve | None = None) -> np.ndarray:
+    """BGR → tone-mapped gray; the LUT is applied in place on the gray buffer."""
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    if curve is None:
+        return gray
+    black, white = curve.black, curve.white
+    if curve.auto_levels > 0:
+        sample = gray[::_SAMPLE_STEP, ::_SAMPLE_STEP]
+        black, white = auto_range(sample, curve.auto_levels)
+    return cv2.LUT(gray, tone_lut(curve, black, white), dst=gray)
+
+
+def tone_bgr(bgr: np.ndarray, curve: ToneCurve | None = None) -> np.ndarray:
+    """The same curve on every channel of a BGR frame, for palette dithering."""
+    if curve is None:
+        return bgr
+    black, white = curve.black, curve.white
+    if curve.auto_levels > 0:
+        sample = np.ascontiguousarray(bgr[::_SAMPLE_STEP, ::_SAMPLE_STEP])
+        luma = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
+        black, white = auto_range(luma, curve.auto_levels)
+    return cv2.LUT(bgr, tone_lut(curve, black, white))
@@ -0,0 +1,231 @@
+import itertools
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+from skimage.morphology import skeletonize
+
+from src.ascii_art_toolkit import (
+    _ALL_EDGE,
+    _D1_CHARS,
+    _D2_CHARS,
+    _DIRECTION_BREAKS,
+    _H_CHARS,
+    _INTENSITY_BREAKS,
+    _V_CHARS,
+    CELL_H,
+    CELL_W,
+    _classify_cells,
+    _classify_edge_cell,
+    _merge_edge_segments,
+    _sam_mask_edges,
+)
+
+# Gradients whose edge angle is 0°, 45°, 90°, 135° and 180°; the double-angle
+# mean of two neighbours in equal parts falls exactly on a direction bin edge
+_OCTANT_GRADIENTS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+def _ellipse_mask(h: int, w: int) -> np.ndarray:
+    mask = np.zeros((h, w), np.uint8)
+    cv2.ellipse(mask, (w // 2, h // 2), (w * 2 // 5, h * 3 // 8), 0, 0, 360, 1, -1)
+    return mask
+
+
+def _predictor(mask: np.ndarray) -> SimpleNamespace:
+    """Stands in for SamPredictor, always returning `mask` as its best guess."""
+    return SimpleNamespace(
+        original_size=mask.shape,
+        predict=lambda **_: (mask[None].astype(bool), np.array([1.0]), None),
+    )
+
+
+def test_sam_mask_edges_traces_boundary_at_grid_size() -> None:
+    """A full-res mask gives the same outline as one predicted at grid size."""
+    target_h, target_w = 480, 720
+    edges = _sam_mask_edges(_predictor(_ellipse_mask(4000, 6000)), target_h, target_w)
+
+    seg = _ellipse_mask(target_h, target_w) * 255
+    kernel = np.ones((3, 3), np.uint8)
+    expected = skeletonize((cv2.dilate(seg, kernel) - cv2.erode(seg, kernel)) > 0)
+    assert edges.shape == (target_h, target_w)
+    assert abs(int((edges > 0).sum()) - int(expected.sum())) <= expected.sum() // 50
+
+
+def _scalar_classify(
+    edges: np.ndarray, gx: np.ndarray, gy: np.ndarray, grid_rows: int, grid_cols: int
+) -> list[str]:
+    """The per-cell loop that _classify_cells replaced."""
+    rows = []
+    for row in range(grid_rows):
+        y0, y1 = row * CELL_H, (row + 1) * CELL_H
+        row_chars = []
+        for col in range(grid_cols):
+            x0, x1 = col * CELL_W, (col + 1) * CELL_W
+            density = float(edges[y0:y1, x0:x1].mean())
+            cell_gx, cell_gy = gx[y0:y1, x0:x1], gy[y0:y1, x0:x1]
+            row_chars.append(_classify_edge_cell(cell_gx, cell_gy, CELL_H, density))
+        rows.append("".join(row_chars))
+    return rows
+
+
+def _bin_edge_cells() -> list[tuple[np.ndarray, np.ndarray]]:
+    """Gradient cells whose mean edge angle sits on or right next to a bin edge."""
+    cells = []
+    checker = (np.indices((CELL_H, CELL_W)).sum(axis=0) % 2).astype(bool)
+    for (ax, ay), (bx, by) in itertools.pairwise(_OCTANT_GRADIENTS):
+        for scale in (1.0, 3.0, 40.0, 255.0):
+            cells.append(
+                (
+                    np.where(checker, ax, bx) * scale,
+                    np.where(checker, ay, by) * scale,
+                )
+            )
+    # Edge angles 90° apart cancel out, leaving the mean angle ill-defined
+    cells.append((np.where(checker, 0.0, 7.0), np.where(checker, 7.0, 0.0)))
+    for edge in _DIRECTION_BREAKS:
+        for delta in (0.0, 1e-12, -1e-12, 1e-9, -1e-9, 1e-6, -1e-6, 1e-3, -1e-3):
+            phi = np.radians(edge + delta - 90.0)
+            cells.append(
+                (
+                    np.full((CELL_H, CELL_W), 100.0 * np.cos(phi)),
+                    np.full((CELL_H, CELL_W), 100.0 * np.sin(phi)),
+                )
+            )
+    return cells
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_classify_cells_matches_scalar_classifier(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    cells = _bin_edge_cells()
+    # Sobel gradients of a blurred random image, as generate_ascii_art sees them
+    noise = cv2.GaussianBlur(
+        rng.integers(0, 256, (CELL_H * 4, CELL_W * 9), np.uint8), (5, 5), 0
+    )
+    sobel_x = cv2.Sobel(noise, cv2.CV_64F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(noise, cv2.CV_64F, 0, 1, ksize=3)
+    for y in range(0, noise.shape[0], CELL_H):
+        for x in range(0, noise.shape[1], CELL_W):
+            window = np.s_[y : y + CELL_H, x : x + CELL_W]
+            cells.append((sobel_x[window], sobel_y[window]))
+    rng.shuffle(cells)
+
+    grid_cols = 9
+    grid_rows = -(-len(cells) // grid_cols)
+    cells += [(np.zeros((CELL_H, CELL_W)),) * 2] * (grid_rows * grid_cols - len(cells))
+    rows = [cells[r * grid_cols : (r + 1) * grid_cols] for r in range(grid_rows)]
+    gx = np.block([[cx for cx, _ in row] for row in rows])
+    gy = np.block([[cy for _, cy in row] for row in rows])
+    # Cell densities on and around every intensity break
+    levels = [0, *(t + d for t in _INTENSITY_BREAKS for d in (-1, 0, 1)), 255]
+    density = rng.choice(levels, (grid_rows, grid_cols))
+    edges = np.kron(density, np.ones((CELL_H, CELL_W))).astype(np.uint8)
+
+    chars = _classify_cells(edges, gx, gy, grid_rows, grid_cols)
+    expected = _scalar_classify(edges, gx, gy, grid_rows, grid_cols)
+    assert ["".join(row) for row in chars] == expected
+
+
+def _reference_merge(rows: list[str], max_gap: int = 2) -> list[str]:
+    """The list-of-lists _merge_edge_segments from before it was vectorized."""
+    if not rows:
+        return rows
+
+    nrows = len(rows)
+    ncols = max(len(r) for r in rows)
+    grid = [list(r.ljust(ncols)) for r in rows]
+
+    def _fill_seq(seq: list[str], char_set: frozenset[str]) -> None:
+        n = len(seq)
+        runs: list[tuple[int, int]] = []
+        i = 0
+        while i < n:
+            if seq[i] in char_set:
+                s = i
+                while i < n and seq[i] in char_set:
+                    i += 1
+                runs.append((s, i))
+            else:
+                i += 1
+        for k in range(len(runs) - 1):
+            gap_s, gap_e = runs[k][1], runs[k + 1][0]
+            if 0 < gap_e - gap_s <= max_gap and all(
+                seq[j] == " " for j in range(gap_s, gap_e)
+            ):
+                fill = seq[gap_s - 1]
+                for j in range(gap_s, gap_e):
+                    seq[j] = fill
+
+    for r in range(nrows):
+        _fill_seq(grid[r], _H_CHARS)
+
+    for c in range(ncols):
+        col = [grid[r][c] for r in range(nrows)]
+        _fill_seq(col, _V_CHARS)
+        for r in range(nrows):
+            grid[r][c] = col[r]
+
+    for k in range(-(nrows - 1), ncols):
+        r0 = max(0, -k)
+        c0 = r0 + k
+        length = min(nrows - r0, ncols - c0)
+        coords = [(r0 + i, c0 + i) for i in range(length)]
+        if len(coords) >= 2:
+            seq = [grid[r][c] for r, c in coords]
+            _fill_seq(seq, _D1_CHARS)
+            for i, (r, c) in enumerate(coords):
+                grid[r][c] = seq[i]
+
+    for k in range(nrows + ncols - 1):
+        r0 = max(0, k - ncols + 1)
+        c0 = k - r0
+        length = min(nrows - r0, c0 + 1)
+        coords = [(r0 + i, c0 - i) for i in range(length)]
+        if len(coords) >= 2:
+            seq = [grid[r][c] for r, c in coords]
+            _fill_seq(seq, _D2_CHARS)
+            for i, (r, c) in enumerate(coords):
+                grid[r][c] = seq[i]
+
+    to_clear = [
+        (r, c)
+        for r in range(nrows)
+        for c in range(ncols)
+        if grid[r][c] in _ALL_EDGE
+        and not any(
+            0 <= r + dr < nrows and 0 <= c + dc < ncols and grid[r + dr][c + dc] != " "
+            for dr in (-1, 0, 1)
+            for dc in (-1, 0, 1)
+            if (dr, dc) != (0, 0)
+        )
+    ]
+    for r, c in to_clear:
+        grid[r][c] = " "
+
+    return ["".join(row).rstrip() for row in grid]
+
+
+@pytest.mark.parametrize("max_gap", (1, 2, 3))
+@pytest.mark.parametrize("seed", range(40))
+def test_merge_edge_segments_matches_reference(seed: int, max_gap: int) -> None:
+    rng = np.random.default_rng(seed)
+    # Mostly spaces, so gaps of every length between same-family runs are common
+    alphabet = [" "] * 12 + sorted(_ALL_EDGE) + ["@", "."]
+    nrows, ncols = (int(n) for n in rng.integers(1, 24, 2))
+    if seed % 10 == 0:
+        nrows = 1
+    elif seed % 10 == 1:
+        ncols = 1
+    # Ragged rows, as generate_ascii_art produces after rstrip()
+    rows = [
+        "".join(rng.choice(alphabet, int(rng.integers(0, ncols + 1))))
+        for _ in range(nrows)
+    ]
+    assert _merge_edge_segments(rows, max_gap) == _reference_merge(rows, max_gap)
+
+
+def test_merge_edge_segments_empty_rows() -> None:
+    assert _merge_edge_segments([]) == _reference_merge([]) == []
+    assert _merge_edge_segments(["", ""]) == _reference_merge(["", ""]) == ["", ""]
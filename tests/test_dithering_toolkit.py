@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from src.dithering_toolkit import (
+    DITHER_KERNELS,
+    error_diffusion,
+    palette_diffusion_indices,
+)
+
+# Thin shapes take the narrow fallback or single-pixel diagonals; the
+# gradient one makes near-ties between palette colors common
+SHAPES = ((1, 1), (1, 9), (9, 1), (2, 2), (3, 5), (7, 13), (24, 40))
+
+
+def _reference_indices(
+    img: np.ndarray, palette: np.ndarray, kernel: list, serpentine: bool
+) -> np.ndarray:
+    """The palette index error_diffusion() picks for every pixel."""
+    chosen: list[int] = []
+
+    def nearest(pixel: np.ndarray) -> np.ndarray:
+        chosen.append(int(np.argmin(np.sum((palette - pixel) ** 2, axis=1))))
+        return palette[chosen[-1]]
+
+    error_diffusion(img, nearest, kernel, serpentine)
+    indices = np.array(chosen).reshape(img.shape[:2])
+    if serpentine:
+        # Odd rows were visited right to left
+        indices[1::2] = indices[1::2, ::-1]
+    return indices
+
+
+def _palette(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (int(rng.integers(2, 41)), 3)).astype(np.float32)
+
+
+def _image(shape: tuple[int, int], seed: int) -> np.ndarray:
+    h, w = shape
+    if seed % 2:
+        return np.random.default_rng(seed).integers(0, 256, (h, w, 3), np.uint8)
+    yy, xx = np.mgrid[0:h, 0:w]
+    return np.dstack([xx * 1.2, yy * 2.1, (xx + yy) * 0.8]).astype(np.uint8)
+
+
+@pytest.mark.parametrize("serpentine", (False, True))
+@pytest.mark.parametrize("kernel", sorted(DITHER_KERNELS))
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("seed", range(4))
+def test_palette_diffusion_matches_error_diffusion(
+    seed: int, shape: tuple[int, int], kernel: str, serpentine: bool
+) -> None:
+    palette = _palette(seed)
+    img = _image(shape, seed)
+    expected = _reference_indices(img, palette, DITHER_KERNELS[kernel], serpentine)
+    indices = palette_diffusion_indices(
+        img, palette, DITHER_KERNELS[kernel], serpentine
+    )
+    np.testing.assert_array_equal(indices, expected)
+
+
+def test_serpentine_near_tie() -> None:
+    """A gradient where the row scan picked another color when it ran in float64."""
+    palette, img = _palette(26), _image((24, 40), 0)
+    kernel = DITHER_KERNELS["jjn"]
+    expected = _reference_indices(img, palette, kernel, serpentine=True)
+    indices = palette_diffusion_indices(img, palette, kernel, serpentine=True)
+    np.testing.assert_array_equal(indices, expected)
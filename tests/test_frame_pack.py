@@ -0,0 +1,58 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.frame_pack import FramePack, FramePackWriter
+
+
+def test_append_replaces_and_keeps_frames(tmp_path: Path) -> None:
+    path = tmp_path / "frames.gpk"
+    with FramePackWriter(path) as pack:
+        pack.add("0001", b"a" * 100, 8, 8, 1)
+        pack.add("b", b"b" * 50, 8, 8, 1)
+    with FramePackWriter(path) as pack:
+        pack.add("c", b"c" * 70, 8, 8, 1)
+        pack.add("b", b"B" * 10, 8, 8, 1)
+
+    with FramePack(path) as pack:
+        assert [e.name for e in pack.entries] == ["0001", "c", "b"]
+        assert bytes(pack["b"]) == b"B" * 10
+        assert bytes(pack["0001"]) == b"a" * 100
+        assert all(pack.verify(e.name) for e in pack.entries)
+
+
+def test_interrupted_append_keeps_old_index(tmp_path: Path) -> None:
+    path = tmp_path / "frames.gpk"
+    with FramePackWriter(path) as pack:
+        pack.add("a", b"a" * 100, 8, 8, 1)
+
+    # Payloads written but close() never reached: the process dies mid-append
+    script = (
+        "import os, sys\n"
+        "from src.frame_pack import FramePackWriter\n"
+        "pack = FramePackWriter(sys.argv[1])\n"
+        "pack.add('b', b'b' * 100_000, 8, 8, 1)\n"
+        "os._exit(1)\n"
+    )
+    root = Path(__file__).resolve().parents[1]
+    subprocess.run([sys.executable, "-c", script, str(path)], cwd=root, check=False)
+    assert path.stat().st_size > 100_000
+
+    with FramePack(path) as reader:
+        assert [e.name for e in reader.entries] == ["a"]
+        assert reader.verify("a")
+    with FramePackWriter(path) as pack:
+        pack.add("c", b"c" * 10, 8, 8, 1)
+    with FramePack(path) as reader:
+        assert [e.name for e in reader.entries] == ["a", "c"]
+
+
+@pytest.mark.parametrize("append", (True, False))
+def test_refuses_to_overwrite_other_files(tmp_path: Path, append: bool) -> None:
+    path = tmp_path / "photo.bin"
+    path.write_bytes(b"\x00\xff" * 1000)
+    with pytest.raises(ValueError, match="not a geink frame pack"):
+        FramePackWriter(path, append=append)
+    assert path.read_bytes() == b"\x00\xff" * 1000
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Whole-process wall time for a CLI invocation that must not touch the imaging
+# stack; generous so slow CI machines pass, tight enough to catch cv2/numpy
+# (or a similarly heavy import) creeping back onto the startup path
+BUDGET_S = float(os.environ.get("GEINK_IMPORT_BUDGET_S", "1.0"))
+HEAVY_MODULES = ("cv2", "numpy")
+
+
+def _imported_modules(stderr: str) -> set[str]:
+    """Module names from `python -X importtime` output."""
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+@pytest.mark.parametrize("args", [["--help"], ["upload", "--help"]])
+def test_cli_startup_skips_imaging_stack(args: list[str]) -> None:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "src.geink", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    elapsed = time.perf_counter() - start
+
+    assert result.returncode == 0, result.stderr
+    heavy = {m.split(".")[0] for m in _imported_modules(result.stderr)}
+    heavy &= set(HEAVY_MODULES)
+    assert not heavy, f"geink {' '.join(args)} imported {sorted(heavy)}"
+    assert elapsed < BUDGET_S, f"geink {' '.join(args)} took {elapsed:.2f}s"
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.packing_toolkit import pack_pixels, packed_size, unpack_pixels
+
+# Odd widths never fill the last byte of a row for any of these depths
+WIDTHS = (1, 7, 13, 801)
+BPPS = (1, 2, 3, 4, 8)
+
+
+def _random_indices(height: int, width: int, bpp: int) -> np.ndarray:
+    rng = np.random.default_rng(height * 1000 + width * 10 + bpp)
+    return rng.integers(0, 1 << bpp, size=(height, width), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("bpp", BPPS)
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("row_align", (None, 1, 4))
+@pytest.mark.parametrize("msb_first", (True, False))
+@pytest.mark.parametrize("invert", (False, True))
+def test_round_trip(
+    bpp: int, width: int, row_align: int | None, msb_first: bool, invert: bool
+) -> None:
+    indices = _random_indices(5, width, bpp)
+    packed = pack_pixels(
+        indices, bpp, msb_first=msb_first, invert=invert, row_align=row_align
+    )
+    assert packed.size == packed_size(width, 5, bpp, row_align)
+    unpacked = unpack_pixels(
+        packed, width, 5, bpp, msb_first=msb_first, invert=invert, row_align=row_align
+    )
+    np.testing.assert_array_equal(unpacked, indices)
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+def test_default_is_continuous_bit_stream(width: int) -> None:
+    """The default layout is the original .bin one: np.packbits of the whole frame."""
+    indices = _random_indices(3, width, 1)
+    np.testing.assert_array_equal(
+        pack_pixels(indices), np.packbits(indices.reshape(-1))
+    )
+
+
+def test_row_align_pads_rows() -> None:
+    indices = np.ones((2, 9), dtype=np.uint8)
+    packed = pack_pixels(indices, 1, row_align=1)
+    assert packed.tolist() == [0xFF, 0x80, 0xFF, 0x80]
+
+
+def test_lsb_first_order() -> None:
+    indices = np.array([[1, 2, 3, 0]], dtype=np.uint8)
+    assert pack_pixels(indices, 2, msb_first=True).tolist() == [0b01_10_11_00]
+    assert pack_pixels(indices, 2, msb_first=False).tolist() == [0b00_11_10_01]
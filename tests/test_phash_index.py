@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from src import phash_index
+from src.phash_index import HammingIndex, _popcount_lut
+
+
+def test_popcount_lut_matches_bit_count() -> None:
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 2**64, size=1000, dtype=np.uint64)
+    values[:3] = [0, 2**64 - 1, 1 << 63]
+    expected = [int(v).bit_count() for v in values]
+    assert _popcount_lut(values).tolist() == expected
+
+
+@pytest.mark.parametrize("lut", (False, True))
+def test_nearest_within_distance(lut: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    if lut:
+        monkeypatch.setattr(phash_index, "_popcount", _popcount_lut)
+    index = HammingIndex(capacity=1)
+    index.add(0b1111, "a")
+    index.add(0b1111 << 32, "b")
+    assert index.nearest(0b0111, 2) == ("a", 1)
+    assert index.nearest((0b1111 << 32) | 0b11, 2) == ("b", 2)
+    assert index.nearest(0xFF << 16, 4) is None